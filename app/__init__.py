@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# 環境変数（.env）の読み込みはパッケージの読み込み時に1回だけ行う
+# （各モジュールは os.getenv で設定を読むだけにする）
+load_dotenv()
@@ -0,0 +1,213 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .pii import pii_masker
+import json
+import logging
+import os
+import queue
+import random
+
+# アクセスログを出力するかどうか
+ACCESS_LOG_ENABLED = os.getenv("ACCESS_LOG_ENABLED", "true").lower() == "true"
+
+# 正常なリクエスト（4xx/5xx・遅いリクエスト以外）のうちログに出力する割合（0.0〜1.0）
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+
+# この時間（ミリ秒）以上かかったリクエストはサンプリングに関係なく出力
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+
+# リクエストボディの出力: never（出力しない）/ error（4xx・5xxのみ）/ always
+ACCESS_LOG_BODY = os.getenv("ACCESS_LOG_BODY", "error").lower()
+
+# ログに出力するボディの最大バイト数
+ACCESS_LOG_MAX_BODY = int(os.getenv("ACCESS_LOG_MAX_BODY", "2048"))
+
+# ログの書き込み待ちキューの上限（溢れた場合は破棄してリクエスト処理を遅らせない）
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+LOGS_DIR = Path("logs")
+ACCESS_LOGGER_NAME = "news_api.access"
+
+# 現在のリクエストID（アクセスログ以外のログにも付与する）
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+def mask_personal_info(data_str: str) -> str:
+    """個人情報をマスクする関数"""
+    return pii_masker.mask_text(data_str)
+
+def describe_body(body: bytes, content_type: str, size: Optional[int] = None) -> str:
+    """ログ用にリクエストボディを文字列にします（バイナリは長さのみ、テキストは個人情報をマスク）
+
+    size: ボディ全体のバイト数（body が先頭部分のみの場合に指定）
+    """
+    if not body:
+        return "(空)"
+    size = max(size or 0, len(body))
+    if "multipart/form-data" in content_type:
+        return f"[multipart/form-data - {size} bytes]"
+    if "application/octet-stream" in content_type:
+        return f"[binary data - {size} bytes]"
+    try:
+        text, _ = pii_masker.mask_stream((body,), ACCESS_LOG_MAX_BODY)
+    except UnicodeDecodeError:
+        return f"[binary data - {size} bytes]"
+    if size > ACCESS_LOG_MAX_BODY:
+        return text + f"...[truncated {size} bytes]"
+    return text
+
+class JSONFormatter(logging.Formatter):
+    """ログを1行のJSONにするフォーマッター（書き込みスレッドで実行される）"""
+    def format(self, record: logging.LogRecord) -> str:
+        access = getattr(record, "access", None)
+        if access is not None:
+            entry = dict(access)
+            body = entry.pop("body", None)
+            if body is not None:
+                # マスク処理もイベントループではなく書き込みスレッドで行う
+                entry["body"] = describe_body(body, entry.get("content_type") or "", entry.get("request_bytes"))
+            return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+class _RequestIdFilter(logging.Filter):
+    """ログにリクエストIDを付与します"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+class _AccessFilter(logging.Filter):
+    """アクセスログのみ（only=True）またはアクセスログ以外（only=False）を通します"""
+    def __init__(self, only: bool):
+        super().__init__()
+        self.only = only
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (record.name == ACCESS_LOGGER_NAME) == self.only
+
+class _DroppingQueueHandler(QueueHandler):
+    """キューが溢れた場合にログを破棄するQueueHandler（呼び出し元をブロックしない）"""
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+class _ConsoleFormatter(logging.Formatter):
+    """コンソール用: アクセスログはJSON、それ以外はテキストで出力します"""
+    def __init__(self, text_formatter: logging.Formatter, json_formatter: logging.Formatter):
+        super().__init__()
+        self.text_formatter = text_formatter
+        self.json_formatter = json_formatter
+
+    def format(self, record: logging.LogRecord) -> str:
+        if record.name == ACCESS_LOGGER_NAME:
+            return self.json_formatter.format(record)
+        return self.text_formatter.format(record)
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging():
+    """ログ設定を初期化します
+
+    ログはキューに積むだけにして、ファイル・コンソールへの書き込みは
+    バックグラウンドのスレッド（QueueListener）で行います。
+    アクセスログは logs/access.log、それ以外は logs/api.log に出力します。
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    LOGS_DIR.mkdir(exist_ok=True)
+    text_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    json_formatter = JSONFormatter()
+
+    api_handler = logging.FileHandler(LOGS_DIR / "api.log", encoding="utf-8")
+    api_handler.setFormatter(text_formatter)
+    api_handler.addFilter(_AccessFilter(only=False))
+
+    access_handler = logging.FileHandler(LOGS_DIR / "access.log", encoding="utf-8")
+    access_handler.setFormatter(json_formatter)
+    access_handler.addFilter(_AccessFilter(only=True))
+
+    console_handler = logging.StreamHandler()  # コンソールにも出力
+    console_handler.setFormatter(_ConsoleFormatter(text_formatter, json_formatter))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers = [queue_handler]
+
+    _listener = QueueListener(log_queue, api_handler, access_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """キューに残っているログを書き込んで書き込みスレッドを停止します"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+access_logger.setLevel(logging.INFO)
+
+def wants_body(method: str) -> bool:
+    """リクエストボディをログ用に保持する必要があるかどうか"""
+    return ACCESS_LOG_ENABLED and ACCESS_LOG_BODY != "never" and method in _BODY_METHODS
+
+def log_access(
+    method: str,
+    path: str,
+    route: Optional[str],
+    status: int,
+    latency_ms: float,
+    request_id: Optional[str],
+    client: Optional[str] = None,
+    request_bytes: Optional[int] = None,
+    response_bytes: Optional[int] = None,
+    content_type: Optional[str] = None,
+    body: Optional[bytes] = None
+):
+    """アクセスログを1件出力します（サンプリング・ボディの出力条件を適用）"""
+    if not ACCESS_LOG_ENABLED:
+        return
+
+    important = status >= 400 or latency_ms >= ACCESS_LOG_SLOW_MS
+    if not important and ACCESS_LOG_SAMPLE_RATE < 1.0 and random.random() >= ACCESS_LOG_SAMPLE_RATE:
+        return
+
+    entry: Dict[str, Any] = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "request_id": request_id,
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "client": client
+    }
+    if body is not None and (ACCESS_LOG_BODY == "always" or (ACCESS_LOG_BODY == "error" and status >= 400)):
+        entry["content_type"] = content_type
+        entry["body"] = body  # マスク・文字列化は書き込みスレッドで行う
+    access_logger.info("access", extra={"access": entry})
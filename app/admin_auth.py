@@ -0,0 +1,20 @@
+from typing import Optional
+from fastapi import Header, HTTPException
+import hmac
+import os
+
+# 管理用・デバッグ用エンドポイントの認証トークン（X-Admin-Token ヘッダーで指定）
+# 未設定の場合、ENVIRONMENT=development を明示した環境でのみ認証なしで利用でき、それ以外では利用できない
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# 状態を変更するエンドポイントも守るため、ENVIRONMENT が未設定の場合は開発環境として扱わない
+_IS_LOCAL = os.getenv("ENVIRONMENT") == "development"
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None, description="管理用トークン（ADMIN_TOKEN）")):
+    """管理用トークンを検証する依存関係（ルーター・エンドポイントの dependencies に指定）"""
+    if not ADMIN_TOKEN:
+        if _IS_LOCAL:
+            return
+        raise HTTPException(status_code=403, detail="管理用エンドポイントは無効です（ADMIN_TOKEN が設定されていません）")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="管理用トークンが正しくありません")
@@ -0,0 +1,246 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+from .metrics import record_admission
+import asyncio
+import json
+import math
+import os
+import time
+
+# 過負荷時の同時実行数の制限・ロードシェディング（デフォルトは有効）
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# ルートの種類ごとの同時実行数の上限（種類=上限 のカンマ区切り）
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "reads=32,writes=16,uploads=4,contact=8")
+
+# ルートの種類ごとの目標レイテンシ（ミリ秒）。超えると同時実行数の上限を下げる
+ADMISSION_TARGETS_MS = os.getenv("ADMISSION_TARGETS_MS", "reads=250,writes=1000,uploads=3000,contact=2000")
+
+# 同時実行数の上限の下限（レイテンシが悪化してもこれ以下にはしない）
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+
+# 目標レイテンシを超えた場合に上限に掛ける係数（乗算的に減らす）
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+
+# 上限に達した場合の待ち行列の長さ・待ち時間（ミリ秒）
+# 待ち時間の見込みが ADMISSION_MAX_WAIT_MS を超える場合は待たずに503を返す
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "1000"))
+
+# ルートの種類（制限しないルート: ヘルスチェック・メトリクス・管理用など）
+ROUTE_CLASSES = ("reads", "writes", "uploads", "contact")
+
+def parse_class_values(value: str) -> Dict[str, float]:
+    """ADMISSION_LIMITS・ADMISSION_TARGETS_MS をパースします"""
+    values = {}
+    for item in value.split(","):
+        name, _, number = item.strip().partition("=")
+        if name in ROUTE_CLASSES and number:
+            try:
+                values[name] = float(number)
+            except ValueError:
+                continue
+    return values
+
+def classify(method: str, path: str) -> Optional[str]:
+    """リクエストのルートの種類を返します（制限しない場合はNone）"""
+    if path.startswith(("/api/v1/contact", "/api/v1/email")):
+        return "contact"
+    if not path.startswith("/api/v1/news"):
+        return None
+    if method in ("GET", "HEAD"):
+        return "reads"
+    if path.startswith("/api/v1/news/thumbnails"):
+        return "uploads"
+    return "writes"
+
+class Rejected(Exception):
+    """過負荷のためリクエストを受け付けない"""
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdaptiveLimiter:
+    """レイテンシに応じて同時実行数の上限を調整するリミッター（AIMD）
+
+    - 目標レイテンシ以内で上限まで使われている場合は上限を少しずつ増やす（加算的増加）
+    - 目標レイテンシを超えた・5xxになった場合は上限を ADMISSION_BACKOFF 倍にする（乗算的減少、目標レイテンシの間に1回まで）
+    - 上限に達した場合は待ち行列で待ち、待ち時間の見込みが長い・待ち行列が一杯の場合はすぐに拒否する
+
+    イベントループ内からのみ呼び出してください（ロックは使用しない）。
+    """
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        target_latency: float,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT_MS / 1000
+    ):
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(max_limit)
+        self.target_latency = target_latency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.inflight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_latency = target_latency / 2
+        self._last_decrease = 0.0
+
+    def estimated_wait(self) -> float:
+        """これから待ち行列に入った場合の待ち時間の見込み（秒）"""
+        return (len(self._waiters) + 1) * self._avg_latency / max(int(self.limit), 1)
+
+    def _reject(self, reason: str) -> Rejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        record_admission(self.name, int(self.limit), len(self._waiters), reason)
+        # 待ち時間の見込みをもとに、少なくとも1秒後の再試行を促す
+        return Rejected(reason, max(1.0, self.estimated_wait()))
+
+    async def acquire(self):
+        """実行枠を確保します（受け付けない場合は Rejected を送出）"""
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            raise self._reject("queue_full")
+        if self.estimated_wait() > self.max_wait:
+            # 待っても期限内に処理できない見込みのため、処理する前に拒否する
+            raise self._reject("deadline")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        record_admission(self.name, int(self.limit), len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise self._reject("timeout")
+        except asyncio.CancelledError:
+            # 実行枠を割り当てられた後にクライアントが切断した場合は枠を戻す
+            if waiter.done() and not waiter.cancelled():
+                self.inflight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        """実行枠を返し、レイテンシに応じて上限を調整します"""
+        self._avg_latency = self._avg_latency * 0.8 + latency * 0.2
+        if overloaded or latency > self.target_latency:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit * ADMISSION_BACKOFF)
+                self._last_decrease = now
+        elif self.inflight >= int(self.limit):
+            # 上限まで使われていて目標レイテンシ以内なら、上限1つ分の完了ごとにおよそ1増やす
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self.inflight -= 1
+        self._wake()
+        record_admission(self.name, int(self.limit), len(self._waiters))
+
+    def _wake(self):
+        """空いた実行枠を待ち行列の先頭から割り当てます"""
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.inflight += 1
+            waiter.set_result(None)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "max_limit": self.max_limit,
+            "min_limit": self.min_limit,
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "target_latency_ms": round(self.target_latency * 1000, 1),
+            "avg_latency_ms": round(self._avg_latency * 1000, 1),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected)
+        }
+
+class AdmissionController:
+    """ルートの種類ごとのリミッター"""
+    def __init__(self, limits: Optional[Dict[str, float]] = None, targets_ms: Optional[Dict[str, float]] = None):
+        limits = parse_class_values(ADMISSION_LIMITS) if limits is None else limits
+        targets_ms = parse_class_values(ADMISSION_TARGETS_MS) if targets_ms is None else targets_ms
+        self.limiters: Dict[str, AdaptiveLimiter] = {
+            name: AdaptiveLimiter(name, int(limit), targets_ms.get(name, 1000) / 1000)
+            for name, limit in limits.items()
+            if limit > 0
+        }
+
+    def limiter_for(self, scope) -> Optional[AdaptiveLimiter]:
+        route_class = classify(scope["method"], scope["path"])
+        return self.limiters.get(route_class) if route_class else None
+
+    def snapshot(self) -> dict:
+        return {"enabled": ADMISSION_ENABLED, "classes": {name: limiter.snapshot() for name, limiter in self.limiters.items()}}
+
+async def _send_rejection(send, retry_after: float):
+    body = json.dumps(
+        {"detail": "サーバーが混み合っています。しばらく時間をおいて再度お試しください。"},
+        ensure_ascii=False
+    ).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(math.ceil(retry_after)).encode("latin-1"))
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionControlMiddleware:
+    """ルートの種類（reads / writes / uploads / contact）ごとに同時実行数を制限するASGIミドルウェア
+
+    処理しきれないリクエストはスレッドプールに溜めずに503（Retry-After付き）で早めに返し、
+    受け付けたリクエストのレイテンシを保つことで過負荷時のスループットを維持します。
+    """
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.controller.limiter_for(scope) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Rejected as e:
+            await _send_rejection(send, e.retry_after)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            limiter.release(time.perf_counter() - start, overloaded=status_code >= 500)
+
+# シングルトンインスタンス
+admission_controller = AdmissionController()
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+
+# AWS（boto3）の呼び出しを実行する専用のスレッド数
+# boto3は同期APIのため、イベントループを止めないようにこのスレッドプールで実行する
+AWS_MAX_WORKERS = int(os.getenv("AWS_MAX_WORKERS", "16"))
+
+# クライアントごとのHTTP接続プールの大きさ（スレッド数以上にすると接続待ちにならない）
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", str(AWS_MAX_WORKERS)))
+
+# 接続・応答のタイムアウト（秒）・リトライ回数（到達できない場合にリクエスト・起動処理が止まらないようにする）
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "3"))
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+
+_lock = threading.Lock()
+_session = None
+_config = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+def client_config():
+    """全てのAWSクライアントで共有する設定（接続プール・タイムアウト・リトライ）"""
+    global _config
+    if _config is None:
+        from botocore.config import Config  # 起動時間短縮のため使うときに読み込む
+        _config = Config(
+            max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=AWS_CONNECT_TIMEOUT,
+            read_timeout=AWS_READ_TIMEOUT,
+            retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+            tcp_keepalive=True
+        )
+    return _config
+
+def create_client(service_name: str, **kwargs):
+    """共有の設定でboto3のクライアントを作成します
+
+    boto3のデフォルトセッションはスレッドセーフではないため、共有のセッションからロックを取って作成します
+    （作成したクライアントは複数のスレッドから使えます）。
+    """
+    global _session
+    kwargs.setdefault("config", client_config())
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session()
+        return _session.client(service_name, **kwargs)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AWS_MAX_WORKERS, thread_name_prefix="aws")
+    return _executor
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """同期のAWS呼び出しを専用のスレッドプールで実行します
+
+    FastAPIのスレッドプール（同期エンドポイント用）とは別にするため、AWSが遅い場合も他のリクエストの処理を妨げません。
+    トレース・Server-Timingのためにコンテキスト変数を引き継ぎます。
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+def shutdown():
+    """実行中の呼び出しの完了を待ってスレッドプールを終了します（終了時の処理）"""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from .metrics import record_cache
+import threading
+import time
+
+_MISSING = object()
+
+class TTLCache:
+    """TTL付きのインメモリLRUキャッシュ
+
+    記事の作成・更新・削除時には invalidate() で全エントリを破棄します。
+    ワーカープロセスごとに独立しているため、他ワーカーでの書き込みは
+    TTLが切れるまで反映されません。
+    """
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 30.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """キャッシュから値を取得します（期限切れ・未登録の場合はdefault）"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] < time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                record_cache(self.name, False)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            record_cache(self.name, True)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """キャッシュに値を登録します"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self):
+        """全エントリを破棄します"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """ヒット率などの統計情報を返します"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0
+            }
@@ -0,0 +1,278 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from .cache import TTLCache
+from . import timing
+import asyncio
+import os
+import zlib
+
+# brotli・zstandardはオプション（未インストールの場合はgzipのみ）
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# レスポンスの圧縮（デフォルトは有効）
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+
+# この大きさ（バイト）未満のレスポンスは圧縮しない
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# 圧縮レベル: off / fast / default / best
+COMPRESSION_LEVEL = os.getenv("COMPRESSION_LEVEL", "default")
+
+# ルートごとの圧縮レベル（ルートのパステンプレート=レベル のカンマ区切り）
+# 例: /api/v1/news/search=fast,/api/v1/news/{article_id}=best
+COMPRESSION_ROUTE_LEVELS = os.getenv("COMPRESSION_ROUTE_LEVELS", "")
+
+# この大きさ（バイト）以上のレスポンスはスレッドプールで圧縮する（イベントループを止めないため）
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(256 * 1024)))
+
+# 圧縮済みのボディのキャッシュ（同じ内容のレスポンスを毎回圧縮しない）
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "256"))
+COMPRESSION_CACHE_TTL = float(os.getenv("COMPRESSION_CACHE_TTL", "60"))
+COMPRESSION_CACHE_MAX_BODY = int(os.getenv("COMPRESSION_CACHE_MAX_BODY", str(256 * 1024)))
+
+# 圧縮レベルのプリセット（エンコーディングごとのレベル）
+LEVEL_PRESETS: Dict[str, Dict[str, int]] = {
+    "fast": {"zstd": 1, "br": 1, "gzip": 1},
+    "default": {"zstd": 3, "br": 4, "gzip": 6},
+    "best": {"zstd": 10, "br": 9, "gzip": 9}
+}
+
+# 圧縮するContent-Type（JSON・テキスト）
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "+json", "+xml")
+
+def available_encodings() -> List[str]:
+    """サーバー側で優先するエンコーディングの順"""
+    encodings = []
+    if ZSTD_AVAILABLE:
+        encodings.append("zstd")
+    if BROTLI_AVAILABLE:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+@lru_cache(maxsize=128)
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Accept-Encoding ヘッダーから使用するエンコーディングを選びます（圧縮しない場合はNone）
+
+    qの値が最も大きいものを選び、同じ場合はサーバー側の優先順（zstd > br > gzip）で選びます。
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def parse_route_levels(value: str) -> Dict[str, str]:
+    """COMPRESSION_ROUTE_LEVELS をパースします"""
+    levels = {}
+    for item in value.split(","):
+        path, _, level = item.strip().rpartition("=")
+        if path and (level in LEVEL_PRESETS or level == "off"):
+            levels[path] = level
+    return levels
+
+class _Compressor:
+    """ストリーミング圧縮（chunk ごとにフラッシュしてクライアントへ送る）"""
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            # wbits=31 でgzip形式
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush()
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """ボディ全体を圧縮します"""
+    return _Compressor(encoding, level).finish(data)
+
+# 圧縮済みボディのキャッシュ: (エンコーディング, レベル, ボディのハッシュ) -> (ボディ, 圧縮したボディ)
+compressed_cache = TTLCache("compressed_responses", maxsize=COMPRESSION_CACHE_SIZE, ttl=COMPRESSION_CACHE_TTL)
+
+async def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    """ボディ全体を圧縮します（同じ内容はキャッシュから返す）"""
+    cacheable = COMPRESSION_CACHE_SIZE > 0 and len(body) <= COMPRESSION_CACHE_MAX_BODY
+    if cacheable:
+        key = (encoding, level, hash(body))
+        cached = compressed_cache.get(key)
+        # ハッシュの衝突に備えて元のボディも比較する
+        if cached is not None and cached[0] == body:
+            return cached[1]
+
+    with timing.span("compress"):
+        if len(body) >= COMPRESSION_THREAD_THRESHOLD:
+            compressed = await asyncio.to_thread(compress, body, encoding, level)
+        else:
+            compressed = compress(body, encoding, level)
+
+    if cacheable:
+        compressed_cache.set(key, (body, compressed))
+    return compressed
+
+def _is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for key, value in headers:
+        key = key.lower()
+        if key in (b"content-encoding", b"content-range"):
+            return False
+        if key == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1").lower()
+    return any(kind in content_type for kind in _COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """Accept-Encoding に応じてレスポンスを圧縮するASGIミドルウェア（zstd / br / gzip）
+
+    - COMPRESSION_MIN_SIZE 未満・圧縮済み・画像などのレスポンスはそのまま
+    - 1回で送られるレスポンスはまとめて圧縮（同じ内容は圧縮済みのキャッシュを使用）
+    - 複数回に分けて送られるレスポンスはチャンクごとに圧縮して送信（ストリーミング）
+    - ルートごとの圧縮レベルは COMPRESSION_ROUTE_LEVELS で指定
+    """
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        level: str = COMPRESSION_LEVEL,
+        route_levels: Optional[Dict[str, str]] = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.route_levels = parse_route_levels(COMPRESSION_ROUTE_LEVELS) if route_levels is None else route_levels
+
+    def _level_for(self, scope, encoding: str) -> Optional[int]:
+        route = scope.get("route")
+        preset = self.route_levels.get(getattr(route, "path", None), self.level)
+        levels = LEVEL_PRESETS.get(preset)
+        return levels[encoding] if levels else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding) if accept_encoding else None
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        buffered: List[bytes] = []
+        buffered_size = 0
+        passthrough = False
+        level: Optional[int] = None
+
+        async def send_start(compressed: bool, content_length: Optional[int]):
+            headers = [
+                (key, value) for key, value in start_message.get("headers", [])
+                if key.lower() != b"content-length"
+            ]
+            if content_length is not None:
+                headers.append((b"content-length", str(content_length).encode("latin-1")))
+            if compressed:
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            start_message["headers"] = headers
+            await send(start_message)
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, buffered_size, passthrough, level
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                status = message["status"]
+                if status < 200 or status in (204, 304) or not _is_compressible(headers):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                level = self._level_for(scope, encoding) if encoding else None
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                # ストリーミング中
+                data = compressor.compress(body) if more_body else compressor.finish(body)
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            buffered.append(body)
+            buffered_size += len(body)
+            if more_body and buffered_size < self.minimum_size:
+                # 圧縮するかどうか判断できる大きさになるまで溜める
+                return
+
+            data = b"".join(buffered)
+            buffered.clear()
+            if level is None or buffered_size < self.minimum_size:
+                # 圧縮しない（Vary は付ける）
+                passthrough = True
+                await send_start(False, None if more_body else len(data))
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            if not more_body:
+                compressed = await compress_body(data, encoding, level)
+                await send_start(True, len(compressed))
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            compressor = _Compressor(encoding, level)
+            await send_start(True, None)
+            await send({"type": "http.response.body", "body": compressor.compress(data), "more_body": True})
+
+        await self.app(scope, receive, send_wrapper)
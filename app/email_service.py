@@ -1,18 +1,20 @@
 import os
 import json
 import uuid
-import boto3
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 from pydantic import EmailStr, BaseModel, validator
 from jinja2 import Environment, FileSystemLoader
 from pathlib import Path
-from dotenv import load_dotenv
+from .metrics import track_backend
+from .tracing import traced
+from .rate_limit import GCRALimiter, Limit
+from .redis_pool import REDIS_ASYNC_AVAILABLE
+from . import aws
+from .outbox import CONTACT_OUTBOX_CHANNELS, contact_outbox
 import asyncio
-import redis
-
-load_dotenv()
+import threading
 
 class EmailConfig:
     """メール設定クラス"""
@@ -71,45 +73,26 @@ class ContactForm(BaseModel):
         return v
 
 class RateLimiter:
-    """レート制限クラス"""
+    """レート制限クラス
+
+    非同期のRedis接続プールとGCRAのLuaスクリプトで、複数の制限（IP・メールアドレス）を1回の呼び出しで判定します。
+    Redisが利用できない場合はワーカー内で判定します（制限は外さない）。
+    """
     def __init__(self):
-        try:
-            self.redis = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                db=0,
-                decode_responses=True
-            )
-            self.available = True
-        except Exception as e:
-            print(f"Redis: 接続失敗 ({type(e).__name__})")
-            self.available = False
+        self.limiter = GCRALimiter(prefix="rate_limit:contact")
+        self.available = REDIS_ASYNC_AVAILABLE
+        if not self.available:
+            print("Redis: redis.asyncio が利用できないため、レート制限はワーカー内で行います")
+    
+    @traced("contact.rate_limit")
+    async def check_limits(self, limits: List[Tuple[str, int, int]]) -> bool:
+        """(キー, 回数, 期間（秒）) の制限を全て満たす場合のみ記録して True を返します"""
+        allowed, _ = await self.limiter.check([Limit(key, count, period) for key, count, period in limits])
+        return allowed
     
     async def check_rate_limit(self, key: str, limit: int, period: int) -> bool:
         """レート制限をチェック"""
-        if not self.available:
-            return True  # Redisが利用できない場合は制限しない
-        
-        try:
-            current = datetime.utcnow()
-            key = f"rate_limit:{key}"
-            
-            # 古いエントリを削除
-            self.redis.zremrangebyscore(key, 0, current.timestamp() - period)
-            
-            # 現在のカウントを取得
-            count = self.redis.zcard(key)
-            
-            if count < limit:
-                # 新しいエントリを追加
-                self.redis.zadd(key, {str(current.timestamp()): current.timestamp()})
-                self.redis.expire(key, period)
-                return True
-            
-            return False
-        except Exception as e:
-            print(f"レート制限: チェック失敗 ({type(e).__name__})")
-            return True  # エラーの場合は制限しない
+        return await self.check_limits([(key, limit, period)])
 
 class SNSService:
     """Amazon SNS通知サービス"""
@@ -123,7 +106,7 @@ class SNSService:
                 print("開発環境のため、SNS通知は無効化されています")
             else:
                 # 本番環境: AWS SNS設定
-                self.sns = boto3.client(
+                self.sns = aws.create_client(
                     'sns',
                     region_name=os.getenv('AWS_REGION', 'ap-northeast-1'),
                     aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
@@ -138,8 +121,14 @@ class SNSService:
             print(f"SNSサービス初期化エラー: {str(e)}")
             self.available = False
     
-    async def send_notification(self, contact_form: ContactForm, contact_id: str) -> bool:
-        """SNS通知を送信"""
+    @traced("contact.sns_notify")
+    async def send_notification(
+        self,
+        contact_form: ContactForm,
+        contact_id: str,
+        received_at: Optional[datetime] = None
+    ) -> bool:
+        """SNS通知を送信（再送した場合も受信側で重複を除けるよう、お問い合わせIDをメッセージ属性に付ける）"""
         if not self.available:
             return False
         
@@ -152,15 +141,21 @@ class SNSService:
                 'message': contact_form.message,
                 'phone': contact_form.phone,
                 'company': contact_form.company,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': (received_at or datetime.utcnow()).isoformat(),
                 'reply_to': contact_form.email
             }
             
-            self.sns.publish(
-                TopicArn=self.topic_arn,
-                Message=json.dumps(message, ensure_ascii=False),
-                Subject=f"【新しいお問い合わせ】{contact_form.subject}"
-            )
+            # boto3は同期APIのため専用のスレッドプールで実行する（S3への保存と並行して送信される）
+            with track_backend("sns", "publish"):
+                await aws.run(
+                    self.sns.publish,
+                    TopicArn=self.topic_arn,
+                    Message=json.dumps(message, ensure_ascii=False),
+                    Subject=f"【新しいお問い合わせ】{contact_form.subject}",
+                    MessageAttributes={
+                        'contact_id': {'DataType': 'String', 'StringValue': contact_id}
+                    }
+                )
             
             print("SNS通知: 送信成功")
             return True
@@ -180,7 +175,7 @@ class S3Service:
             
             if self.is_local:
                 # 開発環境: LocalStack設定
-                self.s3 = boto3.client(
+                self.s3 = aws.create_client(
                     's3',
                     endpoint_url='http://localhost:4566',
                     aws_access_key_id='test',
@@ -190,7 +185,7 @@ class S3Service:
                 self.bucket_name = 'news-api-contacts'
             else:
                 # 本番環境: AWS S3設定
-                self.s3 = boto3.client(
+                self.s3 = aws.create_client(
                     's3',
                     region_name=os.getenv('AWS_REGION', 'ap-northeast-1'),
                     aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
@@ -208,7 +203,8 @@ class S3Service:
     def _ensure_bucket_exists(self):
         """バケットの存在確認・作成"""
         try:
-            self.s3.head_bucket(Bucket=self.bucket_name)
+            with track_backend("s3", "head_bucket"):
+                self.s3.head_bucket(Bucket=self.bucket_name)
         except:
             try:
                 if self.is_local:
@@ -223,12 +219,19 @@ class S3Service:
             except Exception as e:
                 print(f"バケット作成エラー: {str(e)}")
     
-    async def save_contact(self, contact_form: ContactForm, contact_id: str) -> bool:
-        """お問い合わせをS3に保存"""
+    @traced("contact.s3_save")
+    async def save_contact(
+        self,
+        contact_form: ContactForm,
+        contact_id: str,
+        received_at: Optional[datetime] = None
+    ) -> bool:
+        """お問い合わせをS3に保存（キーは受付日時とお問い合わせIDで決まるため、再送しても上書きになる）"""
         if not self.available:
             return False
         
         try:
+            received_at = received_at or datetime.utcnow()
             contact_data = {
                 'id': contact_id,
                 'name': contact_form.name,
@@ -237,18 +240,20 @@ class S3Service:
                 'message': contact_form.message,
                 'phone': contact_form.phone,
                 'company': contact_form.company,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': received_at.isoformat(),
                 'status': 'new'
             }
             
-            s3_key = f"contacts/{datetime.utcnow().strftime('%Y/%m/%d')}/{contact_id}.json"
+            s3_key = f"contacts/{received_at.strftime('%Y/%m/%d')}/{contact_id}.json"
             
-            self.s3.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=json.dumps(contact_data, ensure_ascii=False, indent=2),
-                ContentType='application/json'
-            )
+            with track_backend("s3", "put_object"):
+                await aws.run(
+                    self.s3.put_object,
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=json.dumps(contact_data, ensure_ascii=False, indent=2),
+                    ContentType='application/json'
+                )
             
             print("S3保存: 成功")
             return True
@@ -285,16 +290,77 @@ class EmailService:
         if self.is_local:
             return True
         
-        # IPアドレスベースの制限（1時間に5回）
-        if not await self.rate_limiter.check_rate_limit(f"ip:{ip}", 5, 3600):
-            return False
+        # IPアドレスベース（1時間に5回）とメールアドレスベース（1時間に3回）の制限を1回で判定
+        return await self.rate_limiter.check_limits([
+            (f"ip:{ip}", 5, 3600),
+            (f"email:{email}", 3, 3600)
+        ])
+    
+    def outbox_channels(self) -> List[str]:
+        """アウトボックスから配送する配送先（設定された配送先のうち利用できるもの）"""
+        available = {
+            "s3": self.s3_service.available,
+            "sns": self.sns_service.available,
+            "smtp": self.available
+        }
+        return [channel for channel in CONTACT_OUTBOX_CHANNELS if available.get(channel)]
+    
+    @traced("contact.deliver")
+    async def deliver_contact(self, channel: str, contact_id: str, payload: dict, received_at: float) -> bool:
+        """アウトボックスに保存されたお問い合わせを配送先に送ります（失敗した場合はアウトボックスが再試行する）"""
+        contact_form = ContactForm(**payload)
+        received = datetime.utcfromtimestamp(received_at)
+        if channel == "s3":
+            return await self.s3_service.save_contact(contact_form, contact_id, received)
+        if channel == "sns":
+            return await self.sns_service.send_notification(contact_form, contact_id, received)
+        if channel == "smtp":
+            return await self.send_contact_form_email(contact_form)
+        raise ValueError(f"不明な配送先です: {channel}")
+    
+    @traced("contact.accept")
+    async def accept_contact_form(
+        self,
+        contact_form: ContactForm,
+        ip_address: str = None
+    ) -> dict:
+        """お問い合わせをアウトボックスに保存して受け付けます（S3保存・SNS通知はバックグラウンドで行う）"""
+        if not self.available:
+            return {
+                "success": False,
+                "error": "メールサービスが利用できません"
+            }
         
-        # メールアドレスベースの制限（1時間に3回）
-        if not await self.rate_limiter.check_rate_limit(f"email:{email}", 3, 3600):
-            return False
+        # レート制限チェック
+        if ip_address and not await self.check_rate_limit(ip_address, contact_form.email):
+            return {
+                "success": False,
+                "error": "送信制限を超えました。しばらく時間をおいてから再度お試しください。"
+            }
+        
+        channels = self.outbox_channels()
+        if not channels:
+            # 配送先がない場合は保存しても配送されないため、従来どおりリクエストの中で処理する
+            return await self.process_contact_form(contact_form)
+        try:
+            contact_id = await contact_outbox.submit(contact_form.model_dump(), channels)
+        except Exception as e:
+            # アウトボックスに書き込めない場合は従来どおりリクエストの中で処理する（レート制限は判定済み）
+            print(f"アウトボックス: 保存失敗のため直接処理します ({type(e).__name__}: {str(e)})")
+            return await self.process_contact_form(contact_form)
         
-        return True
+        return {
+            "success": True,
+            "contact_id": contact_id,
+            "message": "お問い合わせを受け付けました。" + (
+                "SNS通知でお知らせします。" if "sns" in channels
+                else "開発環境でお問い合わせを受け付けました。" if self.is_local
+                else ""
+            ),
+            "errors": None
+        }
     
+    @traced("contact.process")
     async def process_contact_form(
         self, 
         contact_form: ContactForm,
@@ -357,6 +423,7 @@ class EmailService:
                 "error": f"お問い合わせの処理に失敗しました: {str(e)}"
             }
     
+    @traced("contact.send_email")
     async def send_contact_form_email(
         self, 
         contact_form: ContactForm,
@@ -380,7 +447,8 @@ class EmailService:
             )
             
             # メール送信
-            await self.fastmail.send_message(admin_message)
+            with track_backend("smtp", "send_message"):
+                await self.fastmail.send_message(admin_message)
             
             print("メール送信: 成功")
             return True
@@ -414,7 +482,8 @@ class EmailService:
                 subtype=MessageType.html
             )
             
-            await self.fastmail.send_message(email_message)
+            with track_backend("smtp", "send_message"):
+                await self.fastmail.send_message(email_message)
             print("通知メール: 送信成功")
             return True
             
@@ -473,10 +542,14 @@ class EmailService:
 
 # グローバルインスタンス（遅延初期化）
 email_service = None
+_email_service_lock = threading.Lock()
 
 def get_email_service():
     """メールサービスのインスタンスを取得"""
     global email_service
     if email_service is None:
-        email_service = EmailService()
+        # 起動処理（スレッド）とリクエストから同時に呼ばれても1回だけ作成する
+        with _email_service_lock:
+            if email_service is None:
+                email_service = EmailService()
     return email_service 
\ No newline at end of file
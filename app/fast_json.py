@@ -0,0 +1,40 @@
+from typing import Any
+from fastapi.responses import Response
+from .timing import span
+import json
+import os
+
+# orjsonはオプション（未インストールの場合は標準のjsonを使用）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 読み取り系のエンドポイントでレスポンスモデルの検証を省略してJSONを返す（デフォルトは有効）
+FAST_RESPONSES_ENABLED = os.getenv("FAST_RESPONSES_ENABLED", "true").lower() == "true"
+
+def dumps(content: Any) -> bytes:
+    """JSONにエンコードします（JSONResponse と同じく非ASCII文字はそのまま出力）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """レスポンスモデルによる検証・変換を通さずにJSONを返すレスポンス
+
+    エンドポイントが Response を返すとFastAPIは response_model の検証を行わないため、
+    response_model はOpenAPIのスキーマのためだけに使われます。
+    内容がレスポンスモデルと同じ形であることは呼び出し側で保証してください。
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with span("render"):
+            return dumps(content)
+
+def fast_response(content: Any) -> Any:
+    """FAST_RESPONSES_ENABLED の場合は FastJSONResponse、それ以外はそのまま返します"""
+    if FAST_RESPONSES_ENABLED:
+        return FastJSONResponse(content)
+    return content
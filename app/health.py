@@ -0,0 +1,196 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+
+# 依存先のヘルスチェックの間隔・タイムアウト（秒）
+# 間隔は依存先ごとに HEALTH_PROBE_INTERVAL_<名前> で上書きできる（例: HEALTH_PROBE_INTERVAL_S3=30）
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+
+# この回数連続で失敗した依存先は unhealthy（それまでは degraded）
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+
+# 直近この回数の結果に失敗が含まれる場合は、現在成功していても degraded（不安定な依存先の検出）
+HEALTH_WINDOW = int(os.getenv("HEALTH_WINDOW", "10"))
+
+class ProbeDisabled(Exception):
+    """依存先が無効（設定されていない・開発環境で使わない）であることを示す例外"""
+
+class _Probe:
+    """1つの依存先のヘルスチェックと直近の結果"""
+    def __init__(self, name: str, check: Callable[[], Any], critical: bool, interval: float):
+        self.name = name
+        self.check = check
+        self.critical = critical
+        self.interval = interval
+        self.results: Deque[bool] = deque(maxlen=max(HEALTH_WINDOW, 1))
+        self.consecutive_failures = 0
+        self.disabled = False
+        self.detail: Any = None
+        self.error: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[str] = None
+        self.inflight: Optional[asyncio.Future] = None
+
+    @property
+    def status(self) -> str:
+        if self.disabled:
+            return "disabled"
+        if not self.results:
+            return "pending"
+        if self.consecutive_failures >= HEALTH_FAILURE_THRESHOLD:
+            return "unhealthy"
+        if self.consecutive_failures or not all(self.results):
+            return "degraded"
+        return "healthy"
+
+    @property
+    def ok(self) -> Optional[bool]:
+        """直近のチェックが成功したかどうか（未実行・無効の場合はNone）"""
+        if self.disabled or not self.results:
+            return None
+        return self.results[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "critical": self.critical,
+            "ok": self.ok,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "error": self.error
+        }
+
+class HealthProber:
+    """依存先のヘルスチェックをバックグラウンドで定期的に実行し、結果をキャッシュします
+
+    /readyz や各サービスのヘルスチェックのエンドポイントはキャッシュした結果を返すため、
+    ロードバランサーから頻繁に呼ばれても依存先への問い合わせは増えません。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probes: Dict[str, _Probe] = {}
+
+    def register(self, name: str, check: Callable[[], Any], critical: bool = False, interval: Optional[float] = None):
+        """依存先を登録します
+
+        check はスレッドで実行される同期関数です。例外を送出すると失敗、ProbeDisabled の場合は無効として扱います。
+        戻り値は detail() で取得できます。critical=True の依存先が unhealthy の場合は /readyz が503になります。
+        """
+        if interval is None:
+            interval = float(os.getenv(f"HEALTH_PROBE_INTERVAL_{name.upper()}", HEALTH_PROBE_INTERVAL))
+        with self._lock:
+            self._probes[name] = _Probe(name, check, critical, interval)
+
+    async def probe(self, name: str):
+        """依存先を1回チェックして結果を記録します"""
+        probe = self._probes[name]
+        start = time.perf_counter()
+        detail = None
+        error = None
+        disabled = False
+        if probe.inflight is not None and not probe.inflight.done():
+            # 前回のチェックがまだ終わっていない（スレッドを増やさない）
+            error = "previous probe still running"
+        else:
+            probe.inflight = asyncio.ensure_future(asyncio.to_thread(probe.check))
+            # タイムアウト後に完了した場合の例外は次回のチェックで扱うため、ここでは取り出すだけ
+            probe.inflight.add_done_callback(lambda future: future.cancelled() or future.exception())
+            try:
+                # タイムアウトしてもスレッドは止められないため、shield して完了を待たずに失敗として扱う
+                detail = await asyncio.wait_for(asyncio.shield(probe.inflight), HEALTH_PROBE_TIMEOUT)
+            except asyncio.TimeoutError:
+                error = f"timeout after {HEALTH_PROBE_TIMEOUT:g}s"
+            except ProbeDisabled as e:
+                disabled = True
+                error = str(e) or None
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+
+        with self._lock:
+            probe.disabled = disabled
+            probe.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            probe.checked_at = datetime.now(timezone.utc).isoformat()
+            probe.error = error
+            if not disabled:
+                ok = error is None
+                probe.results.append(ok)
+                probe.consecutive_failures = 0 if ok else probe.consecutive_failures + 1
+                if ok:
+                    probe.detail = detail
+
+    async def _run_probe(self, name: str):
+        probe = self._probes[name]
+        while True:
+            await self.probe(name)
+            await asyncio.sleep(probe.interval)
+
+    async def run(self):
+        """登録されたすべての依存先を定期的にチェックするバックグラウンドジョブ"""
+        await asyncio.gather(*(self._run_probe(name) for name in list(self._probes)))
+
+    def status(self, name: str) -> Optional[Dict[str, Any]]:
+        """依存先の直近の結果（未登録の場合はNone）"""
+        with self._lock:
+            probe = self._probes.get(name)
+            return probe.snapshot() if probe else None
+
+    def detail(self, name: str) -> Any:
+        """依存先の直近の成功したチェックの戻り値"""
+        with self._lock:
+            probe = self._probes.get(name)
+            return probe.detail if probe else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: probe.snapshot() for name, probe in self._probes.items()}
+
+    @property
+    def critical_healthy(self) -> bool:
+        """critical な依存先がすべて unhealthy でないかどうか"""
+        return all(
+            state["status"] != "unhealthy"
+            for state in self.snapshot().values()
+            if state["critical"]
+        )
+
+def _check_meilisearch():
+    from .search import get_client  # 循環インポートを避けるため関数内でインポート
+    return get_client().health()
+
+def _check_redis():
+    from .trending import trending_service
+    if not trending_service.available:
+        raise ProbeDisabled("Redisクライアントの初期化に失敗しました")
+    trending_service.redis.ping()
+
+def _check_s3():
+    from .s3_service import get_s3_service
+    info = get_s3_service().health_check()
+    if info["status"] != "healthy":
+        raise RuntimeError(info.get("error"))
+    return info
+
+def _check_sns():
+    from .email_service import get_email_service
+    service = get_email_service()
+    if not service.available or not service.sns_service.available:
+        raise ProbeDisabled("SNS通知は無効です")
+    service.sns_service.sns.get_topic_attributes(TopicArn=service.sns_service.topic_arn)
+
+def register_default_probes(prober: HealthProber):
+    """Meilisearch（critical）・Redis・S3・SNSのヘルスチェックを登録します"""
+    from .s3_service import BOTO3_AVAILABLE
+    prober.register("meilisearch", _check_meilisearch, critical=True)
+    prober.register("redis", _check_redis)
+    if BOTO3_AVAILABLE:
+        prober.register("s3", _check_s3)
+        prober.register("sns", _check_sns)
+
+# シングルトンインスタンス
+health_prober = HealthProber()
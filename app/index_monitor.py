@@ -0,0 +1,196 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import Header, HTTPException
+import asyncio
+import math
+import os
+import threading
+import time
+from .metrics import track_backend, record_indexing, record_indexing_task
+
+# タスクキューの監視間隔（秒）
+POLL_INTERVAL = float(os.getenv("INDEXING_POLL_INTERVAL", "2"))
+
+# 最古の未処理タスクの待ち時間（秒）の閾値
+# soft を超えると一括投入は拒否・通常の書き込みは遅延、hard を超えると全ての書き込みを拒否
+LAG_SOFT_LIMIT = float(os.getenv("INDEXING_LAG_SOFT_LIMIT", "5"))
+LAG_HARD_LIMIT = float(os.getenv("INDEXING_LAG_HARD_LIMIT", "30"))
+
+# soft〜hard の間で書き込みを遅延させる最大時間（秒）
+MAX_WRITE_DELAY = float(os.getenv("INDEXING_MAX_WRITE_DELAY", "1"))
+
+# 統計に使う完了タスク数
+_DURATION_WINDOW = 200
+
+def _percentile(values, ratio: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+def _as_datetime(value) -> Optional[datetime]:
+    """タスクの日時（datetimeまたはISO文字列）をUTCのdatetimeに変換します"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        # Meilisearchクライアントはタイムゾーンなし（UTC）で返す
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def _total(tasks) -> int:
+    """タスクの一覧の条件に一致する件数（total を返さない古いMeilisearchでは取得した件数）"""
+    total = getattr(tasks, "total", None)
+    return len(tasks.results) if total is None else int(total)
+
+class IndexingMonitor:
+    """Meilisearchのタスクキューを監視し、インデックス反映の遅れを計測します"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.processing = 0
+        self.oldest_pending_at: Optional[datetime] = None
+        self.last_poll_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._durations = deque(maxlen=_DURATION_WINDOW)  # 処理時間（秒）
+        self._latencies = deque(maxlen=_DURATION_WINDOW)  # 投入から完了まで（秒）
+        self._seen_uids = deque(maxlen=_DURATION_WINDOW * 2)
+        self.rejected_writes = 0
+        self.delayed_writes = 0
+
+    @property
+    def lag_seconds(self) -> float:
+        """最古の未処理タスクが投入されてからの経過時間"""
+        if self.oldest_pending_at is None:
+            return 0.0
+        return max(0.0, (datetime.now(timezone.utc) - self.oldest_pending_at).total_seconds())
+
+    @property
+    def stale(self) -> bool:
+        """監視結果が古い（Meilisearchに問い合わせできていない）かどうか"""
+        return self.last_poll_at is None or time.monotonic() - self.last_poll_at > POLL_INTERVAL * 5
+
+    def poll(self):
+        """タスクキューの状態を取得します"""
+        from .search import get_client, INDEX_NAME  # 循環インポートを避けるため関数内でインポート
+
+        client = get_client()
+        with track_backend("meilisearch", "get_tasks"):
+            # タスクは新しい順に返されるため、件数は total から取り、最古の未処理タスクは逆順で1件だけ取得する
+            # （未処理のタスクが多いときこそ遅れを正しく計測する必要がある）
+            oldest = client.get_tasks({
+                "indexUids": [INDEX_NAME],
+                "statuses": ["enqueued", "processing"],
+                "reverse": "true",
+                "limit": 1
+            })
+            processing = client.get_tasks({
+                "indexUids": [INDEX_NAME],
+                "statuses": ["processing"],
+                "limit": 1
+            })
+            finished = client.get_tasks({
+                "indexUids": [INDEX_NAME],
+                "statuses": ["succeeded", "failed"],
+                "limit": 50
+            }).results
+
+        completed = []
+        with self._lock:
+            pending_total = _total(oldest)
+            self.processing = _total(processing)
+            self.enqueued = max(0, pending_total - self.processing)
+            self.oldest_pending_at = _as_datetime(oldest.results[0].enqueued_at) if oldest.results else None
+
+            for task in finished:
+                if task.uid in self._seen_uids:
+                    continue
+                self._seen_uids.append(task.uid)
+                enqueued_at = _as_datetime(task.enqueued_at)
+                started_at = _as_datetime(task.started_at)
+                finished_at = _as_datetime(task.finished_at)
+                duration = (finished_at - started_at).total_seconds() if started_at and finished_at else None
+                latency = (finished_at - enqueued_at).total_seconds() if enqueued_at and finished_at else None
+                if duration is not None:
+                    self._durations.append(duration)
+                if latency is not None:
+                    self._latencies.append(latency)
+                completed.append((duration, latency))
+
+            self.last_poll_at = time.monotonic()
+            self.last_error = None
+        record_indexing(self.enqueued, self.processing, self.lag_seconds)
+        for duration, latency in completed:
+            record_indexing_task(duration, latency)
+
+    async def run(self, interval: float = POLL_INTERVAL):
+        """定期的にタスクキューを監視するバックグラウンドジョブ"""
+        while True:
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {str(e)}"
+            await asyncio.sleep(interval)
+
+    def write_delay(self, bulk: bool = False) -> float:
+        """書き込み前の待ち時間を返します（拒否する場合は HTTPException を送出）"""
+        if self.stale:
+            return 0.0  # 監視できていない場合は制限しない
+
+        lag = self.lag_seconds
+        limit = LAG_SOFT_LIMIT if bulk else LAG_HARD_LIMIT
+        if lag >= limit:
+            self.rejected_writes += 1
+            retry_after = max(1, math.ceil(lag - LAG_SOFT_LIMIT + POLL_INTERVAL))
+            raise HTTPException(
+                status_code=429,
+                detail="インデックスの反映が遅れているため、しばらく時間をおいて再度お試しください。",
+                headers={"Retry-After": str(retry_after)}
+            )
+        if lag > LAG_SOFT_LIMIT:
+            self.delayed_writes += 1
+            ratio = (lag - LAG_SOFT_LIMIT) / max(LAG_HARD_LIMIT - LAG_SOFT_LIMIT, 1e-9)
+            return MAX_WRITE_DELAY * ratio
+        return 0.0
+
+    def snapshot(self) -> dict:
+        """監視結果を返します"""
+        with self._lock:
+            durations = list(self._durations)
+            latencies = list(self._latencies)
+        return {
+            "enqueued_tasks": self.enqueued,
+            "processing_tasks": self.processing,
+            "oldest_pending_task_age_seconds": round(self.lag_seconds, 3),
+            "task_duration_seconds": {
+                "p50": _percentile(durations, 0.5),
+                "p95": _percentile(durations, 0.95),
+                "max": max(durations) if durations else None
+            },
+            "task_latency_seconds": {
+                "p50": _percentile(latencies, 0.5),
+                "p95": _percentile(latencies, 0.95),
+                "max": max(latencies) if latencies else None
+            },
+            "backpressure": {
+                "soft_limit_seconds": LAG_SOFT_LIMIT,
+                "hard_limit_seconds": LAG_HARD_LIMIT,
+                "delayed_writes": self.delayed_writes,
+                "rejected_writes": self.rejected_writes
+            },
+            "stale": self.stale,
+            "last_error": self.last_error
+        }
+
+# シングルトンインスタンス
+indexing_monitor = IndexingMonitor()
+
+async def check_write_backpressure(
+    x_write_priority: Optional[str] = Header(None, description="一括投入の場合は bulk を指定")
+):
+    """書き込みAPI用の依存関数: インデックスの遅れに応じて遅延・拒否します"""
+    delay = indexing_monitor.write_delay(bulk=x_write_priority == "bulk")
+    if delay > 0:
+        await asyncio.sleep(delay)
@@ -0,0 +1,172 @@
+from collections import Counter, deque
+from typing import List, Optional
+from .metrics import record_loop_lag
+from .profiling import StackSampler, format_stack
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+# イベントループの監視（デフォルトは有効）
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+
+# 遅延を計測する間隔（秒）
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))
+
+# この時間（秒）以上イベントループが止まった場合にブロックしている処理のスタックを記録
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+
+# 常時動かすサンプリングプロファイラーの間隔（秒、0で無効）
+CONTINUOUS_PROFILE_INTERVAL = float(os.getenv("CONTINUOUS_PROFILE_INTERVAL", "0.05"))
+
+# 集計するスタックの種類の上限（超えた分は [other] にまとめる）
+CONTINUOUS_PROFILE_MAX_STACKS = int(os.getenv("CONTINUOUS_PROFILE_MAX_STACKS", "5000"))
+
+# 保持するブロックの記録数
+_BLOCK_EVENTS = 100
+_LAG_WINDOW = 1000
+
+logger = logging.getLogger(__name__)
+
+def _percentile(values, ratio: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+class LoopMonitor:
+    """イベントループの遅延を計測し、ループを止めている処理を検出します
+
+    - ループ内のタスクが一定間隔でスリープし、予定より遅れて起きた時間を遅延として記録
+    - 監視スレッドがループの応答（ハートビート）を確認し、LOOP_BLOCK_THRESHOLD 以上
+      止まっていればその時点のループスレッドのスタックを記録・ログ出力
+    - ループスレッドのスタックを常時サンプリングし、/debug/profile でflamegraph用に出力
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.perf_counter()
+        self._lags = deque(maxlen=_LAG_WINDOW)
+        self.max_lag = 0.0
+        self.block_count = 0
+        self.blocking_stacks: Counter = Counter()
+        self._events = deque(maxlen=_BLOCK_EVENTS)
+        self._current_event: Optional[dict] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self.sampler: Optional[StackSampler] = None
+        if CONTINUOUS_PROFILE_INTERVAL > 0:
+            self.sampler = StackSampler(
+                interval=CONTINUOUS_PROFILE_INTERVAL,
+                skip_idle=True,
+                max_stacks=CONTINUOUS_PROFILE_MAX_STACKS
+            )
+
+    async def run(self, interval: float = LOOP_MONITOR_INTERVAL):
+        """イベントループの遅延を計測するバックグラウンドジョブ"""
+        if not LOOP_MONITOR_ENABLED:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        if self.sampler is not None:
+            self.sampler.add_thread(self._loop_thread_id)
+            self.sampler.start()
+
+        try:
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(interval)
+                now = time.perf_counter()
+                self._heartbeat = now
+                self._record_lag(max(0.0, now - start - interval))
+        finally:
+            self._stop.set()
+            if self.sampler is not None:
+                self.sampler.stop()
+
+    def _record_lag(self, lag: float):
+        record_loop_lag(lag)
+        with self._lock:
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            event = self._current_event
+            if event is not None:
+                # ブロックが解消したので、実際に止まっていた時間を記録する
+                event["duration_seconds"] = round(lag, 4)
+                self._current_event = None
+                logger.warning(
+                    f"イベントループが {lag * 1000:.0f}ms ブロックされました: {' > '.join(event['stack'].split(';')[-3:])}"
+                )
+
+    def _watch(self):
+        """ループが止まっていないかを確認する監視スレッド"""
+        check_interval = max(LOOP_BLOCK_THRESHOLD / 2, 0.01)
+        while not self._stop.wait(check_interval):
+            stalled = time.perf_counter() - self._heartbeat - LOOP_MONITOR_INTERVAL
+            if stalled < LOOP_BLOCK_THRESHOLD or self._current_event is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = format_stack(frame)
+            with self._lock:
+                self.block_count += 1
+                self.blocking_stacks[stack] += 1
+                self._current_event = {
+                    "detected_at": time.time(),
+                    "duration_seconds": None,  # 解消した時点で記録
+                    "stack": stack
+                }
+                self._events.append(self._current_event)
+
+    def folded(self, source: str = "sampled") -> str:
+        """folded 形式のスタック（sampled: 常時サンプリング、blocking: ブロック検出時）"""
+        if source == "blocking":
+            with self._lock:
+                stacks = self.blocking_stacks.most_common()
+            return "".join(f"{stack} {count}\n" for stack, count in stacks)
+        return self.sampler.folded() if self.sampler is not None else ""
+
+    def reset(self):
+        with self._lock:
+            self.blocking_stacks = Counter()
+            self._events.clear()
+            self._lags.clear()
+            self.max_lag = 0.0
+            self.block_count = 0
+        if self.sampler is not None:
+            self.sampler.reset()
+
+    def snapshot(self, events: int = 20) -> dict:
+        """遅延の統計と直近のブロックを返します"""
+        with self._lock:
+            lags = list(self._lags)
+            recent: List[dict] = [dict(event) for event in list(self._events)[-events:]] if events else []
+        sampler = self.sampler
+        return {
+            "enabled": LOOP_MONITOR_ENABLED,
+            "interval_seconds": LOOP_MONITOR_INTERVAL,
+            "block_threshold_seconds": LOOP_BLOCK_THRESHOLD,
+            "lag_seconds": {
+                "p50": _percentile(lags, 0.5),
+                "p99": _percentile(lags, 0.99),
+                "max": self.max_lag
+            },
+            "block_count": self.block_count,
+            "recent_blocks": list(reversed(recent)),
+            "profile": {
+                "interval_seconds": CONTINUOUS_PROFILE_INTERVAL,
+                "samples": sampler.total_samples if sampler else 0,
+                "idle_samples": sampler.idle_samples if sampler else 0,
+                "distinct_stacks": len(sampler.samples) if sampler else 0
+            }
+        }
+
+# シングルトンインスタンス
+loop_monitor = LoopMonitor()
@@ -1,46 +1,80 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from fastapi.openapi.utils import get_openapi
 from contextlib import asynccontextmanager
-from .routers import news, contact
+from .routers import news, contact, admin, debug
 from . import search
+from .trending import trending_service
+from .index_monitor import indexing_monitor
+from .loop_monitor import loop_monitor
+from .search_stats import search_stats
+from .middleware import AccessLogMiddleware
+from .compression import CompressionMiddleware
+from .admission import AdmissionControlMiddleware
+from .rate_limit import RateLimitMiddleware
+from .redis_pool import close_async_redis
+from .s3_service import get_s3_service, BOTO3_AVAILABLE
+from .email_service import get_email_service
+from .outbox import CONTACT_OUTBOX_ENABLED, contact_outbox
+from .startup import Dependency, readiness
+from .health import health_prober, register_default_probes
+from . import access_log, aws, metrics, profiling, startup, timing, tracing
+from .access_log import mask_personal_info  # 後方互換のため
+import asyncio
 import yaml
-import json
-import re
-import logging
-import os
-from pathlib import Path
-
-# ログ設定
-def setup_logging():
-    """ログ設定を初期化"""
-    # logsディレクトリを作成
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    # ログファイルのパス
-    log_file = logs_dir / "api.log"
-    
-    # ログ設定
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler()  # コンソールにも出力
-        ]
-    )
 
-# ログ設定を初期化
-setup_logging()
+# ログ設定を初期化（書き込みはバックグラウンドのスレッドで行う）
+access_log.setup_logging()
+
+# 依存先のヘルスチェック（バックグラウンドで定期的に実行し、結果をキャッシュ）
+register_default_probes(health_prober)
+
+def _init_search():
+    """Meilisearchのインデックス設定・メモリ上のインデックスの構築"""
+    search.setup_index()
+    search.rebuild_in_memory_indexes()
+
+def _startup_dependencies():
+    """起動時に並行して初期化する依存先（タイムアウトは STARTUP_TIMEOUT_<名前> で設定）"""
+    dependencies = [Dependency("meilisearch", _init_search)]
+    if BOTO3_AVAILABLE:
+        dependencies.append(Dependency("s3", lambda: get_s3_service().ensure_bucket(), required=False))
+    dependencies.append(Dependency("email", get_email_service, required=False))
+    return dependencies
+
+async def _deliver_contact(channel: str, contact_id: str, payload: dict, received_at: float) -> bool:
+    """アウトボックスのお問い合わせを配送します（メールサービスの初期化が終わっていない場合は待つ）"""
+    email_service = await asyncio.to_thread(get_email_service)
+    return await email_service.deliver_contact(channel, contact_id, payload, received_at)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 起動時の処理
-    search.setup_index()
+    access_log.setup_logging()
+    # 外部サービスのクライアントは並行して初期化する（到達できない依存先があっても起動は止まらない）
+    retry_tasks = await startup.initialize(_startup_dependencies())
+    background_tasks = retry_tasks + [
+        asyncio.create_task(health_prober.run()),
+        asyncio.create_task(trending_service.run_flusher()),
+        asyncio.create_task(indexing_monitor.run()),
+        asyncio.create_task(loop_monitor.run()),
+        asyncio.create_task(search_stats.run_flusher()),
+        # サジェスト・関連記事のインデックスはワーカーごとのため、他のワーカーでの書き込みを定期的に反映する
+        asyncio.create_task(search.run_index_sync())
+    ]
+    if CONTACT_OUTBOX_ENABLED:
+        # 起動前に保存された未配送のお問い合わせも含めてバックグラウンドで配送する
+        background_tasks.append(asyncio.create_task(contact_outbox.run(_deliver_contact)))
     yield
-    # 終了時の処理（必要に応じて）
+    # 終了時の処理
+    for task in background_tasks:
+        task.cancel()
+    await close_async_redis()
+    contact_outbox.close()
+    await asyncio.to_thread(aws.shutdown)
+    await asyncio.to_thread(tracing.shutdown)
+    access_log.shutdown_logging()
 
 app = FastAPI(
     title="News API",
@@ -51,6 +85,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# ルートの種類ごとの同時実行数の制限（過負荷時は503で早めに返す。CORSヘッダーを付けるため最も内側に追加）
+app.add_middleware(AdmissionControlMiddleware)
+
+# 公開の読み取り系エンドポイントのレート制限（同時実行数の制限より前に判定する）
+app.add_middleware(RateLimitMiddleware)
+
 # CORSの設定
 app.add_middleware(
     CORSMiddleware,
@@ -60,73 +100,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def mask_personal_info(data_str: str) -> str:
-    """個人情報をマスクする関数"""
-    try:
-        # JSONとしてパース
-        data = json.loads(data_str)
-        
-        # 個人情報フィールドをマスク（件名とメッセージは除外）
-        sensitive_fields = ['email', 'phone', 'name', 'company']
-        
-        def mask_value(value):
-            if isinstance(value, str) and len(value) > 0:
-                # 全ての文字列を完全にマスク
-                return '*' * len(value)
-            return value
-        
-        # データをマスク
-        if isinstance(data, dict):
-            for field, value in data.items():
-                if value and isinstance(value, str):
-                    # 指定されたフィールドまたはメールアドレスを含む値をマスク
-                    if field in sensitive_fields or '@' in value:
-                        data[field] = mask_value(value)
-        
-        return json.dumps(data, ensure_ascii=False)
-    except (json.JSONDecodeError, Exception):
-        # JSONでない場合は正規表現でマスク
-        # メールアドレスを完全にマスク
-        def mask_email(match):
-            full_email = match.group(0)
-            return '*' * len(full_email)
-        
-        data_str = re.sub(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', mask_email, data_str)
-        
-        # 電話番号を完全にマスク
-        def mask_phone(match):
-            full_phone = match.group(0)
-            return '*' * len(full_phone)
-        
-        data_str = re.sub(r'\d{2,3}-\d{4}-\d{4}', mask_phone, data_str)
-        data_str = re.sub(r'\d{3}-\d{4}-\d{4}', mask_phone, data_str)
-        return data_str
-
-# リクエストログ用ミドルウェア
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"リクエスト: {request.method} {request.url}")
-    if request.method in ["POST", "PUT", "PATCH"]:
-        body = await request.body()
-        # バイナリデータの場合は適切に処理
-        try:
-            if body:
-                # Content-Typeをチェック
-                content_type = request.headers.get("content-type", "")
-                if "multipart/form-data" in content_type:
-                    print(f"ボディ: [multipart/form-data - {len(body)} bytes]")
-                elif "application/octet-stream" in content_type:
-                    print(f"ボディ: [binary data - {len(body)} bytes]")
-                else:
-                    body_str = body.decode('utf-8')
-                    masked_body = mask_personal_info(body_str)
-                    print(f"ボディ: {masked_body}")
-            else:
-                print("ボディ: (空)")
-        except UnicodeDecodeError:
-            print(f"ボディ: [binary data - {len(body)} bytes]")
-    response = await call_next(request)
-    return response
+# レスポンス圧縮用ミドルウェア（アクセスログ・メトリクスには圧縮後のサイズが記録される）
+app.add_middleware(CompressionMiddleware)
+
+# メトリクス収集用ミドルウェア
+app.add_middleware(metrics.MetricsMiddleware)
+
+# リクエストID・アクセスログ・ボディサイズ制限用ミドルウェア（ASGIミドルウェアとして実装）
+app.add_middleware(AccessLogMiddleware)
+
+# Server-Timingヘッダー出力用ミドルウェア（全体の処理時間を計測するため最も外側に追加）
+app.add_middleware(timing.ServerTimingMiddleware)
+
+# トレース用ミドルウェア（traceparentの引き継ぎ・サーバースパンの記録）
+app.add_middleware(tracing.TracingMiddleware)
+
+# リクエスト単位のプロファイラー（PROFILE_SECRET が設定されている場合のみ）
+if profiling.PROFILE_SECRET:
+    app.add_middleware(profiling.ProfilerMiddleware)
 
 # 静的ファイルの配信は廃止（S3を使用）
 # import os
@@ -136,6 +127,8 @@ async def log_requests(request: Request, call_next):
 # ニュース記事のルーターを追加
 app.include_router(news.router, prefix="/api/v1/news", tags=["news"])
 app.include_router(contact.router, prefix="/api/v1", tags=["contact"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"])
 
 @app.get("/")
 def read_root():
@@ -146,6 +139,36 @@ def read_root():
         "redoc": "/redoc"
     }
 
+# ライブネスチェック（プロセスが応答できるかどうかのみ。依存先には問い合わせない）
+@app.get("/healthz", include_in_schema=False)
+def get_liveness():
+    return {"status": "ok"}
+
+# レディネスチェック（起動処理の状態とバックグラウンドのヘルスチェックの結果のみを返す）
+@app.get("/readyz", include_in_schema=False)
+def get_readiness():
+    startup_state = readiness.snapshot()
+    dependencies = health_prober.snapshot()
+    if not startup_state["ready"] or not health_prober.critical_healthy:
+        status = "unavailable"
+    elif any(state["status"] in ("degraded", "unhealthy") for state in dependencies.values()):
+        # critical でない依存先の障害・不安定な依存先はトラフィックを止めずに degraded として返す
+        status = "degraded"
+    else:
+        status = "ready"
+    return JSONResponse(
+        {"status": status, "startup": startup_state["dependencies"], "dependencies": dependencies},
+        status_code=503 if status == "unavailable" else 200
+    )
+
+# Prometheus メトリクスエンドポイント
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    body = metrics.render_metrics()
+    if body is None:
+        return Response(content="prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+    return Response(content=body, media_type=metrics.CONTENT_TYPE_LATEST)
+
 # OpenAPI YAML エンドポイント
 @app.get("/openapi.yaml", include_in_schema=False)
 async def get_openapi_yaml():
@@ -0,0 +1,223 @@
+from contextlib import contextmanager
+from typing import Optional
+from . import timing, tracing
+import os
+import time
+
+# prometheus_clientはオプション（未インストールの場合はメトリクスを記録しない）
+# 複数ワーカーで集計する場合は、起動前に PROMETHEUS_MULTIPROC_DIR に
+# 空のディレクトリを指定してください（prometheus_clientのマルチプロセスモード）
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram,
+        CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+    )
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# レイテンシのバケット（秒）: APIは数ms〜数秒、バックエンド呼び出しは1ms未満もある
+_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Meilisearchのタスクの処理時間のバケット（秒）: 小さな書き込みは数十ms、一括投入は数分かかることもある
+_INDEXING_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+if PROMETHEUS_AVAILABLE:
+    REQUESTS = Counter(
+        "news_api_http_requests_total",
+        "HTTPリクエスト数",
+        ["method", "route", "status"]
+    )
+    REQUEST_LATENCY = Histogram(
+        "news_api_http_request_duration_seconds",
+        "HTTPリクエストの処理時間",
+        ["method", "route", "status"],
+        buckets=_LATENCY_BUCKETS
+    )
+    BACKEND_LATENCY = Histogram(
+        "news_api_backend_call_duration_seconds",
+        "外部サービス（Meilisearch, S3, SNS, Redis, SMTP）呼び出しの処理時間",
+        ["backend", "operation", "status"],
+        buckets=_LATENCY_BUCKETS
+    )
+    CACHE_REQUESTS = Counter(
+        "news_api_cache_requests_total",
+        "インメモリキャッシュの参照数（ヒット率は hit / (hit + miss)）",
+        ["cache", "result"]
+    )
+    THREADPOOL_IN_USE = Gauge(
+        "news_api_threadpool_in_use",
+        "同期エンドポイント用スレッドプールの使用中スレッド数",
+        multiprocess_mode="livesum"
+    )
+    THREADPOOL_SIZE = Gauge(
+        "news_api_threadpool_size",
+        "同期エンドポイント用スレッドプールの最大スレッド数",
+        multiprocess_mode="livesum"
+    )
+    INDEXING_TASKS = Gauge(
+        "news_api_meilisearch_pending_tasks",
+        "Meilisearchの未処理タスク数",
+        ["status"],
+        multiprocess_mode="livemax"
+    )
+    LOOP_LAG = Histogram(
+        "news_api_event_loop_lag_seconds",
+        "イベントループの遅延（ブロッキング処理の検出用）",
+        buckets=_LATENCY_BUCKETS
+    )
+    INDEXING_LAG = Gauge(
+        "news_api_meilisearch_oldest_pending_task_age_seconds",
+        "Meilisearchの最古の未処理タスクの待ち時間",
+        multiprocess_mode="livemax"
+    )
+    INDEXING_DURATION = Histogram(
+        "news_api_meilisearch_task_duration_seconds",
+        "完了したMeilisearchのタスクの処理時間（processing: 開始から完了、total: 投入から完了）"
+        "。各ワーカーが記録するため、マルチプロセスモードの件数はワーカー数倍になる",
+        ["phase"],
+        buckets=_INDEXING_BUCKETS
+    )
+    ADMISSION_LIMIT = Gauge(
+        "news_api_admission_limit",
+        "ルートの種類ごとの同時実行数の上限（レイテンシに応じて調整）",
+        ["route_class"],
+        multiprocess_mode="livesum"
+    )
+    ADMISSION_QUEUED = Gauge(
+        "news_api_admission_queued",
+        "ルートの種類ごとの実行待ちのリクエスト数",
+        ["route_class"],
+        multiprocess_mode="livesum"
+    )
+    ADMISSION_REJECTED = Counter(
+        "news_api_admission_rejected_total",
+        "過負荷のため503で拒否したリクエスト数",
+        ["route_class", "reason"]
+    )
+
+@contextmanager
+def track_backend(backend: str, operation: str):
+    """外部サービス呼び出しの処理時間を記録します（Server-Timing・トレースが有効な場合はリクエストにも記録）"""
+    recorder = timing.current()
+    if not PROMETHEUS_AVAILABLE and recorder is None and tracing.current_span() is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        with tracing.start_span(
+            f"{backend}.{operation}",
+            kind="client",
+            attributes={"backend": backend, "operation": operation}
+        ):
+            yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if PROMETHEUS_AVAILABLE:
+            BACKEND_LATENCY.labels(backend, operation, status).observe(elapsed)
+        if recorder is not None:
+            recorder.add(f"{backend}.{operation}", elapsed)
+
+def record_cache(cache: str, hit: bool):
+    """キャッシュの参照結果を記録します"""
+    if PROMETHEUS_AVAILABLE:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_indexing(enqueued: int, processing: int, lag_seconds: float):
+    """インデックスのタスクキューの状態を記録します"""
+    if PROMETHEUS_AVAILABLE:
+        INDEXING_TASKS.labels("enqueued").set(enqueued)
+        INDEXING_TASKS.labels("processing").set(processing)
+        INDEXING_LAG.set(lag_seconds)
+
+def record_indexing_task(duration: Optional[float], latency: Optional[float]):
+    """完了したインデックスのタスクの処理時間・投入から完了までの時間を記録します"""
+    if PROMETHEUS_AVAILABLE:
+        if duration is not None:
+            INDEXING_DURATION.labels("processing").observe(duration)
+        if latency is not None:
+            INDEXING_DURATION.labels("total").observe(latency)
+
+def record_admission(route_class: str, limit: int, queued: int, rejected_reason: Optional[str] = None):
+    """同時実行数の制限の状態（拒否した場合はその理由）を記録します"""
+    if PROMETHEUS_AVAILABLE:
+        ADMISSION_LIMIT.labels(route_class).set(limit)
+        ADMISSION_QUEUED.labels(route_class).set(queued)
+        if rejected_reason is not None:
+            ADMISSION_REJECTED.labels(route_class, rejected_reason).inc()
+
+def record_loop_lag(lag_seconds: float):
+    """イベントループの遅延を記録します"""
+    if PROMETHEUS_AVAILABLE:
+        LOOP_LAG.observe(lag_seconds)
+
+def _record_threadpool():
+    """スレッドプールの使用状況を記録します（イベントループ内から呼び出す）"""
+    try:
+        import anyio.to_thread
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+        THREADPOOL_SIZE.set(limiter.total_tokens)
+    except Exception:
+        pass
+
+def _route_template(scope) -> str:
+    """メトリクスのラベル用にルートのパステンプレートを返します（IDごとに分かれないように）"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """リクエスト数・レイテンシをルートテンプレートごとに記録するASGIミドルウェア"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROMETHEUS_AVAILABLE:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            labels = (scope["method"], _route_template(scope), str(status_code))
+            REQUESTS.labels(*labels).inc()
+            REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+            _record_threadpool()
+
+def render_metrics() -> Optional[bytes]:
+    """Prometheusのテキスト形式でメトリクスを返します（未インストールの場合はNone）"""
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    _record_threadpool()
+    if MULTIPROCESS_DIR:
+        # 全ワーカーのメトリクスを集計する
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead(pid: int):
+    """終了したワーカーのメトリクスファイルを片付けます（gunicornの child_exit フック用）"""
+    if PROMETHEUS_AVAILABLE and MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
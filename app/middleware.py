@@ -0,0 +1,124 @@
+from typing import List, Optional
+from . import access_log, timing
+import json
+import os
+import time
+import uuid
+
+# リクエストボディの最大サイズ（バイト）。超えた場合は413を返す
+# サムネイル画像（最大5MB）のmultipartエンコード分の余裕を含む
+MAX_REQUEST_BODY_SIZE = int(os.getenv("MAX_REQUEST_BODY_SIZE", str(6 * 1024 * 1024)))
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+async def _send_error(send, status: int, detail: str, request_id: str):
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"x-request-id", request_id.encode("latin-1"))
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AccessLogMiddleware:
+    """リクエストID・処理時間・アクセスログ・ボディサイズの制限を行うASGIミドルウェア
+
+    BaseHTTPMiddleware（@app.middleware("http")）と異なり、ボディを事前に読み込まず、
+    アプリが受信するチャンクをそのまま参照して記録します（ログに出力する場合のみ結合）。
+    """
+    def __init__(self, app, max_body_size: int = MAX_REQUEST_BODY_SIZE):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = _header(scope, b"x-request-id") or uuid.uuid4().hex
+        token = access_log.request_id_var.set(request_id)
+        request_id_header = (b"x-request-id", request_id.encode("latin-1"))
+
+        content_length = _header(scope, b"content-length")
+        declared_size = int(content_length) if content_length and content_length.isdigit() else None
+        capture = access_log.wants_body(scope["method"])
+        chunks: List[bytes] = []
+        captured = 0
+        received = 0
+        status_code = 500
+        response_bytes = 0
+        response_started = False
+        too_large = False
+
+        async def receive_wrapper():
+            nonlocal received, captured, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if received > self.max_body_size:
+                    # 例外を送出するとFastAPIがボディの解析エラー（400）として扱うため、
+                    # 以降のチャンクは渡さずに切断として伝え、アプリの応答の代わりに413を返す
+                    too_large = True
+                    return {"type": "http.disconnect"}
+                # ログに出力する先頭部分（ACCESS_LOG_MAX_BODY + 1バイトまで）のチャンクのみ、コピーせず参照を保持する
+                if capture and body and captured <= access_log.ACCESS_LOG_MAX_BODY:
+                    chunks.append(body)
+                    captured += len(body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes, response_started
+            if too_large and not response_started:
+                return  # 413を返すため、上限を超えた後のアプリの応答は破棄する
+            if message["type"] == "http.response.start":
+                response_started = True
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [request_id_header]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            if declared_size is not None and declared_size > self.max_body_size:
+                status_code = 413
+                await _send_error(send, 413, "リクエストボディが大きすぎます。", request_id)
+                return
+            try:
+                await self.app(scope, receive_wrapper, send_wrapper)
+            except Exception:
+                # 切断として扱ったことによるアプリの例外は無視する
+                if not too_large or response_started:
+                    raise
+            if too_large and not response_started:
+                status_code = 413
+                await _send_error(send, 413, "リクエストボディが大きすぎます。", request_id)
+        finally:
+            with timing.span("log"):
+                route = scope.get("route")
+                client = scope.get("client")
+                access_log.log_access(
+                    method=scope["method"],
+                    path=scope["path"],
+                    route=getattr(route, "path", None),
+                    status=status_code,
+                    latency_ms=(time.perf_counter() - start) * 1000,
+                    request_id=request_id,
+                    client=client[0] if client else None,
+                    request_bytes=received or declared_size,
+                    response_bytes=response_bytes,
+                    content_type=_header(scope, b"content-type"),
+                    body=(chunks[0] if len(chunks) == 1 else b"".join(chunks)) if capture else None
+                )
+            access_log.request_id_var.reset(token)
@@ -0,0 +1,314 @@
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# お問い合わせをローカルのアウトボックスに保存してからバックグラウンドで配送するかどうか（デフォルトは有効）
+# 無効にすると従来どおりリクエストの中でS3保存・SNS通知を行う
+CONTACT_OUTBOX_ENABLED = os.getenv("CONTACT_OUTBOX_ENABLED", "true").lower() == "true"
+
+# アウトボックスのファイル（SQLite・WALモード）。同じホストのワーカー間で共有する
+CONTACT_OUTBOX_PATH = Path(os.getenv("CONTACT_OUTBOX_PATH", "data/contact_outbox.db"))
+
+# 配送先（s3 / sns / smtp のカンマ区切り）。利用できない配送先は保存時に除外する
+CONTACT_OUTBOX_CHANNELS = [
+    channel.strip() for channel in os.getenv("CONTACT_OUTBOX_CHANNELS", "s3,sns").split(",") if channel.strip()
+]
+
+# 配送するワーカー（コルーチン）の数・一度に取り出す件数・新しい配送がない場合の確認間隔（秒）
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+
+# 配送中の扱いにする時間（秒）。ワーカーが途中で停止した場合は、この時間が過ぎると別のワーカーが再配送する
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+
+# 失敗した場合の再試行（指数バックオフ、秒）。OUTBOX_MAX_ATTEMPTS 回失敗するとデッドレターにする
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+
+# 全ての配送先に配送済みのお問い合わせを削除する間隔（秒）
+OUTBOX_PURGE_INTERVAL = float(os.getenv("OUTBOX_PURGE_INTERVAL", "60"))
+
+# 未配送・デッドレターのお問い合わせを保持する日数（過ぎると配送状態ごと削除する。個人情報を残し続けないため）
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# 書き込みの同期モード（FULL: コミットごとにfsync、NORMAL: チェックポイント時にまとめてfsync）
+# NORMAL はプロセスが停止しても失われないが、OS・電源の障害では直近のコミットが失われる可能性がある
+OUTBOX_SYNCHRONOUS = os.getenv("OUTBOX_SYNCHRONOUS", "FULL").upper()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    contact_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    contact_id TEXT NOT NULL REFERENCES contacts(contact_id),
+    channel TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    delivered_at REAL,
+    UNIQUE (contact_id, channel)
+);
+CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (status, next_attempt_at);
+"""
+
+# 配送処理: (配送先, お問い合わせID, 内容, 受付時刻) を受け取り、成功した場合にTrueを返す
+Deliver = Callable[[str, str, Dict[str, Any], float], Awaitable[bool]]
+
+def backoff_delay(attempts: int) -> float:
+    """attempts 回目の失敗の後に待つ時間（秒、ジッター付き）"""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+class ContactOutbox:
+    """お問い合わせの永続的なアウトボックス（SQLite）
+
+    リクエストではローカルのディスクへの書き込みだけを行い、S3・SNS・SMTPへの配送はバックグラウンドのワーカーが行います。
+    - 配送先ごとに配送状態を持つため、一部の配送先だけ失敗した場合もその配送先だけを再試行する
+    - 失敗した配送は指数バックオフで再試行し、OUTBOX_MAX_ATTEMPTS 回失敗するとデッドレター（status='dead'）にする
+    - 取り出した配送には期限（lease）を付けるため、複数のワーカー・プロセスで同じ配送を同時に行わない
+    - 全ての配送先に配送したお問い合わせ・OUTBOX_RETENTION_DAYS を過ぎたお問い合わせは削除する
+    配送先は同じお問い合わせを再配送しても重複しないように（お問い合わせIDをキーにして）処理してください。
+    """
+    def __init__(self, path: Path = CONTACT_OUTBOX_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stats = {"enqueued": 0, "delivered": 0, "retried": 0, "dead": 0, "purged": 0, "expired": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        # ロックを取得してから呼び出す
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'NORMAL' if OUTBOX_SYNCHRONOUS == 'NORMAL' else 'FULL'}")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """書き込みのトランザクションを実行します（他のプロセスの書き込みとはSQLiteのロックで直列化される）"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, payload: Dict[str, Any], channels: List[str], contact_id: Optional[str] = None) -> str:
+        """お問い合わせと配送先ごとの配送を1つのトランザクションで保存し、お問い合わせIDを返します"""
+        contact_id = contact_id or str(uuid.uuid4())
+        now = time.time()
+
+        def insert(conn):
+            conn.execute(
+                "INSERT INTO contacts (contact_id, payload, received_at) VALUES (?, ?, ?)",
+                (contact_id, json.dumps(payload, ensure_ascii=False), now)
+            )
+            conn.executemany(
+                "INSERT INTO deliveries (contact_id, channel, next_attempt_at) VALUES (?, ?, ?)",
+                [(contact_id, channel, now) for channel in channels]
+            )
+
+        self._write(insert)
+        self._stats["enqueued"] += 1
+        return contact_id
+
+    async def submit(self, payload: Dict[str, Any], channels: List[str]) -> str:
+        """お問い合わせを保存してワーカーに通知します（ディスクへの書き込みはスレッドで行う）"""
+        contact_id = await asyncio.to_thread(self.enqueue, payload, channels)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return contact_id
+
+    def claim(self, limit: int = OUTBOX_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """配送時刻になった配送を取り出し、配送中（lease）にします"""
+        now = time.time()
+
+        def select(conn):
+            rows = conn.execute(
+                """
+                SELECT d.id, d.contact_id, d.channel, d.attempts, c.payload, c.received_at
+                FROM deliveries d JOIN contacts c ON c.contact_id = d.contact_id
+                WHERE d.status = 'pending' AND d.next_attempt_at <= ? AND d.locked_until <= ?
+                ORDER BY d.next_attempt_at LIMIT ?
+                """,
+                (now, now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE deliveries SET locked_until = ? WHERE id = ?",
+                [(now + OUTBOX_LEASE_SECONDS, row[0]) for row in rows]
+            )
+            return rows
+
+        return [
+            {
+                "id": row[0],
+                "contact_id": row[1],
+                "channel": row[2],
+                "attempts": row[3],
+                "payload": json.loads(row[4]),
+                "received_at": row[5]
+            }
+            for row in self._write(select)
+        ]
+
+    def complete(self, delivery_id: int):
+        self._write(lambda conn: conn.execute(
+            "UPDATE deliveries SET status = 'delivered', delivered_at = ?, locked_until = 0, last_error = NULL WHERE id = ?",
+            (time.time(), delivery_id)
+        ))
+        self._stats["delivered"] += 1
+
+    def fail(self, delivery_id: int, attempts: int, error: str):
+        """失敗した配送を再試行の待ちにします（上限に達した場合はデッドレターにする）"""
+        dead = attempts >= OUTBOX_MAX_ATTEMPTS
+        self._write(lambda conn: conn.execute(
+            "UPDATE deliveries SET status = ?, attempts = ?, next_attempt_at = ?, locked_until = 0, last_error = ? WHERE id = ?",
+            ("dead" if dead else "pending", attempts, time.time() + backoff_delay(attempts), error[:500], delivery_id)
+        ))
+        self._stats["dead" if dead else "retried"] += 1
+
+    def requeue(self, delivery_id: int) -> bool:
+        """デッドレターの配送を再試行の待ちに戻します（対象がない場合はFalse）"""
+        cursor = self._write(lambda conn: conn.execute(
+            "UPDATE deliveries SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE id = ? AND status = 'dead'",
+            (time.time(), delivery_id)
+        ))
+        return cursor.rowcount > 0
+
+    def purge(self) -> int:
+        """全ての配送先に配送済みのお問い合わせと、保持期間を過ぎたお問い合わせを配送状態ごと削除します
+
+        戻り値は削除したお問い合わせの件数。
+        """
+        expires_at = time.time() - OUTBOX_RETENTION_DAYS * 86400
+
+        def delete(conn):
+            delivered = [row[0] for row in conn.execute(
+                """
+                SELECT c.contact_id FROM contacts c
+                WHERE NOT EXISTS (SELECT 1 FROM deliveries d WHERE d.contact_id = c.contact_id AND d.status != 'delivered')
+                """
+            )]
+            expired = [row[0] for row in conn.execute(
+                """
+                SELECT c.contact_id FROM contacts c
+                WHERE c.received_at < ?
+                AND EXISTS (SELECT 1 FROM deliveries d WHERE d.contact_id = c.contact_id AND d.status != 'delivered')
+                """,
+                (expires_at,)
+            )]
+            targets = [(contact_id,) for contact_id in delivered + expired]
+            conn.executemany("DELETE FROM deliveries WHERE contact_id = ?", targets)
+            conn.executemany("DELETE FROM contacts WHERE contact_id = ?", targets)
+            return len(delivered), len(expired)
+
+        delivered, expired = self._write(delete)
+        if expired:
+            print(f"アウトボックス: 保持期間（{OUTBOX_RETENTION_DAYS:g}日）を過ぎた未配送のお問い合わせを{expired}件削除しました")
+        self._stats["purged"] += delivered + expired
+        self._stats["expired"] += expired
+        return delivered + expired
+
+    async def deliver_batch(self, deliver: Deliver) -> int:
+        """配送時刻になった配送を1回分配送し、配送した件数を返します"""
+        items = await asyncio.to_thread(self.claim)
+        for item in items:
+            attempts = item["attempts"] + 1
+            try:
+                delivered = await deliver(item["channel"], item["contact_id"], item["payload"], item["received_at"])
+                error = None if delivered else "delivery failed"
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            if error is None:
+                await asyncio.to_thread(self.complete, item["id"])
+            else:
+                await asyncio.to_thread(self.fail, item["id"], attempts, error)
+                print(f"アウトボックス: {item['channel']} への配送失敗（{attempts}回目、{error}）")
+        return len(items)
+
+    async def _worker(self, deliver: Deliver):
+        while True:
+            # 配送中に保存されたお問い合わせの通知を取りこぼさないよう、取り出す前にクリアする
+            self._wakeup.clear()
+            try:
+                delivered = await self.deliver_batch(deliver)
+            except Exception as e:
+                print(f"アウトボックス: 配送処理のエラー ({type(e).__name__}: {str(e)})")
+                delivered = 0
+            if delivered:
+                continue
+            # 新しいお問い合わせが保存されるか、確認間隔が過ぎるまで待つ
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _purger(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.purge)
+            except Exception as e:
+                print(f"アウトボックス: 削除処理のエラー ({type(e).__name__}: {str(e)})")
+            await asyncio.sleep(OUTBOX_PURGE_INTERVAL)
+
+    async def run(self, deliver: Deliver, workers: int = OUTBOX_WORKERS):
+        """バックグラウンドで配送するジョブ（起動前に保存されていた未配送のお問い合わせも配送する）
+
+        配送済み・保持期間を過ぎたお問い合わせの削除も OUTBOX_PURGE_INTERVAL 秒ごとに行います。
+        """
+        self._wakeup = asyncio.Event()
+        await asyncio.gather(self._purger(), *(self._worker(deliver) for _ in range(max(workers, 1))))
+
+    def snapshot(self, dead_limit: int = 20) -> Dict[str, Any]:
+        """配送状態ごとの件数・最も古い未配送の待ち時間・直近のデッドレターを返します"""
+        with self._lock:
+            conn = self._connection()
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM deliveries GROUP BY status").fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(c.received_at) FROM deliveries d JOIN contacts c ON c.contact_id = d.contact_id WHERE d.status = 'pending'"
+            ).fetchone()[0]
+            dead = conn.execute(
+                "SELECT id, contact_id, channel, attempts, last_error FROM deliveries WHERE status = 'dead' ORDER BY id DESC LIMIT ?",
+                (dead_limit,)
+            ).fetchall()
+        return {
+            "enabled": CONTACT_OUTBOX_ENABLED,
+            "channels": CONTACT_OUTBOX_CHANNELS,
+            "counts": {status: counts.get(status, 0) for status in ("pending", "delivered", "dead")},
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "dead_letters": [
+                {"id": row[0], "contact_id": row[1], "channel": row[2], "attempts": row[3], "last_error": row[4]}
+                for row in dead
+            ],
+            "stats": dict(self._stats)
+        }
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                conn.close()
+
+# シングルトンインスタンス
+contact_outbox = ContactOutbox()
@@ -0,0 +1,237 @@
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+import codecs
+import json
+import os
+import re
+
+# 値を完全にマスクするフィールド名（カンマ区切り、JSONのキーと大文字・小文字を区別せずに一致するもの）
+PII_MASK_FIELDS = [
+    field.strip()
+    for field in os.getenv("PII_MASK_FIELDS", "email,phone,name,company").split(",")
+    if field.strip()
+]
+
+# どのフィールドでもマスクする値の正規表現（JSON配列で指定、デフォルトのメールアドレス・電話番号に追加）
+PII_MASK_PATTERNS: List[str] = json.loads(os.getenv("PII_MASK_PATTERNS", "[]"))
+
+# ストリーミングでマスクする場合に読み込む最大バイト数
+PII_MASK_MAX_SIZE = int(os.getenv("PII_MASK_MAX_SIZE", str(64 * 1024)))
+
+MASK_CHAR = "*"
+
+# JSONの文字列（途中で切り詰められた値も対象にするため、閉じていない値は末尾まで）
+_STRING = r'"(?P<string>[^"\\]*(?:\\.[^"\\]*)*)(?P<end>"|\\?\Z)'
+
+# 文字列以外の値（数値・真偽値、null はマスクしない）
+_SCALAR = r'(?P<scalar>-?\d[\d.eE+-]*|true|false)'
+
+# キーの値（オブジェクト・配列は先頭の括弧）
+_VALUE = rf'(?:{_STRING}|{_SCALAR}|(?P<open>[\[{{]))'
+
+# オブジェクト・配列内のトークン（オブジェクトのキーはマスクしないため、後ろの : で見分ける）
+_CONTAINER_TOKEN_RE = re.compile(rf'{_STRING}(?P<key>\s*:)?|{_SCALAR}|(?P<open>[\[{{])|(?P<close>[\]}}])')
+
+# 切り詰められた末尾の単語（メールアドレス・電話番号の途中かもしれないもの）
+_TAIL_RE = re.compile(r"[^\s\"'<>()\[\]{},;:]+\Z")
+
+def _mask_match(match: re.Match) -> str:
+    return MASK_CHAR * len(match.group(0))
+
+def _replace_spans(text: str, spans: List[Tuple[int, int, str]]) -> str:
+    """(開始, 終了, 置き換える文字列) の範囲を置き換えます"""
+    parts = []
+    last = 0
+    for start, end, replacement in spans:
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
+
+def _mask_token(text: str, match: re.Match) -> Tuple[int, int, str]:
+    """文字列・数値・真偽値のトークンをマスクする範囲を返します"""
+    if match.lastgroup == "scalar":
+        # 数値・真偽値は mask_data と同じく文字列としてマスクする
+        start, end = match.span("scalar")
+        return start, end, f'"{MASK_CHAR * (end - start)}"'
+    start, end = match.span("string")
+    length = end - start
+    if match.group("end") == '"' and text.find("\\", start, end) != -1:
+        # エスケープを含む場合は元の文字数に合わせる
+        try:
+            length = len(json.loads(f'"{text[start:end]}"'))
+        except ValueError:
+            pass
+    return start, end, MASK_CHAR * length
+
+class _AnchoredRule:
+    """特定の文字（@ や -）を起点に一致を探すルール
+
+    文字列全体を正規表現で走査する代わりに、起点の文字を str.find で探し、
+    その前後だけを確認します（個人情報を含まない大半のテキストはほぼ読み飛ばせる）。
+    """
+    def __init__(self, anchor: str, before: str, min_before: int, max_before: int, after: str):
+        self.anchor = anchor
+        # 起点の前の部分は、逆順にした文字列の先頭から一致させる
+        self.before = re.compile(f"{before}{{{min_before},{max_before}}}")
+        self.before_char = re.compile(before)
+        self.before_run = re.compile(f"{before}+")
+        self.max_before = max_before
+        self.after = re.compile(after)
+
+    def sub(self, text: str) -> str:
+        position = text.find(self.anchor)
+        if position == -1:
+            return text
+
+        spans = []
+        end = 0
+        while position != -1:
+            lower = max(end, position - self.max_before)
+            before = self.before.match(text[position - 1:lower - 1 if lower > 0 else None:-1])
+            match = None
+            if before is not None:
+                start = position - before.end()
+                if start > end and self.before_char.match(text, start - 1):
+                    # 前の部分が上限を超えて続いている場合も、漏れないよう区切りの文字まで全体をマスクする
+                    start = position - self.before_run.match(text[position - 1:end - 1 if end > 0 else None:-1]).end()
+                match = self.after.match(text, position)
+            if match is not None:
+                end = match.end()
+                spans.append((start, end, MASK_CHAR * (end - start)))
+                position = text.find(self.anchor, end)
+            else:
+                position = text.find(self.anchor, position + 1)
+        return _replace_spans(text, spans) if spans else text
+
+DEFAULT_RULES = (
+    # メールアドレス
+    _AnchoredRule("@", r"[a-zA-Z0-9._%+-]", 1, 64, r"@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"),
+    # 電話番号（例: 090-1234-5678, 03-1234-5678）
+    _AnchoredRule("-", r"\d", 2, 4, r"-\d{2,4}-\d{3,4}(?!\d)")
+)
+
+class PIIMasker:
+    """ログ用に個人情報をマスクします
+
+    - fields に含まれるキーの値は型によらず全体をマスク（キーは大文字・小文字を区別しない、
+      ネストしたオブジェクト・配列内も対象）
+    - patterns（とデフォルトのメールアドレス・電話番号）に一致する部分はどこにあってもマスク
+    - JSONはパース・再シリアライズせず、文字列のまま該当箇所だけを置き換える
+    """
+    def __init__(
+        self,
+        fields: Iterable[str] = PII_MASK_FIELDS,
+        patterns: Sequence[str] = (),
+        max_size: int = PII_MASK_MAX_SIZE
+    ):
+        self.fields = frozenset(field.lower() for field in fields)
+        self.max_size = max_size
+        # "キー": 値 を1回の走査で探す（キーは大文字・小文字を区別しない）
+        self._field_re = re.compile(
+            '"(?:' + "|".join(re.escape(field) for field in sorted(self.fields)) + r')"\s*:\s*' + _VALUE,
+            re.IGNORECASE
+        ) if self.fields else None
+        # 追加のパターンを優先する（デフォルトの電話番号などより具体的なことが多いため）
+        self._patterns = [re.compile(pattern) for pattern in patterns]
+
+    def _mask_fields(self, text: str) -> str:
+        if self._field_re is None:
+            return text
+        spans = []
+        covered = 0
+        for match in self._field_re.finditer(text):
+            # 既にマスクした値（オブジェクト・配列）の中のキーは対象外
+            if match.start() < covered:
+                continue
+            if match.lastgroup != "open":
+                spans.append(_mask_token(text, match))
+                continue
+            # オブジェクト・配列は対応する閉じ括弧まで、キー以外の値をすべてマスクする
+            depth = 1
+            covered = len(text)
+            for token in _CONTAINER_TOKEN_RE.finditer(text, match.end()):
+                kind = token.lastgroup
+                if kind == "open":
+                    depth += 1
+                elif kind == "close":
+                    depth -= 1
+                    if depth == 0:
+                        covered = token.end()
+                        break
+                elif kind != "key":
+                    spans.append(_mask_token(text, token))
+        if not spans:
+            return text
+        return _replace_spans(text, spans)
+
+    def _mask_values(self, text: str) -> str:
+        for pattern in self._patterns:
+            text = pattern.sub(_mask_match, text)
+        for rule in DEFAULT_RULES:
+            text = rule.sub(text)
+        return text
+
+    def mask_text(self, text: str, truncated: bool = False) -> str:
+        """文字列（JSON・それ以外のどちらも可）をマスクします
+
+        truncated: 途中で切り詰められた文字列の場合 True（末尾の途中の値もマスクする）
+        """
+        masked = self._mask_values(self._mask_fields(text))
+        if truncated:
+            tail = _TAIL_RE.search(masked)
+            if tail is not None and any(char == "@" or char.isdigit() for char in tail.group(0)):
+                masked = masked[:tail.start()] + MASK_CHAR * len(tail.group(0))
+        return masked
+
+    def mask_data(self, data: Any) -> Any:
+        """パース済みのデータ（dict・list）を再帰的にマスクしたコピーを返します"""
+        if isinstance(data, dict):
+            return {
+                key: self._mask_all(value) if isinstance(key, str) and key.lower() in self.fields else self.mask_data(value)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [self.mask_data(value) for value in data]
+        if isinstance(data, str):
+            return self._mask_values(data)
+        return data
+
+    def _mask_all(self, data: Any) -> Any:
+        if isinstance(data, str):
+            return MASK_CHAR * len(data)
+        if isinstance(data, dict):
+            return {key: self._mask_all(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self._mask_all(value) for value in data]
+        if isinstance(data, (bool, int, float)):
+            # 数値・真偽値も、JSONでの表記と同じ文字数の文字列としてマスクする
+            return MASK_CHAR * len(json.dumps(data))
+        return data
+
+    def mask_stream(self, chunks: Iterable[bytes], limit: Optional[int] = None) -> Tuple[str, bool]:
+        """バイト列のチャンクを先頭 limit バイトまで読み込んでマスクします
+
+        ボディ全体を結合せずに、必要な分だけUTF-8としてデコードします。
+        戻り値は (マスクした文字列, 切り詰めたかどうか)。UTF-8でない場合は UnicodeDecodeError。
+        """
+        limit = self.max_size if limit is None else limit
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        parts = []
+        size = 0
+        truncated = False
+        for chunk in chunks:
+            if size + len(chunk) > limit:
+                chunk = chunk[:limit - size]
+                truncated = True
+            parts.append(decoder.decode(chunk))
+            size += len(chunk)
+            if truncated:
+                # 途中で切れたマルチバイト文字は捨てる
+                break
+        if not truncated:
+            parts.append(decoder.decode(b"", final=True))
+        return self.mask_text("".join(parts), truncated=truncated), truncated
+
+# シングルトンインスタンス（環境変数の設定を使用）
+pii_masker = PIIMasker(patterns=PII_MASK_PATTERNS)
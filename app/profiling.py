@@ -0,0 +1,370 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+import cProfile
+import hashlib
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+
+# X-Profile ヘッダーの署名鍵（未設定の場合はプロファイラーを無効化し、ミドルウェアも追加しない）
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+
+# プロファイル結果の保存先
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "logs/profiles"))
+
+# サンプリングプロファイラーの間隔（秒）
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# inline 出力時に表示する関数の数（cprofile）
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "50"))
+
+# 署名付きヘッダーの最大有効期間（秒）
+PROFILE_MAX_TTL = int(os.getenv("PROFILE_MAX_TTL", "3600"))
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_OUTPUTS = ("file", "inline")
+
+def _signature(secret: str, expires: int, mode: str, output: str, path: str) -> str:
+    message = f"{expires}:{mode}:{output}:{path}".encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+def sign_profile_request(
+    path: str,
+    mode: str = "cprofile",
+    output: str = "file",
+    ttl: int = 300,
+    secret: Optional[str] = None,
+    now: Optional[float] = None
+) -> str:
+    """指定したパスのリクエストをプロファイルするための X-Profile ヘッダーの値を生成します
+
+    形式: <有効期限(UNIX時間)>:<mode>:<output>:<HMAC-SHA256署名>
+    """
+    secret = secret or PROFILE_SECRET
+    if not secret:
+        raise ValueError("PROFILE_SECRET is not set")
+    if mode not in PROFILE_MODES or output not in PROFILE_OUTPUTS:
+        raise ValueError(f"mode must be one of {PROFILE_MODES} and output one of {PROFILE_OUTPUTS}")
+    expires = int((now or time.time()) + ttl)
+    return f"{expires}:{mode}:{output}:{_signature(secret, expires, mode, output, path)}"
+
+def verify_profile_header(
+    value: str,
+    path: str,
+    secret: Optional[str] = None,
+    now: Optional[float] = None
+) -> Optional[Tuple[str, str]]:
+    """X-Profile ヘッダーを検証し、(mode, output) を返します（不正・期限切れの場合はNone）"""
+    secret = secret or PROFILE_SECRET
+    if not secret or not value:
+        return None
+    try:
+        expires_str, mode, output, signature = value.strip().split(":")
+        expires = int(expires_str)
+    except ValueError:
+        return None
+
+    if mode not in PROFILE_MODES or output not in PROFILE_OUTPUTS:
+        return None
+    current = now or time.time()
+    if expires < current or expires > current + PROFILE_MAX_TTL:
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, expires, mode, output, path)):
+        return None
+    return mode, output
+
+# 待機中（イベントループのselect、スレッドのwait等）とみなすファイル
+_IDLE_FILES = {"selectors.py", "threading.py", "queue.py"}
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def format_stack(frame, max_depth: int = 128) -> str:
+    """フレームからルート側までのスタックを folded 形式の1行（「関数;関数;...」）にします"""
+    stack: List[str] = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class StackSampler:
+    """指定したスレッドのスタックを一定間隔で採取するサンプリングプロファイラー
+
+    結果は folded 形式（flamegraph.pl や speedscope で読める「関数;関数;... 回数」）で出力します。
+    skip_idle を指定すると待機中のスタックは数えず、max_stacks を超えた種類のスタックは
+    [other] にまとめます（常時動かす場合のメモリ上限）。
+    """
+    def __init__(
+        self,
+        interval: float = PROFILE_SAMPLE_INTERVAL,
+        max_depth: int = 128,
+        skip_idle: bool = False,
+        max_stacks: Optional[int] = None
+    ):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.skip_idle = skip_idle
+        self.max_stacks = max_stacks
+        self.samples: Counter = Counter()
+        self.total_samples = 0
+        self.idle_samples = 0
+        self._thread_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_thread(self, thread_id: int):
+        with self._lock:
+            self._thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id: int):
+        with self._lock:
+            self._thread_ids.discard(thread_id)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """対象スレッドのスタックを1回採取します"""
+        with self._lock:
+            thread_ids = set(self._thread_ids)
+        frames = sys._current_frames()
+        stacks = []
+        idle = 0
+        for thread_id in thread_ids:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            if self.skip_idle and os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                idle += 1
+                continue
+            stacks.append(format_stack(frame, self.max_depth))
+        # folded()・reset() はリクエストのスレッドから呼ばれるため、集計の更新はロックを取って行う
+        with self._lock:
+            self.total_samples += len(stacks) + idle
+            self.idle_samples += idle
+            for stack in stacks:
+                if self.max_stacks is not None and stack not in self.samples and len(self.samples) >= self.max_stacks:
+                    stack = "[other]"
+                self.samples[stack] += 1
+
+    def reset(self):
+        with self._lock:
+            self.samples = Counter()
+            self.total_samples = 0
+            self.idle_samples = 0
+
+    def folded(self) -> str:
+        with self._lock:
+            stacks = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+class ProfileSession:
+    """1リクエスト分のプロファイル
+
+    イベントループのスレッドに加え、スレッドプールで実行される同期エンドポイントも
+    thread() で同じセッションに記録します。
+    """
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._main: Optional[cProfile.Profile] = None
+        self.sampler: Optional[StackSampler] = StackSampler() if mode == "sample" else None
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+
+    def start(self):
+        if self.sampler is not None:
+            self.sampler.add_thread(threading.get_ident())
+            self.sampler.start()
+        else:
+            self._main = cProfile.Profile()
+            self._main.enable()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        elif self._main is not None:
+            self._main.disable()
+            with self._lock:
+                self._profilers.append(self._main)
+        self.duration = time.perf_counter() - self.started_at
+
+    @contextmanager
+    def thread(self):
+        """現在のスレッド（スレッドプールのワーカー）の処理をプロファイルに含めます"""
+        if self.sampler is not None:
+            thread_id = threading.get_ident()
+            self.sampler.add_thread(thread_id)
+            try:
+                yield
+            finally:
+                self.sampler.remove_thread(thread_id)
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profilers.append(profiler)
+
+    def _stats(self, stream=None) -> pstats.Stats:
+        with self._lock:
+            profilers = list(self._profilers)
+        return pstats.Stats(*profilers, stream=stream)
+
+    def report(self) -> str:
+        """テキスト形式の結果（cprofile は累積時間順の上位、sample は folded 形式）"""
+        if self.sampler is not None:
+            return self.sampler.folded()
+        stream = io.StringIO()
+        self._stats(stream).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        return stream.getvalue()
+
+    def save(self, path: Path):
+        """結果をファイルに保存します（cprofile は pstats 形式、sample は folded 形式）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.sampler is not None:
+            path.write_text(self.sampler.folded(), encoding="utf-8")
+        else:
+            self._stats().dump_stats(str(path))
+
+_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+# プロファイラーはスレッドごとに1つしか有効にできないため、同時に1リクエストのみ
+_session_lock = threading.Lock()
+
+@contextmanager
+def profile_thread():
+    """プロファイル中のリクエストであれば、現在のスレッドの処理も記録します"""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+    with session.thread():
+        yield
+
+def _artifact_path(method: str, path: str) -> Path:
+    safe_path = re.sub(r"[^A-Za-z0-9_-]+", "_", path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{method}_{safe_path}_{uuid.uuid4().hex[:8]}"
+    return PROFILE_DIR / name
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class ProfilerMiddleware:
+    """署名付きの X-Profile ヘッダーが付いたリクエストだけをプロファイルするASGIミドルウェア
+
+    PROFILE_SECRET が設定されている場合のみ追加してください（ヘッダーのないリクエストは素通し）。
+    output=file の場合は PROFILE_DIR に保存して X-Profile-Artifact ヘッダーでファイル名を返し、
+    output=inline の場合は本来のレスポンスの代わりに結果をテキストで返します。
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        header = _header(scope, b"x-profile") if scope["type"] == "http" else None
+        if header is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_request = verify_profile_header(header, scope["path"])
+        if profile_request is None:
+            await self.app(scope, receive, _with_status(send, "invalid"))
+            return
+        if not _session_lock.acquire(blocking=False):
+            await self.app(scope, receive, _with_status(send, "busy"))
+            return
+
+        try:
+            mode, output = profile_request
+            await self._profile(scope, receive, send, mode, output)
+        finally:
+            _session_lock.release()
+
+    async def _profile(self, scope, receive, send, mode: str, output: str):
+        session = ProfileSession(mode)
+        artifact = _artifact_path(scope["method"], scope["path"]).with_suffix(
+            ".folded" if mode == "sample" else ".pstats"
+        )
+        original_status = 500
+
+        async def send_wrapper(message):
+            nonlocal original_status
+            if output == "inline":
+                # 本来のレスポンスは破棄し、終了後にプロファイル結果を返す
+                if message["type"] == "http.response.start":
+                    original_status = message["status"]
+                return
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-status", b"ok"),
+                    (b"x-profile-artifact", artifact.name.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = _session.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session.stop()
+            _session.reset(token)
+            if output == "file":
+                session.save(artifact)
+
+        if output == "inline":
+            body = (
+                f"# mode={mode} status={original_status} duration={session.duration * 1000:.2f}ms\n"
+                + session.report()
+            ).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"x-profile-status", b"ok"),
+                    (b"x-profile-original-status", str(original_status).encode("latin-1"))
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+
+def _with_status(send, status: str):
+    """X-Profile-Status ヘッダーを付けて送信する send を返します"""
+    async def send_wrapper(message):
+        if message["type"] == "http.response.start":
+            message["headers"] = list(message.get("headers", [])) + [
+                (b"x-profile-status", status.encode("latin-1"))
+            ]
+        await send(message)
+    return send_wrapper
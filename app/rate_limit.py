@@ -0,0 +1,425 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from .metrics import track_backend
+from .redis_pool import get_async_redis
+import hashlib
+import json
+import math
+import os
+import time
+
+_IS_LOCAL = os.getenv("ENVIRONMENT", "development") == "development"
+
+# 公開APIのレート制限（開発環境ではデフォルトで無効。お問い合わせフォームと同じ）
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false" if _IS_LOCAL else "true").lower() == "true"
+
+# レート制限の対象（GET / HEAD のみ、パスのプレフィックスのカンマ区切り）
+RATE_LIMIT_PATHS = tuple(
+    path.strip() for path in os.getenv("RATE_LIMIT_PATHS", "/api/v1/news").split(",") if path.strip()
+)
+
+# トークンバケットの設定: 1秒あたりに補充するトークン数・バケットの容量（バースト）
+RATE_LIMIT_IP_RATE = float(os.getenv("RATE_LIMIT_IP_RATE", "5"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "100"))
+RATE_LIMIT_API_KEY_RATE = float(os.getenv("RATE_LIMIT_API_KEY_RATE", "50"))
+RATE_LIMIT_API_KEY_BURST = int(os.getenv("RATE_LIMIT_API_KEY_BURST", "1000"))
+
+# X-API-Key で個別のバケットを使うAPIキー（カンマ区切り。それ以外のキーはIPアドレスで制限）
+RATE_LIMIT_API_KEYS = frozenset(
+    key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()
+)
+
+# ロードバランサーの内側で動かす場合は X-Forwarded-For のIPアドレスをクライアントのものとして使う
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+# アプリケーションの前にある信頼できるプロキシの数（X-Forwarded-For の右から何番目をクライアントとするか）
+# 左側はクライアントが自由に付けられるため、信頼できるプロキシが追加した右端の部分だけを使う
+RATE_LIMIT_TRUSTED_HOPS = max(1, int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", "1")))
+
+# Redisからまとめて借りるトークン数・有効期間（秒）
+# 借りたトークンを使い切るまではRedisに問い合わせない（ワーカー数×この数だけ制限を超える可能性がある）
+RATE_LIMIT_LEASE_SIZE = int(os.getenv("RATE_LIMIT_LEASE_SIZE", "5"))
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1"))
+
+# Redisでエラーになった場合に、ワーカー内のバケットで制限する時間（秒）
+RATE_LIMIT_REDIS_RETRY = float(os.getenv("RATE_LIMIT_REDIS_RETRY", "5"))
+
+# ワーカー内で状態を保持するキーの数（超えた場合は古いものから削除）
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+
+# トークンバケット（1回の呼び出しで補充・取得を行う）
+# 戻り値: {取得できたトークン数, 残りのトークン数, 次のトークンまでのミリ秒}
+# 時刻はRedisサーバーのものを使う（ワーカー間の時計のずれの影響を受けない。Redis 5未満のため replicate_commands を呼ぶ）
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now_ms
+tokens = math.min(burst, tokens + math.max(0, now_ms - ts) * rate / 1000)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) * 1000 / rate) + 1000)
+local wait_ms = 0
+if tokens < 1 then
+    wait_ms = math.ceil((1 - tokens) * 1000 / rate)
+end
+return {granted, math.floor(tokens), wait_ms}
+"""
+
+# GCRA（Generic Cell Rate Algorithm）: キーごとに理論上の到着時刻（TAT）だけを保存する（メモリはキーごとに一定）
+# KEYS: 制限するキー、ARGV: キーごとに (間隔ミリ秒, 期間ミリ秒)
+# 全てのキーが許可される場合のみ記録する（1つでも超えた場合はどのキーも消費しない）
+# 戻り値: {許可=1/拒否=0, 超えたキーの番号, 再試行までのミリ秒}
+GCRA_SCRIPT = """
+redis.replicate_commands()
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[i * 2 - 1])
+    local period = tonumber(ARGV[i * 2])
+    local tat = math.max(tonumber(redis.call('GET', key)) or now_ms, now_ms)
+    local allow_at = tat + interval - period
+    if allow_at > now_ms then
+        return {0, i, allow_at - now_ms}
+    end
+    tats[i] = tat + interval
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tats[i], 'PX', tats[i] - now_ms)
+end
+return {1, 0, 0}
+"""
+
+@dataclass(frozen=True)
+class Policy:
+    """トークンバケットの設定"""
+    name: str
+    rate: float
+    burst: int
+
+    @property
+    def window(self) -> int:
+        """空のバケットが満杯になるまでの秒数（RateLimit-Policy の w）"""
+        return max(1, math.ceil(self.burst / self.rate))
+
+IP_POLICY = Policy("ip", RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST)
+API_KEY_POLICY = Policy("api_key", RATE_LIMIT_API_KEY_RATE, RATE_LIMIT_API_KEY_BURST)
+
+@dataclass
+class Decision:
+    """レート制限の判定結果"""
+    allowed: bool
+    remaining: int
+    reset: float
+    retry_after: float = 0.0
+
+    def headers(self, policy: Policy) -> List[Tuple[bytes, bytes]]:
+        """RateLimit-* レスポンスヘッダー（IETF draft-ietf-httpapi-ratelimit-headers）"""
+        headers = [
+            (b"ratelimit-limit", str(policy.burst).encode("latin-1")),
+            (b"ratelimit-remaining", str(max(self.remaining, 0)).encode("latin-1")),
+            (b"ratelimit-reset", str(math.ceil(self.reset)).encode("latin-1")),
+            (b"ratelimit-policy", f"{policy.burst};w={policy.window}".encode("latin-1"))
+        ]
+        if not self.allowed:
+            headers.append((b"retry-after", str(max(1, math.ceil(self.retry_after))).encode("latin-1")))
+        return headers
+
+class _KeyState:
+    """キーごとのワーカー内の状態（Redisから借りたトークン・拒否中の期限・フォールバック用のバケット）"""
+    __slots__ = ("leased", "remaining", "lease_expires_at", "blocked_until", "tokens", "updated_at")
+
+    def __init__(self, burst: int, now: float):
+        self.leased = 0
+        self.remaining = 0
+        self.lease_expires_at = 0.0
+        self.blocked_until = 0.0
+        self.tokens = float(burst)
+        self.updated_at = now
+
+class DistributedRateLimiter:
+    """Redisのトークンバケットを全ワーカーで共有するレート制限
+
+    - Redisから RATE_LIMIT_LEASE_SIZE 個のトークンをまとめて借り、使い切るまではワーカー内で判定する
+    - 拒否したキーは次のトークンが補充されるまでRedisに問い合わせずに拒否する
+    - Redisが利用できない場合はワーカー内のトークンバケットで制限する
+    """
+    def __init__(
+        self,
+        prefix: str = "ratelimit",
+        lease_size: int = RATE_LIMIT_LEASE_SIZE,
+        lease_ttl: float = RATE_LIMIT_LEASE_TTL,
+        redis_getter: Callable = get_async_redis,
+        max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS
+    ):
+        self.prefix = prefix
+        self.lease_size = max(1, lease_size)
+        self.lease_ttl = lease_ttl
+        self.redis_getter = redis_getter
+        self.max_keys = max_keys
+        self._states: "OrderedDict[str, _KeyState]" = OrderedDict()
+        self._script = None
+        self._script_client = None
+        self._redis_retry_at = 0.0
+        self.stats: Dict[str, int] = {"local": 0, "redis": 0, "fallback": 0, "rejected": 0, "redis_errors": 0}
+
+    def _state(self, key: str, policy: Policy, now: float) -> _KeyState:
+        state = self._states.get(key)
+        if state is None:
+            state = _KeyState(policy.burst, now)
+            self._states[key] = state
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def _redis_script(self):
+        """Redisのスクリプト（クライアントが作り直された場合は登録し直す）"""
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        client = self.redis_getter()
+        if client is None:
+            return None
+        if client is not self._script_client:
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+            self._script_client = client
+        return self._script
+
+    def _reject(self, state: _KeyState, policy: Policy, now: float, wait: float) -> Decision:
+        state.blocked_until = now + wait
+        self.stats["rejected"] += 1
+        return Decision(False, 0, wait, wait)
+
+    def _fallback(self, state: _KeyState, policy: Policy, now: float) -> Decision:
+        """ワーカー内のトークンバケットで判定します（Redisが利用できない場合）"""
+        self.stats["fallback"] += 1
+        state.tokens = min(policy.burst, state.tokens + (now - state.updated_at) * policy.rate)
+        state.updated_at = now
+        if state.tokens < 1:
+            return self._reject(state, policy, now, (1 - state.tokens) / policy.rate)
+        state.tokens -= 1
+        return Decision(True, int(state.tokens), (policy.burst - state.tokens) / policy.rate)
+
+    async def hit(self, key: str, policy: Policy) -> Decision:
+        """リクエストを1件記録し、許可するかどうかを返します"""
+        now = time.monotonic()
+        state = self._state(f"{policy.name}:{key}", policy, now)
+
+        if state.blocked_until > now:
+            self.stats["rejected"] += 1
+            wait = state.blocked_until - now
+            return Decision(False, 0, wait, wait)
+
+        if state.leased > 0 and state.lease_expires_at > now:
+            # 借りているトークンを使う（Redisに問い合わせない）
+            state.leased -= 1
+            self.stats["local"] += 1
+            remaining = state.remaining + state.leased
+            return Decision(True, remaining, (policy.burst - remaining) / policy.rate)
+
+        script = self._redis_script()
+        if script is None:
+            return self._fallback(state, policy, now)
+
+        lease = min(self.lease_size, policy.burst)
+        try:
+            with track_backend("redis", "rate_limit"):
+                granted, remaining, wait_ms = await script(
+                    keys=[f"{self.prefix}:{policy.name}:{key}"],
+                    args=[policy.rate, policy.burst, lease]
+                )
+        except Exception as e:
+            if self._redis_retry_at == 0.0 or now >= self._redis_retry_at:
+                print(f"レート制限: Redis利用不可 ({type(e).__name__})、{RATE_LIMIT_REDIS_RETRY:g}秒間はワーカー内で制限")
+            self.stats["redis_errors"] += 1
+            self._redis_retry_at = now + RATE_LIMIT_REDIS_RETRY
+            return self._fallback(state, policy, now)
+
+        self.stats["redis"] += 1
+        granted, remaining = int(granted), int(remaining)
+        if granted < 1:
+            return self._reject(state, policy, now, int(wait_ms) / 1000)
+
+        state.leased = granted - 1
+        state.remaining = remaining
+        state.lease_expires_at = now + self.lease_ttl
+        return Decision(True, remaining + state.leased, (policy.burst - remaining - state.leased) / policy.rate)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "policies": {
+                policy.name: {"rate": policy.rate, "burst": policy.burst}
+                for policy in (IP_POLICY, API_KEY_POLICY)
+            },
+            "tracked_keys": len(self._states),
+            "redis_available": time.monotonic() >= self._redis_retry_at,
+            "decisions": dict(self.stats)
+        }
+
+@dataclass(frozen=True)
+class Limit:
+    """期間（秒）あたりの回数の制限"""
+    key: str
+    count: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.count
+
+class GCRALimiter:
+    """複数の制限（IPアドレス・メールアドレスなど）を1回のRedis呼び出しでまとめて判定するレート制限（GCRA）
+
+    キーごとに保存するのはTAT（理論上の到着時刻）1つだけで、リクエスト数に関係なくメモリは一定です。
+    Redisが利用できない場合は制限を外さず、ワーカー内の同じアルゴリズムで判定します。
+    """
+    def __init__(
+        self,
+        prefix: str,
+        redis_getter: Callable = get_async_redis,
+        max_keys: int = RATE_LIMIT_LOCAL_MAX_KEYS
+    ):
+        # Redis Clusterでも1つのスクリプトで扱えるよう、ハッシュタグでキーを同じスロットにする
+        self.prefix = prefix if "{" in prefix else f"{{{prefix}}}"
+        self.redis_getter = redis_getter
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._script = None
+        self._script_client = None
+        self._redis_retry_at = 0.0
+        self.stats: Dict[str, int] = {"redis": 0, "fallback": 0, "rejected": 0, "redis_errors": 0}
+
+    def _redis_script(self):
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        client = self.redis_getter()
+        if client is None:
+            return None
+        if client is not self._script_client:
+            self._script = client.register_script(GCRA_SCRIPT)
+            self._script_client = client
+        return self._script
+
+    def _check_local(self, limits: List[Limit]) -> Tuple[bool, float]:
+        """ワーカー内でGCRAを判定します（Redisが利用できない場合）"""
+        self.stats["fallback"] += 1
+        now = time.monotonic()
+        tats = []
+        for limit in limits:
+            tat = max(self._tats.get(limit.key, now), now)
+            allow_at = tat + limit.interval - limit.period
+            if allow_at > now:
+                return False, allow_at - now
+            tats.append(tat + limit.interval)
+        for limit, tat in zip(limits, tats):
+            self._tats[limit.key] = tat
+            self._tats.move_to_end(limit.key)
+        while len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+        return True, 0.0
+
+    async def check(self, limits: List[Limit]) -> Tuple[bool, float]:
+        """全ての制限を満たす場合に1回分を記録します。戻り値は (許可するかどうか, 再試行までの秒数)"""
+        script = self._redis_script()
+        allowed = None
+        if script is not None:
+            args = []
+            for limit in limits:
+                args += [int(limit.interval * 1000), int(limit.period * 1000)]
+            try:
+                with track_backend("redis", "gcra"):
+                    allowed, _, retry_after_ms = await script(
+                        keys=[f"{self.prefix}:{limit.key}" for limit in limits],
+                        args=args
+                    )
+                self.stats["redis"] += 1
+                allowed, retry_after = bool(int(allowed)), int(retry_after_ms) / 1000
+            except Exception as e:
+                print(f"レート制限: Redis利用不可 ({type(e).__name__})、{RATE_LIMIT_REDIS_RETRY:g}秒間はワーカー内で制限")
+                self.stats["redis_errors"] += 1
+                self._redis_retry_at = time.monotonic() + RATE_LIMIT_REDIS_RETRY
+                allowed = None
+
+        if allowed is None:
+            allowed, retry_after = self._check_local(limits)
+        if not allowed:
+            self.stats["rejected"] += 1
+        return allowed, retry_after
+
+def _identify(scope) -> Tuple[str, Policy]:
+    """レート制限のキー（登録済みのAPIキー、またはクライアントのIPアドレス）"""
+    hops: List[str] = []
+    for key, value in scope.get("headers", []):
+        if key == b"x-api-key":
+            api_key = value.decode("latin-1")
+            if api_key in RATE_LIMIT_API_KEYS:
+                # APIキーそのものはRedisに保存しない
+                return hashlib.sha256(value).hexdigest()[:16], API_KEY_POLICY
+        elif key == b"x-forwarded-for" and RATE_LIMIT_TRUST_PROXY:
+            # 複数のヘッダーに分かれている場合は順に連結したものとして扱う
+            hops += [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+    if hops:
+        # 信頼できるプロキシが追加した右端 RATE_LIMIT_TRUSTED_HOPS 件のうち最も外側（偽装できない最初のアドレス）
+        return hops[max(0, len(hops) - RATE_LIMIT_TRUSTED_HOPS)], IP_POLICY
+    client = scope.get("client")
+    return client[0] if client else "unknown", IP_POLICY
+
+class RateLimitMiddleware:
+    """公開の読み取り系エンドポイント（RATE_LIMIT_PATHS へのGET / HEAD）のレート制限を行うASGIミドルウェア
+
+    IPアドレス（登録済みのAPIキーの場合はキー）ごとのトークンバケットで制限し、
+    RateLimit-* ヘッダーを付けて返します。制限を超えた場合は429（Retry-After付き）を返します。
+    """
+    def __init__(self, app, limiter: Optional[DistributedRateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not RATE_LIMIT_ENABLED
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith(RATE_LIMIT_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key, policy = _identify(scope)
+        decision = await self.limiter.hit(key, policy)
+        headers = decision.headers(policy)
+
+        if not decision.allowed:
+            body = json.dumps(
+                {"detail": "リクエストが多すぎます。しばらく時間をおいて再度お試しください。"},
+                ensure_ascii=False
+            ).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1"))
+                ] + headers
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# シングルトンインスタンス
+rate_limiter = DistributedRateLimiter()
@@ -0,0 +1,48 @@
+import os
+
+# redis.asyncio（redis-py 4.2以降）がない場合は非同期クライアントを使わない
+try:
+    import redis.asyncio as aioredis
+    REDIS_ASYNC_AVAILABLE = True
+except ImportError:
+    REDIS_ASYNC_AVAILABLE = False
+
+# 非同期クライアントの接続プール（ワーカーごと）
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+# Redisへの接続・応答のタイムアウト（秒）。Redisが遅い場合もリクエストを止めないよう短くする
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.5"))
+
+_client = None
+
+def get_async_redis():
+    """共有の非同期Redisクライアントを取得します（初回の呼び出し時に接続プールを作成、利用できない場合はNone）
+
+    接続はイベントループに紐づくため、イベントループ内から呼び出してください。
+    """
+    global _client
+    if not REDIS_ASYNC_AVAILABLE:
+        return None
+    if _client is None:
+        pool = aioredis.ConnectionPool(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            decode_responses=True
+        )
+        _client = aioredis.Redis(connection_pool=pool)
+    return _client
+
+async def close_async_redis():
+    """接続プールを閉じます（終了時の処理）"""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        # redis-py 5.0.1以降は aclose()
+        close = getattr(client, "aclose", None) or client.close
+        await close()
+        await client.connection_pool.disconnect()
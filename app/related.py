@@ -0,0 +1,308 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import importlib.util
+import math
+import os
+import re
+import threading
+import unicodedata
+
+# 記事ごとに保持する関連記事数
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "10"))
+
+# 記事ベクトルに残す特徴量の最大数（重みの大きいものから）
+MAX_FEATURES = int(os.getenv("RELATED_MAX_FEATURES", "64"))
+
+# 出現記事数がこの割合（かつ100件）を超える特徴量は候補探索に使わない（ストップワード相当）
+MAX_DF_RATIO = float(os.getenv("RELATED_MAX_DF_RATIO", "0.5"))
+
+# 全記事の再構築では、NumPy・SciPyがある場合は疎行列の積で近傍をまとめて計算する
+# （起動時間に影響するため、読み込みは再構築時に行う。ない場合は転置インデックスで1記事ずつ計算）
+SCIPY_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("numpy", "scipy"))
+
+# 疎行列の積を計算する記事数の単位（メモリ使用量は この件数 × 候補記事数 の非ゼロ要素に比例）
+REBUILD_BATCH_SIZE = int(os.getenv("RELATED_REBUILD_BATCH_SIZE", "1024"))
+
+# 他のワーカーでの書き込みの反映・IDFの補正のため、全記事から再構築する最短の間隔（秒）
+# 記事が更新されていない場合は再構築しない（search.run_index_sync() が確認する）
+RELATED_REBUILD_INTERVAL = float(os.getenv("RELATED_REBUILD_INTERVAL", "600"))
+
+# タグ・カテゴリの重み（本文の語より強く効かせる）
+TAG_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.5
+
+_ASCII_WORD = re.compile(r"[a-z0-9]{2,}")
+_CJK_RUN = re.compile(r"[぀-ヿ㐀-鿿豈-﫿]+")
+
+Neighbor = Tuple[float, int]  # (類似度, 記事ID)
+
+def _tokenize(text: str) -> List[str]:
+    """本文を特徴量に分割します（英数字は単語、日本語は文字bigram）"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    tokens = _ASCII_WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _features(article: Dict[str, Any]) -> Dict[str, float]:
+    """記事から重み付き特徴量（TF）を抽出します"""
+    counts = Counter(_tokenize(f"{article.get('title') or ''} {article.get('content') or ''}"))
+    features = {f"w:{token}": 1.0 + math.log(count) for token, count in counts.items()}
+    for tag in article.get("tags") or []:
+        features[f"t:{unicodedata.normalize('NFKC', tag).casefold()}"] = TAG_WEIGHT
+    if article.get("category"):
+        features[f"c:{article['category']}"] = CATEGORY_WEIGHT
+    return features
+
+def _summary(article: Dict[str, Any]) -> Dict[str, Any]:
+    """関連記事として返す項目のみを保持します"""
+    return {
+        "id": article["id"],
+        "title": article.get("title"),
+        "category": article.get("category"),
+        "tags": article.get("tags") or [],
+        "thumbnail_url": article.get("thumbnail_url"),
+        "thumbnail_alt": article.get("thumbnail_alt"),
+        "created_at": article.get("created_at")
+    }
+
+class RelatedIndex:
+    """TF-IDFベクトルの転置インデックスによる関連記事エンジン
+
+    全記事のベクトルと上位k件の近傍を起動時に構築し、記事の作成・更新時は
+    その記事の近傍と、候補になった記事の近傍リストだけを差分更新します。
+    差分更新は書き込みを処理したワーカーのみで行われ、IDFも再計算しないため、
+    search.run_index_sync() が記事の更新があれば RELATED_REBUILD_INTERVAL 秒ごとに rebuild() で補正します。
+    """
+    def __init__(self, top_k: int = RELATED_TOP_K):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._df: Counter = Counter()
+        self._raw: Dict[int, Dict[str, float]] = {}  # TF（IDF計算前）
+        self._vectors: Dict[int, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._neighbors: Dict[int, List[Neighbor]] = {}
+        self._reverse: Dict[int, Set[int]] = {}  # 近傍に含まれている記事→含んでいる記事
+        self._dirty: Set[int] = set()
+        self._docs: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def _idf(self, feature: str) -> float:
+        return math.log((len(self._raw) + 1) / (self._df[feature] + 1)) + 1.0
+
+    def _vectorize(self, raw: Dict[str, float]) -> Dict[str, float]:
+        """TF-IDFを計算し、上位の特徴量のみを残してL2正規化します"""
+        weighted = {feature: tf * self._idf(feature) for feature, tf in raw.items()}
+        if len(weighted) > MAX_FEATURES:
+            weighted = dict(heapq.nlargest(MAX_FEATURES, weighted.items(), key=lambda x: x[1]))
+        norm = math.sqrt(sum(w * w for w in weighted.values())) or 1.0
+        return {feature: w / norm for feature, w in weighted.items()}
+
+    def _index_vector(self, article_id: int, vector: Dict[str, float]):
+        self._vectors[article_id] = vector
+        for feature, weight in vector.items():
+            self._postings.setdefault(feature, {})[article_id] = weight
+
+    def _unindex(self, article_id: int):
+        for feature in self._vectors.pop(article_id, {}):
+            posting = self._postings.get(feature)
+            if posting is not None:
+                posting.pop(article_id, None)
+                if not posting:
+                    del self._postings[feature]
+        for feature in self._raw.pop(article_id, {}):
+            self._df[feature] -= 1
+            if self._df[feature] <= 0:
+                del self._df[feature]
+
+    def _scores(self, article_id: int) -> Dict[int, float]:
+        """転置インデックスで候補記事とのコサイン類似度を計算します"""
+        max_df = max(100, int(len(self._vectors) * MAX_DF_RATIO))
+        scores: Dict[int, float] = {}
+        for feature, weight in self._vectors.get(article_id, {}).items():
+            posting = self._postings.get(feature, {})
+            if len(posting) > max_df:
+                continue
+            for other_id, other_weight in posting.items():
+                if other_id != article_id:
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+        return scores
+
+    def _set_neighbors(self, article_id: int, neighbors: List[Neighbor]):
+        for _, other_id in self._neighbors.get(article_id, []):
+            self._reverse.get(other_id, set()).discard(article_id)
+        self._neighbors[article_id] = neighbors
+        for _, other_id in neighbors:
+            self._reverse.setdefault(other_id, set()).add(article_id)
+
+    def _compute_neighbors(self, article_id: int):
+        scores = self._scores(article_id)
+        top = heapq.nlargest(self.top_k, ((score, other_id) for other_id, score in scores.items()))
+        self._set_neighbors(article_id, top)
+        self._dirty.discard(article_id)
+        return scores
+
+    def _offer(self, article_id: int, candidate_id: int, score: float):
+        """候補記事の近傍リストに記事を追加できる場合は追加します
+
+        更新前の記事を含んでいた近傍リストは _remove_locked() で再計算対象に
+        なっているため、ここでは新規追加だけを考えればよい。
+        """
+        if candidate_id in self._dirty:
+            return
+        neighbors = self._neighbors.get(candidate_id, [])
+        if len(neighbors) < self.top_k or score > neighbors[-1][0]:
+            neighbors = sorted(neighbors + [(score, article_id)], reverse=True)
+            self._set_neighbors(candidate_id, neighbors[:self.top_k])
+
+    def _remove_locked(self, article_id: int):
+        self._unindex(article_id)
+        self._docs.pop(article_id, None)
+        self._set_neighbors(article_id, [])
+        del self._neighbors[article_id]
+        self._dirty.discard(article_id)
+        # この記事を近傍に含んでいた記事は次回参照時に再計算する
+        self._dirty.update(self._reverse.pop(article_id, set()))
+
+    def upsert(self, article: Dict[str, Any]):
+        """記事を追加・更新し、関連する近傍リストを差分更新します"""
+        article_id = article["id"]
+        with self._lock:
+            if article_id in self._docs:
+                self._remove_locked(article_id)
+            if not article.get("published"):
+                return
+            raw = _features(article)
+            self._raw[article_id] = raw
+            self._df.update(raw.keys())
+            self._docs[article_id] = _summary(article)
+            self._index_vector(article_id, self._vectorize(raw))
+            scores = self._compute_neighbors(article_id)
+            for candidate_id, score in scores.items():
+                self._offer(article_id, candidate_id, score)
+
+    def remove(self, article_id: int):
+        """記事を削除します"""
+        with self._lock:
+            if article_id in self._docs:
+                self._remove_locked(article_id)
+
+    def _swap(self, index: "RelatedIndex"):
+        """別のインスタンスで構築した内容に置き換えます"""
+        with self._lock:
+            for name, value in vars(index).items():
+                if name != "_lock":
+                    setattr(self, name, value)
+
+    def clear(self):
+        """全記事を削除します"""
+        self._swap(RelatedIndex(self.top_k))
+
+    def rebuild(self, articles: Iterable[Dict[str, Any]]):
+        """全記事のベクトルと近傍を一括で再構築します"""
+        index = RelatedIndex(self.top_k)
+        for article in articles:
+            if not article.get("published"):
+                continue
+            raw = _features(article)
+            index._raw[article["id"]] = raw
+            index._df.update(raw.keys())
+            index._docs[article["id"]] = _summary(article)
+        if SCIPY_AVAILABLE and index._raw:
+            index._rebuild_vectorized()
+        else:
+            # IDFは全記事の出現数が揃ってから計算する
+            for article_id, raw in index._raw.items():
+                index._index_vector(article_id, index._vectorize(raw))
+            for article_id in index._vectors:
+                index._compute_neighbors(article_id)
+        self._swap(index)
+
+    def _rebuild_vectorized(self):
+        """TF-IDFベクトルと全記事の近傍をNumPy・SciPyでまとめて計算します
+
+        _vectorize()・_scores() と同じ計算を、TF-IDFは配列の演算で、類似度は
+        疎行列（記事 × 特徴量）とその転置の積を REBUILD_BATCH_SIZE 件ずつ計算して求めます。
+        """
+        import numpy as np
+        from scipy import sparse
+
+        ids = list(self._raw)
+        vocabulary: Dict[str, int] = {}
+        columns, values, indptr = [], [], [0]
+        for article_id in ids:
+            for feature, tf in self._raw[article_id].items():
+                columns.append(vocabulary.setdefault(feature, len(vocabulary)))
+                values.append(tf)
+            indptr.append(len(columns))
+        features = list(vocabulary)
+        columns = np.array(columns, dtype=np.int64)
+        idf = np.log((len(ids) + 1) / (np.bincount(columns, minlength=len(features)) + 1)) + 1.0
+        weights = np.array(values, dtype=np.float64) * idf[columns]
+
+        # 記事ごとに重みの大きい特徴量を残してL2正規化する（同じ重みは先に出現した特徴量を残す）
+        kept_columns, kept_weights, kept_indptr = [], [], [0]
+        for row, article_id in enumerate(ids):
+            row_columns = columns[indptr[row]:indptr[row + 1]]
+            row_weights = weights[indptr[row]:indptr[row + 1]]
+            if len(row_weights) > MAX_FEATURES:
+                top = np.argsort(-row_weights, kind="stable")[:MAX_FEATURES]
+                row_columns, row_weights = row_columns[top], row_weights[top]
+            row_weights = row_weights / (np.sqrt(np.dot(row_weights, row_weights)) or 1.0)
+            self._index_vector(article_id, dict(zip(
+                [features[col] for col in row_columns.tolist()], row_weights.tolist()
+            )))
+            kept_columns.append(row_columns)
+            kept_weights.append(row_weights)
+            kept_indptr.append(kept_indptr[-1] + len(row_columns))
+        matrix = sparse.csr_matrix(
+            (np.concatenate(kept_weights), np.concatenate(kept_columns), np.array(kept_indptr)),
+            shape=(len(ids), len(features))
+        )
+
+        # 出現記事数の多い特徴量は _scores() と同様に除く
+        max_df = max(100, int(len(ids) * MAX_DF_RATIO))
+        postings = np.bincount(matrix.indices, minlength=len(features))
+        matrix = matrix @ sparse.diags((postings <= max_df).astype(np.float64))
+        matrix.eliminate_zeros()
+        transposed = matrix.T.tocsr()
+        id_array = np.array(ids)
+
+        for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+            scores = (matrix[start:start + REBUILD_BATCH_SIZE] @ transposed).tocsr()
+            for offset in range(scores.shape[0]):
+                row = start + offset
+                begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+                others = scores.indices[begin:end]
+                similarities = scores.data[begin:end]
+                keep = others != row
+                others, similarities = others[keep], similarities[keep]
+                if len(similarities) > self.top_k:
+                    top = np.argpartition(-similarities, self.top_k - 1)[:self.top_k]
+                    others, similarities = others[top], similarities[top]
+                # heapq.nlargest((類似度, 記事ID)) と同じ順（類似度・記事IDの降順）
+                order = np.lexsort((id_array[others], similarities))[::-1]
+                self._set_neighbors(ids[row], [
+                    (float(similarities[i]), int(id_array[others[i]])) for i in order
+                ])
+
+    def related(self, article_id: int, limit: int = RELATED_TOP_K) -> Optional[List[Dict[str, Any]]]:
+        """関連記事を類似度の高い順に返します（未登録の記事はNone）"""
+        with self._lock:
+            if article_id not in self._docs:
+                return None
+            if article_id in self._dirty:
+                self._compute_neighbors(article_id)
+            return [
+                {**self._docs[other_id], "score": round(score, 4)}
+                for score, other_id in self._neighbors.get(article_id, [])[:limit]
+            ]
+
+# シングルトンインスタンス
+related_index = RelatedIndex()
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from .. import search
+from ..index_monitor import indexing_monitor
+from ..admission import admission_controller
+from ..rate_limit import rate_limiter
+from ..outbox import contact_outbox
+from ..search_stats import search_stats
+from ..timing import TimedRoute
+from ..admin_auth import require_admin_token
+
+# 全てのエンドポイントで管理用トークン（X-Admin-Token）を要求する
+router = APIRouter(route_class=TimedRoute, dependencies=[Depends(require_admin_token)])
+
+@router.get("/indexing")
+def get_indexing_status():
+    """インデックス反映の遅れ・タスクキューの状態を取得します"""
+    return {
+        **indexing_monitor.snapshot(),
+        "write_batching": search.write_coalescer.stats()
+    }
+
+@router.get("/search-stats")
+def get_search_stats(
+    limit: int = Query(20, ge=1, le=200, description="各ランキングの件数"),
+    operation: Optional[str] = Query(None, pattern="^(search|list|facets)$", description="操作で絞り込み")
+):
+    """検索の統計（上位のクエリ・ゼロヒットのクエリ・遅いクエリ・レイテンシのパーセンタイル）を取得します"""
+    return search_stats.summary(limit=limit, operation=operation)
+
+@router.get("/admission")
+def get_admission_status():
+    """ルートの種類ごとの同時実行数の上限・実行中・待ち行列・拒否数を取得します"""
+    return admission_controller.snapshot()
+
+@router.get("/rate-limit")
+def get_rate_limit_status():
+    """レート制限の設定・判定の内訳（ワーカー内・Redis・フォールバック・拒否）を取得します"""
+    return rate_limiter.snapshot()
+
+@router.get("/outbox")
+def get_outbox_status(
+    limit: int = Query(20, ge=1, le=200, description="デッドレターの件数")
+):
+    """お問い合わせのアウトボックスの配送状態ごとの件数・最も古い未配送の待ち時間・デッドレターを取得します"""
+    return contact_outbox.snapshot(dead_limit=limit)
+
+@router.post("/outbox/{delivery_id}/retry")
+def retry_outbox_delivery(delivery_id: int):
+    """デッドレターになった配送を再試行の待ちに戻します"""
+    if not contact_outbox.requeue(delivery_id):
+        raise HTTPException(status_code=404, detail="デッドレターの配送が見つかりません")
+    return {"id": delivery_id, "status": "pending"}
@@ -2,9 +2,13 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Dict, Any
 from ..email_service import get_email_service, ContactForm
+from .. import email_service as email_module
+from ..health import health_prober
+from ..outbox import CONTACT_OUTBOX_ENABLED
+from ..timing import TimedRoute
 import logging
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 class ContactResponse(BaseModel):
     """お問い合わせレスポンス"""
@@ -54,6 +58,9 @@ async def submit_contact_form(
     - SNS通知（本番環境のみ）
     - 自動返信メール
     - レート制限
+    
+    お問い合わせはローカルのアウトボックスに保存した時点で受け付け、S3保存・SNS通知はバックグラウンドで行います
+    （失敗した場合は再試行します。`CONTACT_OUTBOX_ENABLED=false` の場合はリクエストの中で処理します）。
     """
     try:
         email_service = get_email_service()
@@ -61,8 +68,9 @@ async def submit_contact_form(
         # IPアドレスの取得
         ip_address = request.client.host
         
-        # 統合処理を実行
-        result = await email_service.process_contact_form(
+        # アウトボックスに保存（無効の場合は統合処理を実行）
+        process = email_service.accept_contact_form if CONTACT_OUTBOX_ENABLED else email_service.process_contact_form
+        result = await process(
             contact_form=contact_form,
             ip_address=ip_address
         )
@@ -190,10 +198,18 @@ def check_email_health():
     メールサービスのヘルスチェック
     
     メール機能が正常に動作するかを確認します
+    （サービスの初期化は起動処理で行い、Redis・SNSの状態はバックグラウンドのヘルスチェックの結果を使います）
     """
     try:
-        email_service = get_email_service()
-        health_info = email_service.health_check()
+        if email_module.email_service is None:
+            return EmailHealthResponse(status="initializing", error="メールサービスを初期化しています")
+        health_info = email_module.email_service.health_check()
+        services = health_info.get("services")
+        if services:
+            for name, probe in (("rate_limiter", "redis"), ("sns", "sns")):
+                state = health_prober.status(probe)
+                if services.get(name) and state and state["ok"] is False:
+                    services[name] = False
         return EmailHealthResponse(**health_info)
     except Exception as e:
         return EmailHealthResponse(
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from .. import tracing
+from ..loop_monitor import loop_monitor
+from ..timing import TimedRoute
+from ..admin_auth import require_admin_token
+
+# トレース・スタックには内部の情報が含まれるため、管理用トークン（X-Admin-Token）を要求する
+router = APIRouter(route_class=TimedRoute, dependencies=[Depends(require_admin_token)])
+
+@router.get("/traces")
+def get_traces(
+    limit: int = Query(20, ge=1, le=200, description="取得するトレース数"),
+    trace_id: Optional[str] = Query(None, description="トレースIDで絞り込み"),
+    min_duration_ms: float = Query(0.0, ge=0, description="この時間（ミリ秒）以上のトレースのみ取得")
+):
+    """直近にサンプリングされたトレースを新しい順に取得します"""
+    processor = tracing.get_processor()
+    return {
+        **processor.stats(),
+        "traces": processor.traces(
+            limit=limit,
+            trace_id=trace_id.lower() if trace_id else None,
+            min_duration_ms=min_duration_ms
+        )
+    }
+
+@router.get("/profile", response_class=PlainTextResponse)
+def get_profile(
+    source: str = Query("sampled", pattern="^(sampled|blocking)$", description="sampled: 常時サンプリング / blocking: イベントループのブロック検出時")
+):
+    """イベントループのスタックを folded 形式（flamegraph.pl / speedscope 用）で取得します"""
+    return loop_monitor.folded(source)
+
+@router.post("/profile/reset", status_code=204)
+def reset_profile():
+    """スタックの集計・ブロックの記録をリセットします"""
+    loop_monitor.reset()
+
+@router.get("/loop")
+def get_loop_status(events: int = Query(20, ge=0, le=100, description="取得するブロックの記録数")):
+    """イベントループの遅延と直近のブロックを取得します"""
+    return loop_monitor.snapshot(events)
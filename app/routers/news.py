@@ -1,17 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Request, Header, Depends
 from typing import List, Optional
+from datetime import date
 import uuid
 from pathlib import Path
 from .. import schemas, search
+from ..suggest import suggest_index, SUGGEST_TYPES
+from ..related import related_index, RELATED_TOP_K
+from ..trending import trending_service
+from ..index_monitor import check_write_backpressure
+from ..timing import TimedRoute
+from ..fast_json import fast_response
+from ..health import health_prober
 
-# S3サービスのインポート（オプション）
-try:
-    from ..s3_service import s3_service
-    S3_AVAILABLE = True
-except ImportError:
-    S3_AVAILABLE = False
+# S3サービス（オプション。boto3がない場合は利用不可、クライアントは最初に使うときに作成）
+from ..s3_service import get_s3_service, BOTO3_AVAILABLE as S3_AVAILABLE
+from .. import aws
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 # ローカルサムネイル機能は廃止
 # THUMBNAIL_DIR = Path("static/thumbnails")
@@ -23,11 +28,22 @@ MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
 @router.get("/s3/health")
 def check_s3_health():
-    """S3サービスのヘルスチェック"""
+    """S3サービスのヘルスチェック（バックグラウンドのヘルスチェックの結果を返す）"""
     if not S3_AVAILABLE:
         return {"status": "unavailable", "message": "S3サービスが利用できません"}
     
-    return s3_service.health_check()
+    state = health_prober.status("s3")
+    if state is None or state["ok"] is None:
+        # ヘルスチェックがまだ実行されていない場合のみ直接確認する
+        return get_s3_service().health_check()
+    if not state["ok"]:
+        return {
+            "status": "unhealthy",
+            "error": state["error"],
+            "is_local": get_s3_service().is_local,
+            "checked_at": state["checked_at"]
+        }
+    return {**health_prober.detail("s3"), "checked_at": state["checked_at"]}
 
 @router.post("/thumbnails/s3", response_model=schemas.S3UploadResponse)
 async def upload_thumbnail_to_s3(
@@ -38,6 +54,7 @@ async def upload_thumbnail_to_s3(
     
     if not S3_AVAILABLE:
         raise HTTPException(status_code=503, detail="S3サービスが利用できません")
+    s3_service = get_s3_service()
     
     # ファイルタイプの検証
     if file.content_type not in ALLOWED_IMAGE_TYPES:
@@ -55,8 +72,9 @@ async def upload_thumbnail_to_s3(
         )
     
     try:
-        # S3にアップロード
-        s3_url, cloudfront_url, filename = s3_service.upload_image(
+        # S3にアップロード（イベントループを止めないようにAWS用のスレッドプールで実行）
+        s3_url, cloudfront_url, filename = await aws.run(
+            s3_service.upload_image,
             file_content=file_content,
             content_type=file.content_type,
             original_filename=file.filename,
@@ -83,6 +101,7 @@ def list_s3_thumbnails(
     
     if not S3_AVAILABLE:
         raise HTTPException(status_code=503, detail="S3サービスが利用できません")
+    s3_service = get_s3_service()
     
     try:
         images = s3_service.list_images(prefix=prefix, max_keys=max_keys)
@@ -101,6 +120,7 @@ def delete_s3_thumbnail(filename: str):
     
     if not S3_AVAILABLE:
         raise HTTPException(status_code=503, detail="S3サービスが利用できません")
+    s3_service = get_s3_service()
     
     try:
         success = s3_service.delete_image(filename)
@@ -127,7 +147,7 @@ def delete_thumbnail_deprecated(filename: str):
         detail="ローカルサムネイル機能は廃止されました。/api/v1/news/thumbnails/s3/{filename} を使用してください。"
     )
 
-@router.post("", response_model=schemas.NewsArticle)
+@router.post("", response_model=schemas.NewsArticle, dependencies=[Depends(check_write_backpressure)])
 def create_article(article: schemas.NewsArticleCreate):
     """新しい記事を作成します"""
     try:
@@ -144,7 +164,8 @@ def read_articles(
     tags: Optional[List[str]] = Query(None, description="タグでフィルタリング（複数指定可能）")
 ):
     """記事一覧を取得します"""
-    return search.list_articles(skip, limit, category, published, tags)
+    # 記事は書き込み時に検証済みのため、レスポンスモデルでの再検証を省略する（スキーマはOpenAPI用）
+    return fast_response(search.list_articles(skip, limit, category, published, tags))
 
 @router.get("/facets", response_model=schemas.FacetResponse)
 def get_facets(
@@ -161,6 +182,51 @@ def get_facets(
         tags=tags
     )
 
+@router.get("/facets/tags", response_model=schemas.FacetSearchResponse)
+def search_tag_facets(
+    prefix: Optional[str] = Query(None, description="タグの前方一致検索文字列"),
+    q: Optional[str] = Query(None, description="検索クエリ（任意）"),
+    category: Optional[str] = Query(None, description="カテゴリでフィルタリング"),
+    published: Optional[bool] = Query(None, description="公開状態でフィルタリング"),
+    limit: int = Query(20, ge=1, le=search.MAX_VALUES_PER_FACET, description="取得件数（上位k件）"),
+    offset: int = Query(0, ge=0, description="スキップ件数")
+):
+    """タグをファセット検索します（タグピッカー用・件数順）"""
+    return search.search_tag_facets(
+        prefix=prefix,
+        query=q,
+        category=category,
+        published=published,
+        limit=limit,
+        offset=offset
+    )
+
+@router.get("/facets/histogram", response_model=schemas.HistogramResponse)
+def get_date_histogram(
+    interval: str = Query("month", pattern="^(day|week|month)$", description="集計間隔: day, week, month"),
+    start: Optional[date] = Query(None, description="集計開始日（例：2024-01-01）"),
+    end: Optional[date] = Query(None, description="集計終了日（例：2024-12-31）"),
+    q: Optional[str] = Query(None, description="検索クエリ（任意）"),
+    category: Optional[str] = Query(None, description="カテゴリでフィルタリング"),
+    published: Optional[bool] = Query(None, description="公開状態でフィルタリング"),
+    tags: Optional[List[str]] = Query(None, description="タグでフィルタリング（複数指定可能）")
+):
+    """作成日時の日・週・月ごとの記事数を取得します（アーカイブナビゲーション用）"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="集計開始日は終了日以前を指定してください")
+    try:
+        return search.get_date_histogram(
+            interval=interval,
+            start=start,
+            end=end,
+            query=q,
+            category=category,
+            published=published,
+            tags=tags
+        )
+    except search.HistogramRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/search", response_model=schemas.SearchResponse)
 def search_articles_endpoint(
     q: Optional[str] = Query(None, description="検索クエリ（任意）"),
@@ -169,10 +235,10 @@ def search_articles_endpoint(
     tags: Optional[List[str]] = Query(None, description="タグでフィルタリング（複数指定可能）"),
     limit: int = Query(10, description="取得件数"),
     offset: int = Query(0, description="スキップ件数"),
-    sort_by: Optional[str] = Query(None, description="ソート順（例：created_at:desc）")
+    sort_by: Optional[str] = Query(None, description="ソート順（例：created_at:desc、trending）")
 ):
     """記事を検索します（検索クエリなしでフィルタリングのみも可能）"""
-    return search.search_articles(
+    return fast_response(search.search_articles(
         query=q or "",  # qがNoneの場合は空文字列を渡す
         category=category,
         published=published,
@@ -180,7 +246,21 @@ def search_articles_endpoint(
         limit=limit,
         offset=offset,
         sort_by=sort_by
-    )
+    ))
+
+@router.get("/suggest", response_model=schemas.SuggestResponse)
+def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="入力中の文字列"),
+    limit: int = Query(10, ge=1, le=50, description="取得件数"),
+    types: Optional[List[str]] = Query(None, description=f"候補の種類（複数指定可能）: {', '.join(SUGGEST_TYPES)}")
+):
+    """検索ボックス用のサジェスト候補を返します（Meilisearchには問い合わせません）"""
+    if types and not set(types) <= set(SUGGEST_TYPES):
+        raise HTTPException(
+            status_code=400,
+            detail=f"サポートされていない種類です。指定可能な種類: {', '.join(SUGGEST_TYPES)}"
+        )
+    return {"query": q, "items": suggest_index.suggest(q, limit=limit, types=types)}
 
 @router.get("/{article_id}", response_model=schemas.NewsArticle)
 def read_article(article_id: int):
@@ -190,7 +270,28 @@ def read_article(article_id: int):
         raise HTTPException(status_code=404, detail="記事が見つかりません")
     return article
 
-@router.put("/{article_id}", response_model=schemas.NewsArticle)
+@router.get("/{article_id}/related", response_model=schemas.RelatedResponse)
+def read_related_articles(
+    article_id: int,
+    limit: int = Query(5, ge=1, le=RELATED_TOP_K, description="取得件数")
+):
+    """指定された記事の関連記事を取得します（事前計算済みの類似度インデックスを使用）"""
+    items = related_index.related(article_id, limit=limit)
+    if items is None:
+        raise HTTPException(status_code=404, detail="記事が見つかりません")
+    return {"article_id": article_id, "items": items}
+
+@router.post("/{article_id}/view", status_code=202, response_model=schemas.ViewResponse)
+def record_article_view(
+    article_id: int,
+    request: Request,
+    x_visitor_id: Optional[str] = Header(None, description="訪問者ID（未指定の場合はIPアドレス）")
+):
+    """記事の閲覧を記録します（Redisに集計し、トレンドスコアは定期的にまとめて反映）"""
+    visitor_id = x_visitor_id or request.client.host
+    return {"recorded": trending_service.record_view(article_id, visitor_id)}
+
+@router.put("/{article_id}", response_model=schemas.NewsArticle, dependencies=[Depends(check_write_backpressure)])
 def update_article(
     article_id: int,
     article: schemas.NewsArticleUpdate
@@ -203,7 +304,7 @@ def update_article(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/{article_id}")
+@router.delete("/{article_id}", dependencies=[Depends(check_write_backpressure)])
 def delete_article(article_id: int):
     """指定されたIDの記事を削除します"""
     try:
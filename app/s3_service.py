@@ -1,22 +1,28 @@
-import boto3
+import importlib.util
+import threading
 import uuid
 import os
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from pathlib import Path
-from dotenv import load_dotenv
+from .metrics import track_backend
+from .tracing import traced
+from . import aws
 import mimetypes
 
-load_dotenv()
+# boto3の読み込みは起動時間に影響するため、クライアントを作成するときに読み込む
+BOTO3_AVAILABLE = importlib.util.find_spec("boto3") is not None
+
 
 class S3ImageService:
     def __init__(self):
         # 環境に応じてエンドポイントを切り替え
+        # 接続プール・タイムアウト・リトライは全てのAWSクライアントで共通の設定（aws.client_config）を使う
         self.is_local = os.getenv('ENVIRONMENT', 'development') == 'development'
         
         if self.is_local:
             # LocalStack設定
-            self.s3_client = boto3.client(
+            self.s3_client = aws.create_client(
                 's3',
                 endpoint_url='http://localhost:4566',
                 aws_access_key_id='test',
@@ -28,7 +34,7 @@ class S3ImageService:
             self.base_url = 'http://localhost:4566'
         else:
             # 本番AWS設定
-            self.s3_client = boto3.client(
+            self.s3_client = aws.create_client(
                 's3',
                 aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                 aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
@@ -38,8 +44,7 @@ class S3ImageService:
             self.cloudfront_domain = os.getenv('CLOUDFRONT_DOMAIN')
             self.base_url = f"https://{self.bucket_name}.s3.{os.getenv('AWS_REGION', 'ap-northeast-1')}.amazonaws.com"
         
-        # バケットの存在確認・作成
-        self._ensure_bucket_exists()
+        # バケットの存在確認・作成は起動処理（lifespan）で ensure_bucket() を呼び出して行う
         
         # 許可する画像形式
         self.allowed_types = {
@@ -56,10 +61,11 @@ class S3ImageService:
             'long': 'max-age=31536000, public'    # 1年
         }
     
-    def _ensure_bucket_exists(self):
-        """バケットの存在確認・作成"""
+    def ensure_bucket(self):
+        """バケットの存在確認・作成（作成できない場合は例外を送出）"""
         try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
+            with track_backend("s3", "head_bucket"):
+                self.s3_client.head_bucket(Bucket=self.bucket_name)
             print(f"S3バケット確認: {self.bucket_name} (存在)")
         except Exception:
             try:
@@ -81,8 +87,9 @@ class S3ImageService:
                     print(f"S3バケット作成: {self.bucket_name} (AWS)")
             except Exception as e:
                 print(f"S3バケット作成失敗: {str(e)}")
-                # バケット作成に失敗してもサービスは継続
+                raise
     
+    @traced()
     def upload_image(
         self, 
         file_content: bytes, 
@@ -126,7 +133,8 @@ class S3ImageService:
             if not self.is_local:
                 put_object_args['Expires'] = expires
             
-            self.s3_client.put_object(**put_object_args)
+            with track_backend("s3", "put_object"):
+                self.s3_client.put_object(**put_object_args)
             
             # URLを生成
             if self.is_local:
@@ -144,13 +152,15 @@ class S3ImageService:
         except Exception as e:
             raise Exception(f"S3アップロードに失敗しました: {str(e)}")
     
+    @traced()
     def delete_image(self, filename: str) -> bool:
         """S3から画像を削除"""
         try:
-            self.s3_client.delete_object(
-                Bucket=self.bucket_name,
-                Key=filename
-            )
+            with track_backend("s3", "delete_object"):
+                self.s3_client.delete_object(
+                    Bucket=self.bucket_name,
+                    Key=filename
+                )
             return True
         except Exception as e:
             print(f"S3削除エラー: {str(e)}")
@@ -168,13 +178,15 @@ class S3ImageService:
         except Exception as e:
             raise Exception(f"署名付きURL生成に失敗しました: {str(e)}")
     
+    @traced()
     def get_image_info(self, filename: str) -> Optional[dict]:
         """S3からファイル情報を取得"""
         try:
-            response = self.s3_client.head_object(
-                Bucket=self.bucket_name,
-                Key=filename
-            )
+            with track_backend("s3", "head_object"):
+                response = self.s3_client.head_object(
+                    Bucket=self.bucket_name,
+                    Key=filename
+                )
             return {
                 'size': response['ContentLength'],
                 'content_type': response['ContentType'],
@@ -187,14 +199,16 @@ class S3ImageService:
             print(f"ファイル情報取得エラー: {str(e)}")
             return None
     
+    @traced()
     def list_images(self, prefix: str = "thumbnails/", max_keys: int = 100) -> list:
         """S3バケット内の画像一覧を取得"""
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix,
-                MaxKeys=max_keys
-            )
+            with track_backend("s3", "list_objects_v2"):
+                response = self.s3_client.list_objects_v2(
+                    Bucket=self.bucket_name,
+                    Prefix=prefix,
+                    MaxKeys=max_keys
+                )
             
             images = []
             for obj in response.get('Contents', []):
@@ -214,7 +228,8 @@ class S3ImageService:
         """S3サービスのヘルスチェック"""
         try:
             # バケットの存在確認
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
+            with track_backend("s3", "head_bucket"):
+                self.s3_client.head_bucket(Bucket=self.bucket_name)
             return {
                 'status': 'healthy',
                 'bucket': self.bucket_name,
@@ -228,5 +243,21 @@ class S3ImageService:
                 'is_local': self.is_local
             }
 
-# シングルトンインスタンス
-s3_service = S3ImageService() 
\ No newline at end of file
+# シングルトンインスタンス（読み込み時には作成せず、最初に使うときに作成する）
+_s3_service: Optional[S3ImageService] = None
+_s3_service_lock = threading.Lock()
+
+def get_s3_service() -> S3ImageService:
+    """S3サービスのインスタンスを取得"""
+    global _s3_service
+    if _s3_service is None:
+        with _s3_service_lock:
+            if _s3_service is None:
+                _s3_service = S3ImageService()
+    return _s3_service
+
+def __getattr__(name: str):
+    # 後方互換のため `from app.s3_service import s3_service` も使えるようにする
+    if name == "s3_service":
+        return get_s3_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional, List, Dict
 
 class NewsArticle(BaseModel):
@@ -55,6 +55,58 @@ class FacetResponse(BaseModel):
     published: List[FacetCount] = []
     total_articles: int = 0
 
+class FacetSearchResponse(BaseModel):
+    """ファセット検索（タグの前方一致検索）のレスポンス"""
+    items: List[FacetCount] = []
+    total: int = 0
+    limit: int
+    offset: int
+    prefix: Optional[str] = None
+    exhaustive: bool = True  # Falseの場合は上限で打ち切られている（prefixで絞り込んでください）
+
+class HistogramBucket(BaseModel):
+    """日付ヒストグラムのバケット"""
+    key: str  # 日・週: YYYY-MM-DD（週は月曜日）、月: YYYY-MM
+    start: date
+    count: int
+
+class HistogramResponse(BaseModel):
+    """日付ヒストグラムのレスポンス"""
+    interval: str
+    buckets: List[HistogramBucket] = []
+    total: int = 0
+
+class Suggestion(BaseModel):
+    """サジェスト候補"""
+    text: str
+    type: str  # title, tag, category, author
+    count: int  # 該当する記事数
+
+class SuggestResponse(BaseModel):
+    """サジェストのレスポンス"""
+    query: str
+    items: List[Suggestion] = []
+
+class RelatedArticle(BaseModel):
+    """関連記事"""
+    id: int
+    title: str
+    category: Optional[str] = None
+    tags: List[str] = []
+    thumbnail_url: Optional[str] = None
+    thumbnail_alt: Optional[str] = None
+    created_at: Optional[datetime] = None
+    score: float  # 類似度（0〜1）
+
+class RelatedResponse(BaseModel):
+    """関連記事のレスポンス"""
+    article_id: int
+    items: List[RelatedArticle] = []
+
+class ViewResponse(BaseModel):
+    """閲覧記録のレスポンス"""
+    recorded: bool  # Redisが利用できない場合はFalse
+
 class ThumbnailUploadResponse(BaseModel):
     """サムネイルアップロードのレスポンス"""
     thumbnail_url: str
@@ -1,46 +1,116 @@
 from meilisearch import Client
 from meilisearch.index import Index
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date, timedelta
+from .cache import TTLCache
+from .suggest import SUGGEST_SYNC_INTERVAL, suggest_index
+from .related import RELATED_REBUILD_INTERVAL, related_index
+from .write_batcher import WriteCoalescer
+from .metrics import track_backend
+from . import timing
+from .tracing import traced
+from .search_stats import search_stats, normalize_filters
+from .schemas import NewsArticle
 import os
-from dotenv import load_dotenv
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
+import asyncio
 import json
+import threading
 import time
 
-load_dotenv()
+# Meilisearchクライアント（読み込み時には作成せず、最初に使うときに作成する）
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
 
-# Meilisearchクライアントの初期化
-client = Client(
-    os.getenv("MEILISEARCH_URL", "http://localhost:7700"),
-    os.getenv("MEILI_MASTER_KEY")
-)
+def get_client() -> Client:
+    """Meilisearchクライアントを取得します（初回の呼び出し時に作成）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client(
+                    os.getenv("MEILISEARCH_URL", "http://localhost:7700"),
+                    os.getenv("MEILI_MASTER_KEY")
+                )
+    return _client
+
+def __getattr__(name: str):
+    # 後方互換のため `from app.search import client` も使えるようにする
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # インデックス設定
 INDEX_NAME = "articles"
+MAX_VALUES_PER_FACET = 100
+
+# 書き込みバッチ設定（作成・更新をまとめて1つのインデックスタスクにする）
+WRITE_BATCH_WINDOW = float(os.getenv("MEILI_WRITE_BATCH_WINDOW_MS", "20")) / 1000
+WRITE_BATCH_MAX_DOCS = int(os.getenv("MEILI_WRITE_BATCH_MAX_DOCS", "100"))
+
+# 日付ヒストグラム設定（バケットは作成日時から書き込み時に計算して保存）
+ARCHIVE_UTC_OFFSET = timedelta(hours=float(os.getenv("ARCHIVE_UTC_OFFSET_HOURS", "0")))
+HISTOGRAM_INTERVALS = {
+    "day": "created_day",
+    "week": "created_week",
+    "month": "created_month"
+}
+# 一覧・検索で取得する記事のフィールド（レスポンスモデルと同じ。時間バケットなどの内部用フィールドは返さない）
+ARTICLE_ATTRIBUTES = list(NewsArticle.model_fields)
+_ARTICLE_DEFAULTS = {
+    name: field.get_default(call_default_factory=True)
+    for name, field in NewsArticle.model_fields.items()
+    if not field.is_required()
+}
+
+facet_search_cache = TTLCache(
+    "facet_search",
+    maxsize=int(os.getenv("FACET_SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("FACET_SEARCH_CACHE_TTL", "30"))
+)
+
+# ヒストグラム用のバケット間隔（各フィールド値の刻み幅）
+_BUCKET_STEPS = {"day": 1, "week": 7, "month": 1}
+
+# 1回のヒストグラムで集計するバケット数の上限（超える期間は400を返す。日単位で約10年分）
+HISTOGRAM_MAX_BUCKETS = int(os.getenv("HISTOGRAM_MAX_BUCKETS", "3660"))
+
+histogram_cache = TTLCache(
+    "histogram",
+    maxsize=int(os.getenv("HISTOGRAM_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("HISTOGRAM_CACHE_TTL", "30"))
+)
 
 _id_counter = 1
+_id_lock = threading.Lock()
 
 def get_next_id() -> int:
     global _id_counter
-    result = _id_counter
-    _id_counter += 1
+    with _id_lock:
+        result = _id_counter
+        _id_counter += 1
     return result
 
 def reset_id_counter():
     global _id_counter
-    _id_counter = 1
+    with _id_lock:
+        _id_counter = 1
 
 def setup_index():
     """インデックスの設定を行います"""
-    index = client.index(INDEX_NAME)
+    index = get_client().index(INDEX_NAME)
     
     # インデックス設定
     settings = {
         "searchableAttributes": ["title", "content", "category", "author", "tags"],
-        "filterableAttributes": ["category", "published", "created_at", "tags"],
-        "sortableAttributes": ["created_at", "updated_at"],
+        "filterableAttributes": [
+            "id", "category", "published", "created_at", "tags",
+            "created_ts", "created_day", "created_week", "created_month"
+        ],
+        "sortableAttributes": ["created_at", "updated_at", "trending_score", "view_count"],
         "faceting": {
-            "maxValuesPerFacet": 100
+            "maxValuesPerFacet": MAX_VALUES_PER_FACET,
+            # タグは件数順に並べ、上限で切り捨てられるのをロングテール側にする
+            "sortFacetValuesBy": {"*": "alpha", "tags": "count"}
         },
         "rankingRules": [
             "words",
@@ -52,13 +122,37 @@ def setup_index():
         ]
     }
     
-    index.update_settings(settings)
+    with track_backend("meilisearch", "update_settings"):
+        index.update_settings(settings)
     return index
 
+def _write_documents(documents: List[Dict[str, Any]]) -> int:
+    """ドキュメントをまとめてインデックスに書き込み、タスクUIDを返します"""
+    index = get_client().index(INDEX_NAME)
+    with track_backend("meilisearch", "add_documents"):
+        task = index.add_documents(documents)
+    with track_backend("meilisearch", "wait_for_task"):
+        result = index.wait_for_task(task.task_uid)
+    if result.status == "failed":
+        raise Exception(f"インデックスへの書き込みに失敗しました: {result.error}")
+    return task.task_uid
+
+write_coalescer = WriteCoalescer(
+    _write_documents,
+    window=WRITE_BATCH_WINDOW,
+    max_docs=WRITE_BATCH_MAX_DOCS
+)
+
+def _save_document(document: Dict[str, Any]) -> int:
+    """記事ドキュメントを書き込みます（バッチ有効時は他の書き込みとまとめる）"""
+    if WRITE_BATCH_WINDOW <= 0:
+        return _write_documents([document])
+    with timing.span("meilisearch.write_batch"):
+        return write_coalescer.submit(document)
+
+@traced()
 def create_article(article_data: Dict[str, Any]) -> Dict[str, Any]:
     """記事を作成します"""
-    index = client.index(INDEX_NAME)
-    
     # 現在時刻を取得
     now = datetime.now(timezone.utc)
     
@@ -69,30 +163,33 @@ def create_article(article_data: Dict[str, Any]) -> Dict[str, Any]:
         "created_at": now.isoformat(),
         "updated_at": now.isoformat()
     }
+    _add_time_buckets(article)
     
-    # インデックスに追加
-    task = index.add_documents([article])
-    index.wait_for_task(task.task_uid)
+    # インデックスに追加（短時間の書き込みはまとめて1タスクにする）
+    _save_document(article)
+    _on_article_saved(article)
     return article
 
+@traced()
 def update_article(article_id: int, article_data: Dict[str, Any]) -> Dict[str, Any]:
     """記事を更新します"""
-    index = client.index(INDEX_NAME)
     article = get_article(article_id)
     if not article:
         raise ValueError("記事が見つかりません")
     update_data = {k: v for k, v in article_data.items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     updated_article = {**article, **update_data}
-    task = index.update_documents([updated_article])
-    index.wait_for_task(task.task_uid)
+    _add_time_buckets(updated_article)
+    _save_document(updated_article)
+    _on_article_saved(updated_article)
     # インデックス反映を待つ
     time.sleep(0.1)
     return updated_article
 
+@traced()
 def delete_article(article_id: int):
     """記事を削除します（S3画像も含む）"""
-    index = client.index(INDEX_NAME)
+    index = get_client().index(INDEX_NAME)
     
     # 削除前に記事を取得してサムネイルURLを確認
     article = get_article(article_id)
@@ -104,13 +201,13 @@ def delete_article(article_id: int):
     if thumbnail_url and _is_s3_thumbnail_url(thumbnail_url):
         try:
             # S3サービスをインポート（循環インポートを避けるため関数内でインポート）
-            from .s3_service import s3_service
+            from .s3_service import get_s3_service
             
             # S3 URLからファイル名を抽出
             filename = _extract_s3_filename(thumbnail_url)
             if filename:
                 print(f"S3画像削除: {filename}")
-                success = s3_service.delete_image(filename)
+                success = get_s3_service().delete_image(filename)
                 if success:
                     print(f"S3画像削除: 成功")
                 else:
@@ -120,12 +217,120 @@ def delete_article(article_id: int):
             # S3削除に失敗しても記事削除は続行
     
     # 記事をMeilisearchから削除
-    task = index.delete_document(article_id)
-    index.wait_for_task(task.task_uid)
+    with track_backend("meilisearch", "delete_document"):
+        task = index.delete_document(article_id)
+    with track_backend("meilisearch", "wait_for_task"):
+        index.wait_for_task(task.task_uid)
+    _on_article_deleted(article_id)
     # インデックス反映を待つ
     time.sleep(0.1)
     print(f"記事削除: 完了 (ID: {article_id})")
 
+def _invalidate_caches():
+    """書き込み後に検索結果キャッシュを無効化します"""
+    histogram_cache.invalidate()
+    facet_search_cache.invalidate()
+
+def _on_article_saved(article: Dict[str, Any]):
+    """記事の作成・更新後にキャッシュとインメモリインデックスを更新します"""
+    _invalidate_caches()
+    suggest_index.upsert(article)
+    related_index.upsert(article)
+
+def _on_article_deleted(article_id: int):
+    """記事の削除後にキャッシュとインメモリインデックスを更新します"""
+    _invalidate_caches()
+    suggest_index.remove(article_id)
+    related_index.remove(article_id)
+
+# インメモリインデックスの構築に取得する記事のフィールド（サジェストのみの場合は本文などを読まない）
+_INDEX_FIELDS = [
+    "id", "title", "content", "tags", "category", "author", "published",
+    "thumbnail_url", "thumbnail_alt", "created_at"
+]
+_SUGGEST_FIELDS = ["id", "title", "tags", "category", "author", "published"]
+
+# インメモリインデックスを構築した時点のMeilisearchのインデックスの更新日時
+# （関連記事は再構築の負荷が大きいため、サジェストとは別に記録して RELATED_REBUILD_INTERVAL 秒ごとに再構築する）
+_index_sync = {"updated_at": None, "related_updated_at": None, "related_built_at": 0.0, "error": None}
+_index_sync_lock = threading.Lock()
+
+def _index_updated_at() -> str:
+    """Meilisearchのインデックスの更新日時（どのワーカーからの書き込みでも変わる）"""
+    with track_backend("meilisearch", "get_index"):
+        return get_client().index(INDEX_NAME).get_raw_info()["updatedAt"]
+
+def rebuild_in_memory_indexes():
+    """全記事からサジェスト・関連記事のインメモリインデックスを構築します（起動時）"""
+    with _index_sync_lock:
+        # 読み込み中の書き込みも次回の同期で反映されるよう、先に更新日時を取得する
+        updated_at = _index_updated_at()
+        articles = list(iter_all_articles(fields=_INDEX_FIELDS))
+        suggest_index.rebuild(articles)
+        related_index.rebuild(articles)
+        _index_sync.update(updated_at=updated_at, related_updated_at=updated_at, related_built_at=time.monotonic())
+
+def sync_in_memory_indexes() -> bool:
+    """他のワーカーで書き込みがあった場合にサジェスト・関連記事のインデックスを再構築します
+
+    インデックスの更新日時が前回の構築から変わっていなければ何もしません。
+    関連記事は前回の再構築から RELATED_REBUILD_INTERVAL 秒以上経っている場合のみ再構築します
+    （他のワーカーの書き込みの反映と、差分更新で再計算しないIDFの補正を兼ねる）。
+    起動時の構築（rebuild_in_memory_indexes）が終わるまでは何もしません。戻り値は再構築したかどうか。
+    """
+    if _index_sync["updated_at"] is None or not _index_sync_lock.acquire(blocking=False):
+        return False
+    try:
+        updated_at = _index_updated_at()
+        changed = updated_at != _index_sync["updated_at"]
+        rebuild_related = (
+            updated_at != _index_sync["related_updated_at"]
+            and time.monotonic() - _index_sync["related_built_at"] >= RELATED_REBUILD_INTERVAL
+        )
+        if rebuild_related:
+            articles = list(iter_all_articles(fields=_INDEX_FIELDS))
+            suggest_index.rebuild(articles)
+            related_index.rebuild(articles)
+            _index_sync.update(related_updated_at=updated_at, related_built_at=time.monotonic())
+        elif changed:
+            suggest_index.rebuild(iter_all_articles(fields=_SUGGEST_FIELDS))
+        else:
+            return False
+        if changed:
+            # 検索結果のキャッシュもワーカーごとのため、他のワーカーの書き込みに合わせて無効化する
+            _invalidate_caches()
+        _index_sync["updated_at"] = updated_at
+        return True
+    finally:
+        _index_sync_lock.release()
+
+async def run_index_sync(interval: float = SUGGEST_SYNC_INTERVAL):
+    """他のワーカーでの記事の書き込みをインメモリインデックスに反映するバックグラウンドジョブ"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(sync_in_memory_indexes)
+            _index_sync["error"] = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if _index_sync["error"] is None:
+                print(f"インメモリインデックス: 同期エラー ({error})")
+            _index_sync["error"] = error
+
+def _add_time_buckets(article: Dict[str, Any]) -> Dict[str, Any]:
+    """作成日時から日付ヒストグラム用の数値バケットを計算して記事に付与します"""
+    created = datetime.fromisoformat(article["created_at"])
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    local = created.astimezone(timezone.utc) + ARCHIVE_UTC_OFFSET
+    day = (local.date() - date(1970, 1, 1)).days
+    article["created_ts"] = int(created.timestamp())
+    article["created_day"] = day
+    # 週は月曜始まり（1970-01-01は木曜日）
+    article["created_week"] = day - (day + 3) % 7
+    article["created_month"] = local.year * 12 + local.month - 1
+    return article
+
 def _is_s3_thumbnail_url(url: str) -> bool:
     """URLがS3サムネイル画像かどうかを判定"""
     if not url:
@@ -148,9 +353,6 @@ def _is_s3_thumbnail_url(url: str) -> bool:
     is_s3_domain = any(pattern in url_lower for pattern in s3_patterns)
     
     # 環境変数で設定されたカスタムドメインもチェック
-    from dotenv import load_dotenv
-    import os
-    load_dotenv()
     custom_domain = os.getenv('CLOUDFRONT_DOMAIN')
     if custom_domain and custom_domain.lower() in url_lower:
         is_s3_domain = True
@@ -175,27 +377,24 @@ def _extract_s3_filename(url: str) -> Optional[str]:
     
     return f"thumbnails/{filename}" if filename else None
 
+@traced()
 def get_article(article_id: int) -> Optional[Dict[str, Any]]:
     """記事を取得します"""
-    index = client.index(INDEX_NAME)
+    index = get_client().index(INDEX_NAME)
     try:
-        doc = index.get_document(article_id)
+        with track_backend("meilisearch", "get_document"):
+            doc = index.get_document(article_id)
         # DocumentオブジェクトをDictに変換
         return dict(doc) if doc else None
     except:
         return None
 
-def list_articles(
-    skip: int = 0,
-    limit: int = 10,
+def _build_filters(
     category: Optional[str] = None,
     published: Optional[bool] = None,
     tags: Optional[List[str]] = None
-) -> Dict[str, Any]:
-    """記事一覧を取得します"""
-    index = client.index(INDEX_NAME)
-    
-    # フィルター条件の構築
+) -> List[str]:
+    """検索用のフィルター条件リストを構築します"""
     filters = []
     if category:
         filters.append(f"category = {json.dumps(category)}")
@@ -206,27 +405,65 @@ def list_articles(
         tag_filters = [f"tags = {json.dumps(tag)}" for tag in tags]
         if tag_filters:
             filters.append(f"({' OR '.join(tag_filters)})")
+    return filters
+
+def _build_filter_str(filters: List[str]) -> Optional[str]:
+    """フィルター条件リストをMeilisearchのフィルター文字列に変換します"""
+    return " AND ".join(filters) if filters else None
+
+def _article_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """検索結果の記事をレスポンスモデルと同じ形にします（未設定のフィールドに既定値を補う）
+
+    記事は書き込み時にスキーマで検証済みのため、読み取り時には再検証しません。
+    """
+    fields = len(ARTICLE_ATTRIBUTES)
+    return [hit if len(hit) == fields else {**_ARTICLE_DEFAULTS, **hit} for hit in hits]
+
+@traced()
+def list_articles(
+    skip: int = 0,
+    limit: int = 10,
+    category: Optional[str] = None,
+    published: Optional[bool] = None,
+    tags: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """記事一覧を取得します"""
+    started = time.perf_counter()
+    index = get_client().index(INDEX_NAME)
     
-    filter_str = " AND ".join(filters) if filters else None
+    # フィルター条件の構築
+    filter_str = _build_filter_str(_build_filters(category, published, tags))
     
     # 検索実行
-    results = index.search(
-        "",
-        {
-            "limit": limit,
-            "offset": skip,
-            "filter": filter_str,
-            "sort": ["created_at:desc"]
-        }
+    with track_backend("meilisearch", "search"):
+        results = index.search(
+            "",
+            {
+                "limit": limit,
+                "offset": skip,
+                "filter": filter_str,
+                "sort": ["created_at:desc"],
+                "attributesToRetrieve": ARTICLE_ATTRIBUTES
+            }
+        )
+    
+    search_stats.record(
+        "list",
+        None,
+        normalize_filters(category, published, tags),
+        (time.perf_counter() - started) * 1000,
+        results["estimatedTotalHits"],
+        engine_ms=results.get("processingTimeMs")
     )
     
     return {
-        "items": results["hits"],
+        "items": _article_hits(results["hits"]),
         "total": results["estimatedTotalHits"],
         "limit": limit,
         "offset": skip
     }
 
+@traced()
 def search_articles(
     query: str,
     category: Optional[str] = None,
@@ -237,51 +474,83 @@ def search_articles(
     sort_by: Optional[str] = None
 ) -> Dict[str, Any]:
     """記事を検索します"""
-    index = client.index(INDEX_NAME)
+    started = time.perf_counter()
+    index = get_client().index(INDEX_NAME)
     
     # フィルター条件の構築
-    filters = []
-    if category:
-        filters.append(f"category = {json.dumps(category)}")
-    if published is not None:
-        filters.append(f"published = {str(published).lower()}")
-    if tags:
-        # タグは配列なので、いずれかのタグにマッチする条件を作成
-        tag_filters = [f"tags = {json.dumps(tag)}" for tag in tags]
-        if tag_filters:
-            filters.append(f"({' OR '.join(tag_filters)})")
-    
-    filter_str = " AND ".join(filters) if filters else None
+    filter_str = _build_filter_str(_build_filters(category, published, tags))
     
     # ソート条件の解析
     sort = ["created_at:desc"]  # デフォルト
-    if sort_by:
+    if sort_by == "trending":
+        # 閲覧数の時間減衰スコア順（未閲覧の記事は新しい順で後ろに並ぶ）
+        sort = ["trending_score:desc", "created_at:desc"]
+    elif sort_by:
         field, order = sort_by.split(":")
         sort = [f"{field}:{order}"]
     
     # 検索実行
-    results = index.search(
+    with track_backend("meilisearch", "search"):
+        results = index.search(
+            query,
+            {
+                "limit": limit,
+                "offset": offset,
+                "filter": filter_str,
+                "sort": sort,
+                "attributesToRetrieve": ARTICLE_ATTRIBUTES
+            }
+        )
+    
+    search_stats.record(
+        "search",
         query,
-        {
-            "limit": limit,
-            "offset": offset,
-            "filter": filter_str,
-            "sort": sort
-        }
+        normalize_filters(category, published, tags, sort_by),
+        (time.perf_counter() - started) * 1000,
+        results["estimatedTotalHits"],
+        engine_ms=results.get("processingTimeMs")
     )
     
     return {
-        "items": results["hits"],
+        "items": _article_hits(results["hits"]),
         "total": results["estimatedTotalHits"],
         "limit": limit,
         "offset": offset
     }
 
+def filter_existing_ids(article_ids: List[int]) -> set:
+    """指定されたIDのうちインデックスに存在する記事IDを返します"""
+    if not article_ids:
+        return set()
+    index = get_client().index(INDEX_NAME)
+    with track_backend("meilisearch", "get_documents"):
+        documents = index.get_documents({
+            "filter": f"id IN [{', '.join(str(int(i)) for i in article_ids)}]",
+            "fields": ["id"],
+            "limit": len(article_ids)
+        })
+    return {dict(doc)["id"] for doc in documents.results}
+
+@traced()
+def update_popularity(documents: List[Dict[str, Any]]):
+    """閲覧数・トレンドスコアをまとめて部分更新します"""
+    index = get_client().index(INDEX_NAME)
+    with track_backend("meilisearch", "update_documents"):
+        task = index.update_documents(documents)
+    with track_backend("meilisearch", "wait_for_task"):
+        index.wait_for_task(task.task_uid)
+
 def clear_all_articles():
-    index = client.index(INDEX_NAME)
-    task = index.delete_all_documents()
-    index.wait_for_task(task.task_uid)
+    index = get_client().index(INDEX_NAME)
+    with track_backend("meilisearch", "delete_all_documents"):
+        task = index.delete_all_documents()
+    with track_backend("meilisearch", "wait_for_task"):
+        index.wait_for_task(task.task_uid)
+    _invalidate_caches()
+    suggest_index.clear()
+    related_index.clear()
 
+@traced()
 def get_facet_counts(
     query: Optional[str] = None,
     category: Optional[str] = None,
@@ -289,30 +558,30 @@ def get_facet_counts(
     tags: Optional[List[str]] = None
 ) -> Dict[str, Any]:
     """ファセットカウントを取得します"""
-    index = client.index(INDEX_NAME)
+    started = time.perf_counter()
+    index = get_client().index(INDEX_NAME)
     
     # フィルター条件の構築（ファセットカウント用）
-    filters = []
-    if category:
-        filters.append(f"category = {json.dumps(category)}")
-    if published is not None:
-        filters.append(f"published = {str(published).lower()}")
-    if tags:
-        # タグは配列なので、いずれかのタグにマッチする条件を作成
-        tag_filters = [f"tags = {json.dumps(tag)}" for tag in tags]
-        if tag_filters:
-            filters.append(f"({' OR '.join(tag_filters)})")
-    
-    filter_str = " AND ".join(filters) if filters else None
+    filter_str = _build_filter_str(_build_filters(category, published, tags))
     
     # ファセット検索実行
-    results = index.search(
-        query or "",
-        {
-            "limit": 0,  # 結果は不要、ファセットのみ取得
-            "filter": filter_str,
-            "facets": ["category", "published", "tags"]
-        }
+    with track_backend("meilisearch", "search"):
+        results = index.search(
+            query or "",
+            {
+                "limit": 0,  # 結果は不要、ファセットのみ取得
+                "filter": filter_str,
+                "facets": ["category", "published", "tags"]
+            }
+        )
+    
+    search_stats.record(
+        "facets",
+        query,
+        normalize_filters(category, published, tags),
+        (time.perf_counter() - started) * 1000,
+        results.get("estimatedTotalHits", 0),
+        engine_ms=results.get("processingTimeMs")
     )
     
     # ファセット結果の整形
@@ -349,4 +618,200 @@ def get_facet_counts(
         "tags": tags_facet,
         "published": published_facet,
         "total_articles": results.get("estimatedTotalHits", 0)
-    } 
\ No newline at end of file
+    }
+
+def _bucket_value(interval: str, day: date) -> int:
+    """日付をヒストグラムのバケット値に変換します"""
+    epoch_day = (day - date(1970, 1, 1)).days
+    if interval == "day":
+        return epoch_day
+    if interval == "week":
+        return epoch_day - (epoch_day + 3) % 7
+    return day.year * 12 + day.month - 1
+
+def _bucket_label(interval: str, value: int) -> Dict[str, Any]:
+    """バケット値を表示用のキーと開始日に変換します"""
+    if interval == "month":
+        year, month = divmod(value, 12)
+        start = date(year, month + 1, 1)
+        return {"key": start.strftime("%Y-%m"), "start": start}
+    start = date(1970, 1, 1) + timedelta(days=value)
+    return {"key": start.isoformat(), "start": start}
+
+class HistogramRangeError(ValueError):
+    """ヒストグラムの集計期間がバケット数の上限を超えている"""
+
+def _get_bucket_bounds(field: str, query: str, filters: List[str]) -> Optional[tuple]:
+    """対象記事の最古・最新のバケット値を取得します"""
+    bound_filter = _build_filter_str(filters + [f"{field} EXISTS"])
+    with track_backend("meilisearch", "multi_search"):
+        results = get_client().multi_search([
+            {
+                "indexUid": INDEX_NAME,
+                "q": query,
+                "limit": 1,
+                "filter": bound_filter,
+                "sort": [f"created_at:{order}"],
+                "attributesToRetrieve": [field]
+            }
+            for order in ("asc", "desc")
+        ])["results"]
+    oldest, newest = (r["hits"] for r in results)
+    if not oldest or not newest:
+        return None
+    return oldest[0][field], newest[0][field]
+
+@traced()
+def get_date_histogram(
+    interval: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    query: Optional[str] = None,
+    category: Optional[str] = None,
+    published: Optional[bool] = None,
+    tags: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """作成日時の日・週・月ごとの記事数を取得します"""
+    if interval not in HISTOGRAM_INTERVALS:
+        raise ValueError(f"サポートされていない集計間隔です: {interval}")
+    
+    cache_key = (
+        interval, start, end, query or "", category, published,
+        tuple(sorted(tags)) if tags else None
+    )
+    cached = histogram_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    field = HISTOGRAM_INTERVALS[interval]
+    filters = _build_filters(category, published, tags)
+    result = {"interval": interval, "buckets": [], "total": 0}
+    
+    # 範囲は対象記事の最古・最新のバケットに絞る（記事のない期間に対して検索しない）
+    bounds = _get_bucket_bounds(field, query or "", filters)
+    if bounds is None:
+        histogram_cache.set(cache_key, result)
+        return result
+    low = max(_bucket_value(interval, start), bounds[0]) if start else bounds[0]
+    high = min(_bucket_value(interval, end), bounds[1]) if end else bounds[1]
+    if (high - low) // _BUCKET_STEPS[interval] + 1 > HISTOGRAM_MAX_BUCKETS:
+        raise HistogramRangeError(
+            f"集計期間が長すぎます（バケット数の上限: {HISTOGRAM_MAX_BUCKETS}）。期間を短くするか集計間隔を大きくしてください"
+        )
+    
+    # maxValuesPerFacetを超えないように範囲を分割し、multi-searchで一括取得
+    width = MAX_VALUES_PER_FACET * _BUCKET_STEPS[interval]
+    queries = []
+    window_low = low
+    while window_low <= high:
+        window_high = min(window_low + width - 1, high)
+        queries.append({
+            "indexUid": INDEX_NAME,
+            "q": query or "",
+            "limit": 0,
+            "filter": _build_filter_str(filters + [f"{field} {window_low} TO {window_high}"]),
+            "facets": [field]
+        })
+        window_low = window_high + 1
+    
+    counts: Dict[int, int] = {}
+    if queries:
+        with track_backend("meilisearch", "multi_search"):
+            windows = get_client().multi_search(queries)["results"]
+        for window in windows:
+            for value, count in window.get("facetDistribution", {}).get(field, {}).items():
+                bucket = int(float(value))
+                counts[bucket] = counts.get(bucket, 0) + count
+    
+    result["buckets"] = [
+        {**_bucket_label(interval, bucket), "count": counts[bucket]}
+        for bucket in sorted(counts)
+    ]
+    result["total"] = sum(counts.values())
+    histogram_cache.set(cache_key, result)
+    return result
+
+def iter_all_articles(
+    fields: Optional[List[str]] = None,
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """インデックス内の全記事をページングしながら順に返します"""
+    index = get_client().index(INDEX_NAME)
+    offset = 0
+    while True:
+        params = {"offset": offset, "limit": batch_size}
+        if fields:
+            params["fields"] = fields
+        with track_backend("meilisearch", "get_documents"):
+            documents = index.get_documents(params)
+        for doc in documents.results:
+            yield dict(doc)
+        if len(documents.results) < batch_size:
+            break
+        offset += batch_size
+
+def backfill_time_buckets(batch_size: int = 1000) -> int:
+    """既存記事に日付ヒストグラム用のバケットを付与します"""
+    index = get_client().index(INDEX_NAME)
+    updated = 0
+    task = None
+    batch = []
+    for doc in iter_all_articles(fields=["id", "created_at"], batch_size=batch_size):
+        if not doc.get("created_at"):
+            continue
+        batch.append(_add_time_buckets({"id": doc["id"], "created_at": doc["created_at"]}))
+        if len(batch) >= batch_size:
+            with track_backend("meilisearch", "update_documents"):
+                task = index.update_documents(batch)
+            updated += len(batch)
+            batch = []
+    if batch:
+        with track_backend("meilisearch", "update_documents"):
+            task = index.update_documents(batch)
+        updated += len(batch)
+    if task is not None:
+        with track_backend("meilisearch", "wait_for_task"):
+            index.wait_for_task(task.task_uid)
+    _invalidate_caches()
+    return updated
+
+@traced()
+def search_tag_facets(
+    prefix: Optional[str] = None,
+    query: Optional[str] = None,
+    category: Optional[str] = None,
+    published: Optional[bool] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """Meilisearchのファセット検索でタグを前方一致検索します
+
+    ファセット検索は1回あたり最大 MAX_VALUES_PER_FACET 件を返すため、
+    ページングはその範囲内で行います。ロングテールのタグはprefixで絞り込みます。
+    """
+    cache_key = (prefix or "", query or "", category, published)
+    hits = facet_search_cache.get(cache_key)
+    if hits is None:
+        index = get_client().index(INDEX_NAME)
+        opt_params = {
+            "q": query or "",
+            "filter": _build_filter_str(_build_filters(category, published))
+        }
+        with track_backend("meilisearch", "facet_search"):
+            results = index.facet_search("tags", prefix or None, opt_params)
+        hits = [
+            {"value": hit["value"], "count": hit["count"]}
+            for hit in results.get("facetHits", [])
+        ]
+        # 件数順（同数の場合は名前順）で並べる
+        hits.sort(key=lambda x: (-x["count"], x["value"]))
+        facet_search_cache.set(cache_key, hits)
+    
+    return {
+        "items": hits[offset:offset + limit],
+        "total": len(hits),
+        "limit": limit,
+        "offset": offset,
+        "prefix": prefix,
+        "exhaustive": len(hits) < MAX_VALUES_PER_FACET
+    }
@@ -0,0 +1,279 @@
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+
+# 検索の統計を記録するかどうか（デフォルトは有効）
+SEARCH_STATS_ENABLED = os.getenv("SEARCH_STATS_ENABLED", "true").lower() == "true"
+
+# 集計するクエリ（クエリ + フィルター）の種類の上限（超えた分は [other] にまとめる）
+SEARCH_STATS_MAX_KEYS = int(os.getenv("SEARCH_STATS_MAX_KEYS", "5000"))
+
+# 集計結果をファイルに書き出す間隔（秒）と書き出し先
+SEARCH_STATS_FLUSH_INTERVAL = float(os.getenv("SEARCH_STATS_FLUSH_INTERVAL", "60"))
+SEARCH_STATS_DIR = Path(os.getenv("SEARCH_STATS_DIR", "logs/search_stats"))
+
+# この時間（ミリ秒）以上かかった検索をスロークエリログに記録
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG = Path(os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.log"))
+
+# パーセンタイル計算に使う直近のレイテンシの件数（操作ごと）
+_LATENCY_WINDOW = 2048
+_RECENT_SLOW_QUERIES = 100
+_MAX_QUERY_LENGTH = 100
+_OTHER = "[other]"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query: Optional[str]) -> str:
+    """集計用にクエリを正規化します（全角・半角の統一、小文字化、空白の整理）"""
+    if not query:
+        return ""
+    normalized = unicodedata.normalize("NFKC", query).lower()
+    return _WHITESPACE_RE.sub(" ", normalized).strip()[:_MAX_QUERY_LENGTH]
+
+def normalize_filters(
+    category: Optional[str] = None,
+    published: Optional[bool] = None,
+    tags: Optional[List[str]] = None,
+    sort: Optional[str] = None
+) -> str:
+    """集計用にフィルター条件を1つの文字列にします（タグの順序は区別しない）"""
+    parts = []
+    if category:
+        parts.append(f"category={category}")
+    if published is not None:
+        parts.append(f"published={str(published).lower()}")
+    if tags:
+        parts.append(f"tags={','.join(sorted(tags))}")
+    if sort:
+        parts.append(f"sort={sort}")
+    return " ".join(parts)
+
+def _percentile(values, ratio: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * ratio))], 3)
+
+class _QueryStats:
+    """1種類のクエリの集計値"""
+    __slots__ = ("count", "zero_hits", "hits", "cache_hits", "latency_ms", "max_latency_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.zero_hits = 0
+        self.hits = 0
+        self.cache_hits = 0
+        self.latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def add(self, latency_ms: float, hits: int, cache_hit: bool):
+        self.count += 1
+        self.hits += hits
+        self.latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        if hits == 0:
+            self.zero_hits += 1
+        if cache_hit:
+            self.cache_hits += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "zero_hits": self.zero_hits,
+            "avg_hits": round(self.hits / self.count, 1) if self.count else 0.0,
+            "cache_hits": self.cache_hits,
+            "avg_latency_ms": round(self.latency_ms / self.count, 3) if self.count else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 3)
+        }
+
+Key = Tuple[str, str, str]  # (操作, 正規化したクエリ, フィルター)
+
+class SearchStats:
+    """検索の統計（クエリごとの回数・ヒット数・レイテンシ）を集計します
+
+    集計はプロセス起動時からの累計と、定期的にファイルに書き出す区間ごとの2つを持ちます。
+    どちらもクエリの種類は SEARCH_STATS_MAX_KEYS までに制限します。
+    """
+    def __init__(self, max_keys: int = SEARCH_STATS_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._totals: Dict[Key, _QueryStats] = {}
+        self._window: Dict[Key, _QueryStats] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._recent_slow = deque(maxlen=_RECENT_SLOW_QUERIES)
+        self.started_at = datetime.now(timezone.utc)
+        self.window_started_at = self.started_at
+        self.slow_queries = 0
+        self._slow_logger: Optional[logging.Logger] = None
+
+    def _get(self, table: Dict[Key, _QueryStats], key: Key) -> _QueryStats:
+        stats = table.get(key)
+        if stats is None:
+            if len(table) >= self.max_keys:
+                key = (key[0], _OTHER, "")
+                stats = table.get(key)
+            if stats is None:
+                stats = table[key] = _QueryStats()
+        return stats
+
+    def record(
+        self,
+        operation: str,
+        query: Optional[str],
+        filters: str,
+        latency_ms: float,
+        hits: int,
+        cache: str = "none",
+        engine_ms: Optional[float] = None
+    ):
+        """検索1回分を記録します（cache: hit / miss / none）"""
+        if not SEARCH_STATS_ENABLED:
+            return
+
+        key = (operation, normalize_query(query), filters)
+        cache_hit = cache == "hit"
+        with self._lock:
+            self._get(self._totals, key).add(latency_ms, hits, cache_hit)
+            self._get(self._window, key).add(latency_ms, hits, cache_hit)
+            latencies = self._latencies.get(operation)
+            if latencies is None:
+                latencies = self._latencies[operation] = deque(maxlen=_LATENCY_WINDOW)
+            latencies.append(latency_ms)
+
+        if latency_ms >= SLOW_QUERY_THRESHOLD_MS:
+            self._log_slow_query({
+                "time": datetime.now(timezone.utc).isoformat(),
+                "operation": operation,
+                "query": key[1],
+                "filters": filters,
+                "latency_ms": round(latency_ms, 3),
+                "engine_ms": engine_ms,
+                "hits": hits,
+                "cache": cache
+            })
+
+    def _log_slow_query(self, entry: dict):
+        self.slow_queries += 1
+        self._recent_slow.append(entry)
+        try:
+            self._get_slow_logger().info(json.dumps(entry, ensure_ascii=False))
+        except Exception as e:
+            print(f"スロークエリログ: 書き込み失敗 ({type(e).__name__})")
+
+    def _get_slow_logger(self) -> logging.Logger:
+        """スロークエリ専用のロガー（api.log とは別ファイル）"""
+        if self._slow_logger is None:
+            SLOW_QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+            slow_logger = logging.getLogger("search.slow_queries")
+            slow_logger.setLevel(logging.INFO)
+            slow_logger.propagate = False
+            if not slow_logger.handlers:
+                handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                slow_logger.addHandler(handler)
+            self._slow_logger = slow_logger
+        return self._slow_logger
+
+    def flush(self) -> Optional[Path]:
+        """区間の集計結果を日ごとのファイルに1行（JSON）で追記し、区間をリセットします"""
+        with self._lock:
+            window, self._window = self._window, {}
+            window_start, self.window_started_at = self.window_started_at, datetime.now(timezone.utc)
+            window_end = self.window_started_at
+        if not window:
+            return None
+
+        record = {
+            "window_start": window_start.isoformat(),
+            "window_end": window_end.isoformat(),
+            "queries": [
+                {"operation": operation, "query": query, "filters": filters, **stats.to_dict()}
+                for (operation, query, filters), stats in sorted(
+                    window.items(), key=lambda item: item[1].count, reverse=True
+                )
+            ]
+        }
+        SEARCH_STATS_DIR.mkdir(parents=True, exist_ok=True)
+        path = SEARCH_STATS_DIR / f"search_stats-{window_end.strftime('%Y%m%d')}.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return path
+
+    async def run_flusher(self, interval: float = SEARCH_STATS_FLUSH_INTERVAL):
+        """定期的に集計結果を書き出すバックグラウンドジョブ"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception as e:
+                    print(f"検索統計: 書き出し失敗 ({type(e).__name__}: {str(e)})")
+        finally:
+            # 終了時に残りを書き出す
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def summary(self, limit: int = 20, operation: Optional[str] = None) -> dict:
+        """上位のクエリ・ゼロヒットのクエリ・遅いクエリとレイテンシのパーセンタイルを返します"""
+        with self._lock:
+            items = [
+                ({"operation": key[0], "query": key[1], "filters": key[2]}, stats.to_dict())
+                for key, stats in self._totals.items()
+                if operation is None or key[0] == operation
+            ]
+            latencies = {
+                name: list(values) for name, values in self._latencies.items()
+                if operation is None or name == operation
+            }
+            recent_slow = list(self._recent_slow)
+
+        def top(sort_key, predicate=lambda stats: True):
+            selected = [(key, stats) for key, stats in items if predicate(stats)]
+            selected.sort(key=lambda item: sort_key(item[1]), reverse=True)
+            return [{**key, **stats} for key, stats in selected[:limit]]
+
+        return {
+            "since": self.started_at.isoformat(),
+            "total_requests": sum(stats["count"] for _, stats in items),
+            "distinct_queries": len(items),
+            "latency_ms": {
+                name: {
+                    "count": len(values),
+                    "p50": _percentile(values, 0.5),
+                    "p95": _percentile(values, 0.95),
+                    "p99": _percentile(values, 0.99),
+                    "max": round(max(values), 3) if values else None
+                }
+                for name, values in latencies.items()
+            },
+            "top_queries": top(lambda stats: stats["count"]),
+            "zero_hit_queries": top(lambda stats: stats["zero_hits"], lambda stats: stats["zero_hits"] > 0),
+            "slowest_queries": top(lambda stats: stats["avg_latency_ms"]),
+            "slow_query_threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+            "slow_query_count": self.slow_queries,
+            "recent_slow_queries": list(reversed(recent_slow))[:limit]
+        }
+
+    def reset(self):
+        with self._lock:
+            self._totals = {}
+            self._window = {}
+            self._latencies = {}
+            self._recent_slow.clear()
+            self.started_at = datetime.now(timezone.utc)
+            self.window_started_at = self.started_at
+            self.slow_queries = 0
+
+# シングルトンインスタンス
+search_stats = SearchStats()
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+
+# 依存先の初期化のタイムアウト（秒）。依存先ごとに STARTUP_TIMEOUT_<名前> で上書きできる
+# 例: STARTUP_TIMEOUT_MEILISEARCH=20
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", "10"))
+
+# 初期化に失敗した依存先を再試行する間隔（秒、失敗が続くと最大 STARTUP_RETRY_MAX_INTERVAL まで倍にする）
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", "2"))
+STARTUP_RETRY_MAX_INTERVAL = float(os.getenv("STARTUP_RETRY_MAX_INTERVAL", "60"))
+
+@dataclass
+class Dependency:
+    """起動時に初期化する依存先
+
+    init はスレッドで実行される同期関数です（boto3・Meilisearchのクライアントは同期のため）。
+    required=False の依存先は初期化できなくてもレディネスに影響しません。
+    """
+    name: str
+    init: Callable[[], Any]
+    required: bool = True
+    timeout: Optional[float] = None
+
+    def __post_init__(self):
+        if self.timeout is None:
+            self.timeout = float(os.getenv(f"STARTUP_TIMEOUT_{self.name.upper()}", STARTUP_TIMEOUT))
+
+class Readiness:
+    """依存先ごとの初期化の状態（すべての必須の依存先が初期化済みならレディ）"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, dependency: Dependency):
+        with self._lock:
+            self._states[dependency.name] = {
+                "status": "pending",
+                "required": dependency.required,
+                "attempts": 0,
+                "duration_ms": None,
+                "error": None
+            }
+
+    def record(self, name: str, ok: bool, duration: float, error: Optional[str] = None):
+        with self._lock:
+            state = self._states[name]
+            state["status"] = "ready" if ok else "failed"
+            state["attempts"] += 1
+            state["duration_ms"] = round(duration * 1000, 1)
+            state["error"] = error
+
+    def mark_initializing(self, name: str, error: str):
+        """タイムアウトしたが初期化が続いている状態にします（失敗ではない）"""
+        with self._lock:
+            state = self._states[name]
+            state["status"] = "initializing"
+            state["error"] = error
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot()["ready"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            dependencies = {name: dict(state) for name, state in self._states.items()}
+        return {
+            "ready": all(state["status"] == "ready" for state in dependencies.values() if state["required"]),
+            "dependencies": dependencies
+        }
+
+    def reset(self):
+        with self._lock:
+            self._states.clear()
+
+def _start(dependency: Dependency) -> asyncio.Future:
+    """依存先の初期化をスレッドで開始します"""
+    return asyncio.ensure_future(asyncio.to_thread(dependency.init))
+
+async def _wait(
+    dependency: Dependency,
+    registry: Readiness,
+    future: asyncio.Future,
+    start: float,
+    timeout: Optional[float]
+) -> Optional[bool]:
+    """実行中の初期化を最大 timeout 秒待ちます
+
+    戻り値は成功なら True、失敗なら False、タイムアウトした場合は None（初期化は続いている）。
+    """
+    try:
+        # タイムアウトしてもスレッド自体は止められないため、shield して初期化は続けさせる
+        await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        registry.mark_initializing(dependency.name, f"timeout after {dependency.timeout:g}s")
+        print(f"起動処理: {dependency.name} 初期化中 ({dependency.timeout:g}秒以内に完了しませんでした)")
+        return None
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        registry.record(dependency.name, False, time.perf_counter() - start, error)
+        print(f"起動処理: {dependency.name} 初期化失敗 ({error})")
+        return False
+    registry.record(dependency.name, True, time.perf_counter() - start)
+    print(f"起動処理: {dependency.name} 初期化完了 ({(time.perf_counter() - start) * 1000:.0f}ms)")
+    return True
+
+async def _retry(
+    dependency: Dependency,
+    registry: Readiness,
+    future: Optional[asyncio.Future] = None,
+    start: float = 0.0
+):
+    """初期化に成功するまでバックグラウンドで再試行します
+
+    future: タイムアウトした実行中の初期化（完了するまで次の試行は始めない）
+    """
+    interval = STARTUP_RETRY_INTERVAL
+    while True:
+        if future is None:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, STARTUP_RETRY_MAX_INTERVAL)
+            start = time.perf_counter()
+            future = _start(dependency)
+            result = await _wait(dependency, registry, future, start, dependency.timeout)
+        else:
+            result = None
+        if result is None:
+            # 同じ依存先の初期化を重ねて実行しないよう、タイムアウトした初期化は完了まで待つ
+            result = await _wait(dependency, registry, future, start, None)
+        if result:
+            return
+        future = None
+
+async def initialize(dependencies: List[Dependency], registry: Optional[Readiness] = None) -> List[asyncio.Task]:
+    """すべての依存先を並行して初期化します
+
+    起動にかかる時間は最も遅い依存先のタイムアウトまでに抑えられます。
+    タイムアウトした依存先は初期化中（initializing）として、完了した時点でレディになります。
+    初期化できなかった依存先はバックグラウンドで再試行し、そのタスクを返します（終了時にキャンセルしてください）。
+    """
+    registry = registry or readiness
+    for dependency in dependencies:
+        registry.register(dependency)
+
+    start = time.perf_counter()
+    futures = [_start(dependency) for dependency in dependencies]
+    results = await asyncio.gather(*(
+        _wait(dependency, registry, future, start, dependency.timeout)
+        for dependency, future in zip(dependencies, futures)
+    ))
+    # タイムアウトした依存先は実行中の初期化の完了を待ち、失敗した依存先は間隔を空けて再試行する
+    return [
+        asyncio.create_task(_retry(dependency, registry, future if result is None else None, start))
+        for dependency, future, result in zip(dependencies, futures, results)
+        if not result
+    ]
+
+# シングルトンインスタンス
+readiness = Readiness()
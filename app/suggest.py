@@ -0,0 +1,187 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import os
+import re
+import threading
+import unicodedata
+
+# サジェスト対象の種類と記事フィールドの対応
+SUGGEST_TYPES = ("title", "tag", "category", "author")
+
+# 公開記事のみをサジェスト対象にする（下書きのタイトルが漏れないように）
+SUGGEST_PUBLISHED_ONLY = os.getenv("SUGGEST_PUBLISHED_ONLY", "true").lower() == "true"
+
+# 他のワーカーでの記事の作成・更新・削除を反映するため、インデックスの更新日時を確認する間隔（秒）
+# インデックスはワーカー（プロセス）ごとに持つため、更新されていれば全記事から再構築する
+SUGGEST_SYNC_INTERVAL = float(os.getenv("SUGGEST_SYNC_INTERVAL", "5"))
+
+# 1回の検索で走査する最大キー数（短いprefixでも応答時間を一定に保つ）
+MAX_SCAN = int(os.getenv("SUGGEST_MAX_SCAN", "5000"))
+
+# タイトルを単語単位でも前方一致させるための区切り文字
+_WORD_SPLIT = re.compile(r"[\s、。・,.:：;；!！?？「」『』()（）\[\]【】/|]+")
+
+Term = Tuple[str, str]  # (種類, 表示文字列)
+
+def normalize(text: str) -> str:
+    """前方一致用に文字列を正規化します（全角半角・大文字小文字を統一）"""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+def _extract_terms(article: Dict[str, Any]) -> List[Term]:
+    """記事からサジェスト候補を抽出します"""
+    terms: List[Term] = []
+    if article.get("title"):
+        terms.append(("title", article["title"]))
+    for tag in article.get("tags") or []:
+        if tag:
+            terms.append(("tag", tag))
+    if article.get("category"):
+        terms.append(("category", article["category"]))
+    if article.get("author"):
+        terms.append(("author", article["author"]))
+    return terms
+
+def _keys_for(term: Term) -> List[str]:
+    """候補を検索するための正規化済みキーを返します"""
+    kind, text = term
+    key = normalize(text)
+    keys = [key] if key else []
+    if kind == "title":
+        # タイトル中の各単語からも前方一致できるようにする
+        for word in _WORD_SPLIT.split(key)[1:]:
+            if word and word not in keys:
+                keys.append(word)
+    return keys
+
+class SuggestIndex:
+    """サジェスト用のインメモリ前方一致インデックス
+
+    正規化済みキーのソート済み配列を二分探索して候補を取得します。
+    記事の作成・更新・削除時に search.py から差分更新されます（書き込みを処理したワーカーのみ）。
+    他のワーカーでの書き込みは search.run_index_sync() が SUGGEST_SYNC_INTERVAL 秒ごとに反映します。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, str, str]] = []  # (キー, 種類, 表示文字列)
+        self._key_refs: Counter = Counter()
+        self._weights: Counter = Counter()  # 候補ごとの記事数
+        self._article_terms: Dict[int, List[Term]] = {}
+        self._cache: Dict[tuple, List[Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    def _add_term(self, term: Term, bulk: bool = False):
+        self._weights[term] += 1
+        for key in _keys_for(term):
+            entry = (key, *term)
+            if self._key_refs[entry] == 0:
+                if bulk:
+                    # 一括構築時は末尾に追加し、最後にまとめてソートする
+                    self._keys.append(entry)
+                else:
+                    insort(self._keys, entry)
+            self._key_refs[entry] += 1
+
+    def _remove_term(self, term: Term):
+        self._weights[term] -= 1
+        if self._weights[term] <= 0:
+            del self._weights[term]
+        for key in _keys_for(term):
+            entry = (key, *term)
+            self._key_refs[entry] -= 1
+            if self._key_refs[entry] <= 0:
+                del self._key_refs[entry]
+                i = bisect_left(self._keys, entry)
+                if i < len(self._keys) and self._keys[i] == entry:
+                    del self._keys[i]
+
+    def _remove_locked(self, article_id: int):
+        for term in self._article_terms.pop(article_id, []):
+            self._remove_term(term)
+
+    def upsert(self, article: Dict[str, Any], _bulk: bool = False):
+        """記事の候補を追加・更新します"""
+        terms = []
+        if article.get("published") or not SUGGEST_PUBLISHED_ONLY:
+            # 同じ記事内の重複（同名のタグなど）は1件として数える
+            terms = list(dict.fromkeys(_extract_terms(article)))
+        with self._lock:
+            self._remove_locked(article["id"])
+            if terms:
+                self._article_terms[article["id"]] = terms
+                for term in terms:
+                    self._add_term(term, bulk=_bulk)
+            self._cache.clear()
+
+    def remove(self, article_id: int):
+        """記事の候補を削除します"""
+        with self._lock:
+            self._remove_locked(article_id)
+            self._cache.clear()
+
+    def clear(self):
+        """全候補を削除します"""
+        with self._lock:
+            self._keys.clear()
+            self._key_refs.clear()
+            self._weights.clear()
+            self._article_terms.clear()
+            self._cache.clear()
+
+    def rebuild(self, articles: Iterable[Dict[str, Any]]):
+        """記事コーパスからインデックスを再構築します"""
+        index = SuggestIndex()
+        for article in articles:
+            index.upsert(article, _bulk=True)
+        index._keys.sort()
+        with self._lock:
+            self._keys = index._keys
+            self._key_refs = index._key_refs
+            self._weights = index._weights
+            self._article_terms = index._article_terms
+            self._cache.clear()
+
+    def suggest(
+        self,
+        prefix: str,
+        limit: int = 10,
+        types: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """前方一致する候補を記事数の多い順に返します"""
+        key = normalize(prefix)
+        if not key:
+            return []
+        types = tuple(sorted(set(types))) if types else SUGGEST_TYPES
+        cache_key = (key, limit, types)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            found: Dict[Term, int] = {}
+            i = bisect_left(self._keys, (key,))
+            end = min(len(self._keys), i + MAX_SCAN)
+            while i < end and self._keys[i][0].startswith(key):
+                term = self._keys[i][1:]
+                if term[0] in types:
+                    found[term] = self._weights[term]
+                i += 1
+
+            # 記事数の多い順、同数なら短い候補を優先
+            top = heapq.nsmallest(
+                limit, found.items(), key=lambda x: (-x[1], len(x[0][1]), x[0][1])
+            )
+            results = [
+                {"text": text, "type": kind, "count": count}
+                for (kind, text), count in top
+            ]
+            if len(self._cache) >= 1024:
+                self._cache.clear()
+            self._cache[cache_key] = results
+            return results
+
+# シングルトンインスタンス
+suggest_index = SuggestIndex()
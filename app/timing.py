@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from fastapi.datastructures import Default, DefaultPlaceholder
+from starlette.datastructures import MutableHeaders
+from . import profiling, tracing
+import asyncio
+import functools
+import logging
+import os
+import time
+
+# Server-Timingヘッダーの出力（デフォルトは無効）
+# バックエンドの処理時間が外部から見えるため、本番環境では必要な時だけ有効にしてください
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+class TimingRecorder:
+    """1リクエスト分の処理時間（区間ごと）を記録します"""
+    def __init__(self):
+        # list.append はスレッドセーフなので、スレッドプール上のエンドポイントからも追記できる
+        self._spans: List[Tuple[str, float]] = []
+
+    def add(self, name: str, duration: float):
+        self._spans.append((name, duration))
+
+    def summary(self) -> Dict[str, Tuple[float, int]]:
+        """区間名ごとの合計時間（秒）と回数を返します"""
+        result: Dict[str, Tuple[float, int]] = {}
+        for name, duration in list(self._spans):
+            total, count = result.get(name, (0.0, 0))
+            result[name] = (total + duration, count + 1)
+        return result
+
+    def header(self, total: float) -> str:
+        """Server-Timingヘッダーの値を組み立てます（単位はミリ秒）"""
+        summary = self.summary()
+        entries = [("total", total, 1)]
+
+        route = summary.pop("route", None)
+        handler = summary.pop("handler", None)
+        render = summary.get("render")
+        if route is not None:
+            # ルーティング以外（ミドルウェア）に掛かった時間
+            entries.append(("middleware", total - route[0], 1))
+            if handler is not None:
+                entries.append(("handler", handler[0], 1))
+                # リクエスト解析・依存関数・レスポンスモデルの検証
+                validation = route[0] - handler[0] - (render[0] if render else 0.0)
+                entries.append(("validation", max(0.0, validation), 1))
+
+        for name, (duration, count) in summary.items():
+            entries.append((name, duration, count))
+
+        parts = []
+        for name, duration, count in entries:
+            part = f"{name};dur={duration * 1000:.2f}"
+            if count > 1:
+                part += f';desc="{count} calls"'
+            parts.append(part)
+        return ", ".join(parts)
+
+_recorder: ContextVar[Optional[TimingRecorder]] = ContextVar("server_timing_recorder", default=None)
+
+def current() -> Optional[TimingRecorder]:
+    """現在のリクエストのレコーダーを返します（計測していない場合はNone）"""
+    return _recorder.get()
+
+@contextmanager
+def span(name: str):
+    """ブロックの処理時間を現在のリクエストに記録します（計測していない場合は何もしない）"""
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, time.perf_counter() - start)
+
+class TimedJSONResponse(JSONResponse):
+    """JSONエンコードの時間を render として記録するレスポンス"""
+    def render(self, content) -> bytes:
+        with span("render"):
+            return super().render(content)
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """エンドポイント本体の処理時間を handler として記録するラッパー
+
+    functools.wraps でシグネチャを引き継ぐため、FastAPIの引数解決やOpenAPIには影響しません。
+    トレースが有効な場合はエンドポイント名のスパンも記録します。
+    """
+    span_name = f"handler {endpoint.__name__}"
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            with span("handler"), tracing.start_span(span_name):
+                return await endpoint(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def sync_wrapper(*args, **kwargs):
+        # スレッドプールで実行されるため、プロファイル中であればこのスレッドも記録する
+        with span("handler"), tracing.start_span(span_name), profiling.profile_thread():
+            return endpoint(*args, **kwargs)
+    return sync_wrapper
+
+class TimedRoute(APIRoute):
+    """ルート全体・エンドポイント本体・JSONエンコードの処理時間を記録するルート
+
+    APIRouter(route_class=TimedRoute) として使用します。
+    """
+    def __init__(self, path: str, endpoint: Callable, *, response_class=Default(JSONResponse), **kwargs):
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = Default(TimedJSONResponse)
+        super().__init__(path, _timed_endpoint(endpoint), response_class=response_class, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def timed_route_handler(request):
+            with span("route"):
+                return await route_handler(request)
+
+        return timed_route_handler
+
+class ServerTimingMiddleware:
+    """各区間の処理時間を Server-Timing レスポンスヘッダーとログに出力するASGIミドルウェア
+
+    最も外側のミドルウェアとして追加してください。
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        recorder = TimingRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                value = recorder.header(time.perf_counter() - start)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", value)
+                logger.info(f"Server-Timing: {scope['method']} {scope['path']} {message['status']} {value}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _recorder.reset(token)
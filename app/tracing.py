@@ -0,0 +1,448 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+
+# トレースの記録（デフォルトは無効）
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+# traceparent ヘッダーのないリクエストをサンプリングする割合（0.0〜1.0）
+# サンプリングされなかったリクエストのオーバーヘッドはほぼゼロ
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.01"))
+
+# traceparent ヘッダーのsampledフラグに従うかどうか
+TRACE_PARENT_BASED = os.getenv("TRACE_PARENT_BASED", "true").lower() == "true"
+
+# /debug/traces 用に保持するスパン数
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+
+# OTLP（JSON）エクスポート先（どちらも未設定の場合はエクスポートしない）
+# 例: OTLP_TRACES_ENDPOINT=http://localhost:4318/v1/traces, OTLP_TRACES_FILE=logs/traces.jsonl
+OTLP_TRACES_ENDPOINT = os.getenv("OTLP_TRACES_ENDPOINT")
+OTLP_TRACES_FILE = os.getenv("OTLP_TRACES_FILE")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_EXPORT_BATCH_SIZE = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", "512"))
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv("TRACE_EXPORT_QUEUE_SIZE", "4096"))
+
+SERVICE_NAME = os.getenv("SERVICE_NAME", "news-api")
+
+logger = logging.getLogger(__name__)
+
+# OTLPのSpanKind
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Span:
+    """トレースを構成する1区間"""
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "error"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "internal"):
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {str(error)}"
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        _processor.on_end(self)
+
+    def traceparent(self) -> str:
+        """W3C traceparent 形式の文字列を返します"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _random_id(nbytes: int) -> str:
+    value = 0
+    while value == 0:  # 全て0のIDは無効
+        value = random.getrandbits(nbytes * 8)
+    return f"{value:0{nbytes * 2}x}"
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        result.append({"key": key, "value": encoded})
+    return result
+
+def parse_traceparent(value: Optional[str]):
+    """W3C traceparent ヘッダーを (trace_id, parent_id, sampled) に変換します（不正な場合はNone）"""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if not match:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+def should_sample(trace_id: str, parent_sampled: Optional[bool] = None) -> bool:
+    """サンプリングするかどうかを判定します
+
+    親（traceparent）がある場合はそのsampledフラグに従い、ない場合は
+    トレースIDの下位64ビットで判定します（同じトレースIDなら結果が一致する）。
+    """
+    if parent_sampled is not None and TRACE_PARENT_BASED:
+        return parent_sampled
+    if TRACE_SAMPLE_RATIO >= 1.0:
+        return True
+    if TRACE_SAMPLE_RATIO <= 0.0:
+        return False
+    return int(trace_id[16:], 16) < int(TRACE_SAMPLE_RATIO * (1 << 64))
+
+class OTLPExporter:
+    """スパンをOTLP/JSON形式でファイル・HTTPに送るエクスポーター
+
+    スパンはキューに溜めてバックグラウンドスレッドでまとめて送信します。
+    キューが溢れた場合はスパンを破棄します（リクエスト処理を遅らせない）。
+    """
+    def __init__(self, endpoint: Optional[str] = None, file_path: Optional[str] = None):
+        self.endpoint = endpoint
+        self.file_path = file_path
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def export(self, span: Span):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch, stopped = self._drain(block=True)
+            if batch:
+                self._send(batch)
+            if stopped:
+                return
+
+    def _drain(self, block: bool):
+        """キューからスパンを取り出します（停止要求を受け取った場合は stopped=True）"""
+        batch: List[Span] = []
+        deadline = time.monotonic() + TRACE_EXPORT_INTERVAL
+        while len(batch) < TRACE_EXPORT_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    span = self._queue.get(timeout=timeout)
+                else:
+                    span = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if span is None:
+                return batch, True
+            batch.append(span)
+        return batch, False
+
+    def flush(self, timeout: float = 10.0):
+        """キューに残っているスパンを送信してエクスポートを停止します（終了時用）"""
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)  # 停止要求
+                self._thread.join(timeout)
+            except queue.Full:
+                pass
+        while True:
+            batch, _ = self._drain(block=False)
+            if not batch:
+                return
+            self._send(batch)
+
+    def _payload(self, batch: List[Span]) -> bytes:
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in batch]
+                }]
+            }]
+        }
+        return json.dumps(request, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _send(self, batch: List[Span]):
+        payload = self._payload(batch)
+        try:
+            if self.file_path:
+                # 1行1リクエスト（OpenTelemetry Collectorの otlpjsonfile レシーバーで読める形式）
+                os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+                with open(self.file_path, "ab") as f:
+                    f.write(payload + b"\n")
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=payload,
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"トレースのエクスポートに失敗しました ({type(e).__name__}: {str(e)})")
+
+    def stats(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "file": self.file_path,
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+class SpanProcessor:
+    """終了したスパンをリングバッファとエクスポーターに渡します"""
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, exporter: Optional[OTLPExporter] = None):
+        self._buffer = deque(maxlen=buffer_size)
+        self.exporter = exporter
+
+    def on_end(self, span: Span):
+        self._buffer.append(span)  # deque.append はスレッドセーフ
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def clear(self):
+        self._buffer.clear()
+
+    def traces(self, limit: int = 20, trace_id: Optional[str] = None, min_duration_ms: float = 0.0) -> List[dict]:
+        """保持しているスパンをトレースごとにまとめて新しい順に返します"""
+        grouped: Dict[str, List[Span]] = {}
+        for span in list(self._buffer):
+            if trace_id is None or span.trace_id == trace_id:
+                grouped.setdefault(span.trace_id, []).append(span)
+
+        traces = []
+        for spans in grouped.values():
+            span_ids = {span.span_id for span in spans}
+            # 親がこのプロセス内にないスパンをルートとみなす
+            roots = [span for span in spans if span.parent_id not in span_ids] or spans
+            root = min(roots, key=lambda span: span.start_ns)
+            if root.duration_ms < min_duration_ms:
+                continue
+            traces.append({
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "start_time": root.start_ns / 1e9,
+                "duration_ms": round(root.duration_ms, 3),
+                "span_count": len(spans),
+                "error": any(span.error for span in spans),
+                "spans": [span.to_dict() for span in sorted(spans, key=lambda span: span.start_ns)]
+            })
+        traces.sort(key=lambda trace: trace["start_time"], reverse=True)
+        return traces[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": TRACING_ENABLED,
+            "sample_ratio": TRACE_SAMPLE_RATIO,
+            "parent_based": TRACE_PARENT_BASED,
+            "buffered_spans": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "exporter": self.exporter.stats() if self.exporter else None
+        }
+
+_processor = SpanProcessor(
+    exporter=OTLPExporter(OTLP_TRACES_ENDPOINT, OTLP_TRACES_FILE)
+    if OTLP_TRACES_ENDPOINT or OTLP_TRACES_FILE else None
+)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    """現在のスパンを返します（サンプリングされていないリクエストではNone）"""
+    return _current_span.get()
+
+def get_processor() -> SpanProcessor:
+    return _processor
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+    """現在のスパンの子スパンを開始します
+
+    サンプリングされたリクエストの中でのみ記録し、それ以外では何もしません（Noneを返す）。
+    contextvarで親子関係を保持するため、asyncio.gather のタスクやスレッドプールにも引き継がれます。
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    span = Span(name, parent.trace_id, parent.span_id, kind)
+    if attributes:
+        span.attributes.update(attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+def traced(name: Optional[str] = None):
+    """関数の呼び出しをスパンとして記録するデコレーター（同期・非同期関数の両方に対応）"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with start_span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(span_name):
+                return func(*args, **kwargs)
+        return sync_wrapper
+    return decorator
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class TracingMiddleware:
+    """リクエストごとにサーバースパンを開始するASGIミドルウェア
+
+    受信した traceparent ヘッダーを引き継ぎ、サンプリングされたリクエストには
+    traceresponse ヘッダー（W3C Trace Context Level 2）でトレースIDを返します。
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(_header(scope, b"traceparent"))
+        if parent:
+            trace_id, parent_id, parent_sampled = parent
+        else:
+            trace_id, parent_id, parent_sampled = _random_id(16), None, None
+
+        if not should_sample(trace_id, parent_sampled):
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(f"{scope['method']} {scope['path']}", trace_id, parent_id, "server")
+        span.set_attribute("http.method", scope["method"])
+        span.set_attribute("http.target", scope["path"])
+        token = _current_span.set(span)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.error = f"HTTP {message['status']}"
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"traceresponse", span.traceparent().encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            route = scope.get("route")
+            if getattr(route, "path", None):
+                # IDごとに名前が分かれないようにルートのパステンプレートを使う
+                span.name = f"{scope['method']} {route.path}"
+                span.set_attribute("http.route", route.path)
+            _current_span.reset(token)
+            span.end()
+
+def shutdown():
+    """エクスポート待ちのスパンを送信します（アプリ終了時に呼び出す）"""
+    if _processor.exporter is not None:
+        _processor.exporter.flush()
@@ -0,0 +1,193 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import asyncio
+import math
+import os
+import time
+import uuid
+import redis
+from .metrics import track_backend
+
+# トレンドスコアの半減期（時間）
+HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+
+# Meilisearchへの書き戻し間隔（秒）と1回の部分更新の最大件数
+FLUSH_INTERVAL = float(os.getenv("TRENDING_FLUSH_INTERVAL", "60"))
+FLUSH_BATCH_SIZE = int(os.getenv("TRENDING_FLUSH_BATCH_SIZE", "1000"))
+
+# 閲覧数・訪問者数のカウンターの有効期限（日）。閲覧のたびに延長し、閲覧されなくなった記事のキーは消える
+# （存在しない記事IDへの閲覧で作られたキーも残らない。書き戻し時に存在しない記事のキーは削除する）
+COUNTER_TTL = int(float(os.getenv("TRENDING_COUNTER_TTL_DAYS", "30")) * 86400)
+
+# スコアの基準時刻（値を小さく保つため）
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+_DECAY_RATE = math.log(2) / (HALF_LIFE_HOURS * 3600)
+
+# Redisキー
+_PENDING_KEY = "trending:pending"
+_FLUSHING_KEY = "trending:flushing"
+_SCORES_KEY = "trending:scores"
+_LOCK_KEY = "trending:flush_lock"
+
+# ロックの値が自分のトークンと一致する場合のみ削除する（期限切れ後に他のワーカーが取得したロックを消さない）
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+def _views_key(article_id) -> str:
+    return f"trending:views:{article_id}"
+
+def _visitors_key(article_id) -> str:
+    return f"trending:uv:{article_id}"
+
+def _log_add(a: float, b: float) -> float:
+    """log(exp(a) + exp(b)) をオーバーフローせずに計算します"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+def decayed_score(previous: Optional[float], views: int, now: float) -> float:
+    """閲覧数を時間減衰付きスコアに加算します
+
+    スコアは log(Σ exp(λ·t_i)) の形で保持します。各閲覧の重みを基準時刻から
+    増加させることで、全記事を定期的に減衰し直さなくても順位は常に
+    「半減期で減衰させた閲覧数」の順と一致します。
+    """
+    added = math.log(views) + _DECAY_RATE * (now - _EPOCH)
+    return added if previous is None else _log_add(previous, added)
+
+class TrendingService:
+    """閲覧数カウンターとトレンドスコアの管理サービス
+
+    閲覧ごとの書き込みはRedisのみで行い、Meilisearchへは flush() で
+    まとめて部分更新します。
+    """
+    def __init__(self):
+        try:
+            self.redis = redis.Redis(
+                host=os.getenv('REDIS_HOST', 'localhost'),
+                port=int(os.getenv('REDIS_PORT', 6379)),
+                db=0,
+                decode_responses=True
+            )
+            self._release_lock = self.redis.register_script(_RELEASE_LOCK_SCRIPT)
+            self.available = True
+        except Exception as e:
+            print(f"Redis: 接続失敗 ({type(e).__name__})")
+            self.available = False
+
+    def record_view(self, article_id: int, visitor_id: str) -> bool:
+        """閲覧を記録します（1回のラウンドトリップ）"""
+        if not self.available:
+            return False
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(_views_key(article_id))
+            pipe.expire(_views_key(article_id), COUNTER_TTL)
+            pipe.pfadd(_visitors_key(article_id), visitor_id)
+            pipe.expire(_visitors_key(article_id), COUNTER_TTL)
+            pipe.hincrby(_PENDING_KEY, str(article_id), 1)
+            with track_backend("redis", "record_view"):
+                pipe.execute()
+            return True
+        except Exception as e:
+            print(f"閲覧記録: 失敗 ({type(e).__name__})")
+            return False
+
+    def _take_pending(self) -> Dict[int, int]:
+        """前回の書き戻し以降の閲覧数を取り出します"""
+        # 前回失敗して残っている分があれば先に処理する
+        if not self.redis.exists(_FLUSHING_KEY):
+            try:
+                self.redis.rename(_PENDING_KEY, _FLUSHING_KEY)
+            except redis.ResponseError:
+                return {}  # 閲覧なし
+        return {int(k): int(v) for k, v in self.redis.hgetall(_FLUSHING_KEY).items()}
+
+    def flush(self) -> int:
+        """トレンドスコアを計算し、Meilisearchへまとめて部分更新します"""
+        if not self.available:
+            return 0
+
+        # 複数ワーカーで同時に書き戻さないようにロックを取る
+        lock_ttl = max(int(FLUSH_INTERVAL * 2), 30)
+        token = uuid.uuid4().hex
+        if not self.redis.set(_LOCK_KEY, token, nx=True, ex=lock_ttl):
+            return 0
+
+        try:
+            pending = self._take_pending()
+            if not pending:
+                return 0
+
+            from . import search  # 循環インポートを避けるため関数内でインポート
+
+            now = time.time()
+            ids = list(pending)
+            flushed = 0
+            for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+                batch_ids = ids[start:start + FLUSH_BATCH_SIZE]
+                # 削除済みの記事を部分更新で作り直さないよう、存在する記事のみ対象にする
+                existing = search.filter_existing_ids(batch_ids)
+
+                pipe = self.redis.pipeline(transaction=False)
+                for article_id in batch_ids:
+                    pipe.hget(_SCORES_KEY, str(article_id))
+                    pipe.get(_views_key(article_id))
+                    pipe.pfcount(_visitors_key(article_id))
+                with track_backend("redis", "read_counters"):
+                    values = pipe.execute()
+
+                documents = []
+                scores = {}
+                missing = []
+                for i, article_id in enumerate(batch_ids):
+                    if article_id not in existing:
+                        missing.append(article_id)
+                        continue
+                    previous, views, visitors = values[i * 3:i * 3 + 3]
+                    score = decayed_score(
+                        float(previous) if previous is not None else None,
+                        pending[article_id],
+                        now
+                    )
+                    scores[str(article_id)] = score
+                    documents.append({
+                        "id": article_id,
+                        "trending_score": score,
+                        "view_count": int(views or 0),
+                        "unique_visitors": int(visitors or 0)
+                    })
+
+                if documents:
+                    search.update_popularity(documents)
+                    self.redis.hset(_SCORES_KEY, mapping=scores)
+                if missing:
+                    # 存在しない記事（削除済み・不正なID）のカウンターは残さない
+                    keys = [key for article_id in missing for key in (_views_key(article_id), _visitors_key(article_id))]
+                    self.redis.delete(*keys)
+                    self.redis.hdel(_SCORES_KEY, *missing)
+                # 反映済みの分は途中で失敗しても二重に加算しないよう取り除く
+                self.redis.hdel(_FLUSHING_KEY, *batch_ids)
+                flushed += len(documents)
+
+            self.redis.delete(_FLUSHING_KEY)
+            print(f"トレンドスコア書き戻し: {flushed}件")
+            return flushed
+        finally:
+            self._release_lock(keys=[_LOCK_KEY], args=[token])
+
+    async def run_flusher(self, interval: float = FLUSH_INTERVAL):
+        """定期的に flush() を実行するバックグラウンドジョブ"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"トレンドスコア書き戻し: 失敗 ({type(e).__name__}: {str(e)})")
+
+# シングルトンインスタンス
+trending_service = TrendingService()
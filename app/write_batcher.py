@@ -0,0 +1,73 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+import threading
+
+class WriteCoalescer:
+    """Meilisearchへのドキュメント書き込みをまとめて1つのタスクにするバッファ
+
+    submit() されたドキュメントを window 秒間（または max_docs 件に達するまで）
+    溜めてから flush_fn にまとめて渡します。各呼び出し元はバッチのタスクが
+    処理されるまで待ち、そのタスクUIDを受け取ります。
+    """
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict[str, Any]]], int],
+        window: float = 0.02,
+        max_docs: int = 100
+    ):
+        self.flush_fn = flush_fn
+        self.window = window
+        self.max_docs = max_docs
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._timer: Optional[threading.Timer] = None
+        self.batches = 0
+        self.documents = 0
+
+    def submit(self, document: Dict[str, Any], timeout: Optional[float] = None) -> int:
+        """ドキュメントを書き込みキューに追加し、反映されたタスクUIDを返します"""
+        future: Future = Future()
+        flush_now = False
+        with self._lock:
+            self._pending.append((document, future))
+            if len(self._pending) >= self.max_docs:
+                flush_now = True
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+        return future.result(timeout=timeout)
+
+    def flush(self):
+        """溜まっているドキュメントを1つのタスクとして書き込みます"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return
+
+        try:
+            task_uid = self.flush_fn([document for document, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.documents += len(batch)
+        for _, future in batch:
+            future.set_result(task_uid)
+
+    def stats(self) -> dict:
+        """バッチ数・平均バッチサイズなどの統計情報を返します"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_docs": self.max_docs,
+            "batches": self.batches,
+            "documents": self.documents,
+            "avg_batch_size": self.documents / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,18 @@
+import os
+import sys
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import search
+
+def main():
+    """既存記事に日付ヒストグラム用のバケット（created_day等）を付与します"""
+    print("インデックス設定を更新しています...")
+    search.setup_index()
+    print("既存記事のバケットを更新しています...")
+    updated = search.backfill_time_buckets()
+    print(f"{updated}件の記事を更新しました")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+リクエストログ用ミドルウェアのオーバーヘッドを計測するスクリプト
+
+@app.middleware("http")（BaseHTTPMiddleware）で実装していた以前の log_requests と、
+ASGIミドルウェアとして実装した AccessLogMiddleware を、同じ最小構成のアプリで比較します。
+HTTPサーバーは介さず、ASGIアプリを直接呼び出して1リクエストあたりの時間を計測します。
+
+使い方:
+    python scripts/benchmark_middleware.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from app import access_log, timing
+from app.middleware import AccessLogMiddleware
+
+async def _endpoint(request: Request):
+    if request.method == "POST":
+        await request.body()
+    return JSONResponse({"status": "ok"})
+
+async def _legacy_log_requests(request: Request, call_next):
+    """以前の main.log_requests と同じ処理"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = access_log.request_id_var.set(request_id)
+    start = time.perf_counter()
+    body = await request.body() if access_log.wants_body(request.method) else None
+    status_code = 500
+    response_bytes = None
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response_bytes = response.headers.get("content-length")
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        with timing.span("log"):
+            route = request.scope.get("route")
+            access_log.log_access(
+                method=request.method,
+                path=request.url.path,
+                route=getattr(route, "path", None),
+                status=status_code,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                request_id=request_id,
+                client=request.client.host if request.client else None,
+                request_bytes=int(request.headers["content-length"]) if request.headers.get("content-length", "").isdigit() else None,
+                response_bytes=int(response_bytes) if response_bytes and response_bytes.isdigit() else None,
+                content_type=request.headers.get("content-type"),
+                body=body
+            )
+        access_log.request_id_var.reset(token)
+
+def _build_app(middleware):
+    routes = [Route("/api/v1/news", _endpoint, methods=["GET", "POST"])]
+    return Starlette(routes=routes, middleware=middleware)
+
+async def _run(app, method: str, body: bytes, requests: int) -> float:
+    """requests回呼び出して1リクエストあたりの時間（マイクロ秒）を返します"""
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": "/api/v1/news",
+        "raw_path": b"/api/v1/news",
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000)
+    }
+
+    async def send(message):
+        pass
+
+    def make_receive():
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.sleep(3600)  # 切断されるまで待つ（BaseHTTPMiddlewareが監視する）
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return receive
+
+    # ウォームアップ
+    for _ in range(min(1000, requests)):
+        await app(dict(scope), make_receive(), send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+async def _benchmark(requests: int, body_size: int):
+    apps = {
+        "なし": _build_app([]),
+        "BaseHTTPMiddleware（以前）": _build_app([Middleware(BaseHTTPMiddleware, dispatch=_legacy_log_requests)]),
+        "AccessLogMiddleware（ASGI）": _build_app([Middleware(AccessLogMiddleware)])
+    }
+    body = b'{"text": "' + b"x" * body_size + b'"}'
+    for method, payload in (("GET", b""), ("POST", body)):
+        print(f"{method}（ボディ {len(payload)} bytes、{requests} リクエスト）")
+        baseline = None
+        for name, app in apps.items():
+            elapsed = await _run(app, method, payload, requests)
+            if baseline is None:
+                baseline = elapsed
+                print(f"  {name:<28} {elapsed:8.1f} µs/req")
+            else:
+                print(f"  {name:<28} {elapsed:8.1f} µs/req（オーバーヘッド {elapsed - baseline:+.1f} µs）")
+
+def main():
+    parser = argparse.ArgumentParser(description="リクエストログ用ミドルウェアのオーバーヘッドを計測します")
+    parser.add_argument("--requests", type=int, default=20000, help="計測するリクエスト数")
+    parser.add_argument("--body-size", type=int, default=1024, help="POSTリクエストのボディのサイズ（バイト）")
+    parser.add_argument("--with-log", action="store_true", help="アクセスログの出力も含めて計測する（デフォルトは出力しない）")
+    args = parser.parse_args()
+
+    if not args.with_log:
+        # ミドルウェア自体のオーバーヘッドを比べるため、ログの書き込みは除外する
+        access_log.access_logger.disabled = True
+    asyncio.run(_benchmark(args.requests, args.body_size))
+
+if __name__ == "__main__":
+    main()
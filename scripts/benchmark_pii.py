@@ -0,0 +1,91 @@
+"""
+ログ用の個人情報マスク処理の速度を計測するスクリプト
+
+以前の mask_personal_info（json.loads/json.dumps と正規表現3回）と、
+app.pii.PIIMasker を、お問い合わせフォーム・記事のペイロードで比較します。
+
+使い方:
+    python scripts/benchmark_pii.py --number 20000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.pii import pii_masker
+
+def legacy_mask_personal_info(data_str: str) -> str:
+    """以前の main.mask_personal_info と同じ処理"""
+    try:
+        data = json.loads(data_str)
+        sensitive_fields = ['email', 'phone', 'name', 'company']
+
+        def mask_value(value):
+            if isinstance(value, str) and len(value) > 0:
+                return '*' * len(value)
+            return value
+
+        if isinstance(data, dict):
+            for field, value in data.items():
+                if value and isinstance(value, str):
+                    if field in sensitive_fields or '@' in value:
+                        data[field] = mask_value(value)
+
+        return json.dumps(data, ensure_ascii=False)
+    except (json.JSONDecodeError, Exception):
+        def mask_email(match):
+            return '*' * len(match.group(0))
+
+        data_str = re.sub(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', mask_email, data_str)
+
+        def mask_phone(match):
+            return '*' * len(match.group(0))
+
+        data_str = re.sub(r'\d{2,3}-\d{4}-\d{4}', mask_phone, data_str)
+        data_str = re.sub(r'\d{3}-\d{4}-\d{4}', mask_phone, data_str)
+        return data_str
+
+PAYLOADS = {
+    "お問い合わせ": json.dumps({
+        "name": "山田太郎",
+        "email": "taro.yamada@example.com",
+        "phone": "090-1234-5678",
+        "company": "株式会社テスト",
+        "subject": "サービスについてのお問い合わせ",
+        "message": "お世話になっております。御社のサービスについて詳しく伺いたく、ご連絡いたしました。" * 3
+    }, ensure_ascii=False),
+    "記事": json.dumps({
+        "title": "新製品の発表について",
+        "content": "本日、新製品を発表いたしました。詳細は担当者までお問い合わせください。" * 20,
+        "category": "press",
+        "tags": ["新製品", "発表", "プレスリリース"],
+        "is_published": True,
+        "author": {"name": "広報部", "email": "pr@example.com"}
+    }, ensure_ascii=False),
+    "JSON以外": "name=山田太郎&email=taro.yamada@example.com&phone=090-1234-5678&message=" + "本文" * 100
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="個人情報マスク処理の速度を計測します")
+    parser.add_argument("--number", type=int, default=20000, help="1回の計測で実行する回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数（最速の結果を使用）")
+    args = parser.parse_args()
+
+    for name, payload in PAYLOADS.items():
+        results = {}
+        for label, func in (("以前", legacy_mask_personal_info), ("PIIMasker", pii_masker.mask_text)):
+            best = min(timeit.repeat(lambda: func(payload), number=args.number, repeat=args.repeat))
+            results[label] = best / args.number * 1_000_000
+        speedup = results["以前"] / results["PIIMasker"]
+        print(
+            f"{name}（{len(payload.encode())} bytes）: "
+            f"以前 {results['以前']:.2f} µs / PIIMasker {results['PIIMasker']:.2f} µs（{speedup:.1f}倍）"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+関連記事インデックスの再構築（RelatedIndex.rebuild）の速度を計測するスクリプト
+
+転置インデックスで1記事ずつ近傍を計算する場合と、NumPy・SciPyの疎行列の積で
+まとめて計算する場合を、ランダムに生成した記事で比較します。
+
+使い方:
+    python scripts/benchmark_related.py --articles 5000 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import related
+from app.related import RelatedIndex
+
+def generate_articles(count: int, vocabulary: int, seed: int = 0):
+    """語彙数 vocabulary の単語・タグからランダムな記事を生成します"""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(vocabulary)]
+    # 実際の記事に近づけるため、単語の出現頻度に偏りを付ける
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    return [
+        {
+            "id": i,
+            "title": " ".join(rng.choices(words, weights, k=8)),
+            "content": " ".join(rng.choices(words, weights, k=200)),
+            "tags": rng.sample(words[:200], 3),
+            "category": rng.choice(["technology", "business", "sports", "entertainment"]),
+            "published": True
+        }
+        for i in range(1, count + 1)
+    ]
+
+def measure(articles, vectorized: bool) -> float:
+    related.SCIPY_AVAILABLE = vectorized
+    index = RelatedIndex()
+    start = time.perf_counter()
+    index.rebuild(articles)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="関連記事インデックスの再構築の速度を計測します")
+    parser.add_argument("--articles", type=int, nargs="+", default=[1000, 5000, 20000], help="記事数")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="語彙数")
+    args = parser.parse_args()
+
+    scipy_available = related.SCIPY_AVAILABLE
+    for count in args.articles:
+        articles = generate_articles(count, args.vocabulary)
+        python_time = measure(articles, vectorized=False)
+        print(f"{count:>6}件  転置インデックス: {python_time:8.2f}秒", end="")
+        if scipy_available:
+            sparse_time = measure(articles, vectorized=True)
+            print(f"  疎行列の積: {sparse_time:8.2f}秒  ({python_time / sparse_time:.1f}倍)")
+        else:
+            print("  （NumPy・SciPyが未インストールのため疎行列の積は計測しません）")
+
+if __name__ == "__main__":
+    main()
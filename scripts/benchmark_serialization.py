@@ -0,0 +1,75 @@
+"""
+一覧・検索レスポンスのシリアライズのCPU時間を計測するスクリプト
+
+response_model（SearchResponse）で記事ごとに検証・変換してからJSONにする従来の処理と、
+検証を省略してそのままJSONにする FastJSONResponse を比較します。
+
+使い方:
+    python scripts/benchmark_serialization.py --items 100
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app import schemas
+from app.fast_json import FastJSONResponse, ORJSON_AVAILABLE
+
+def make_page(items: int) -> dict:
+    """Meilisearchから返る形の記事一覧（1ページ分）を作ります"""
+    now = datetime.now(timezone.utc)
+    hits = []
+    for i in range(items):
+        created_at = (now - timedelta(hours=i)).isoformat()
+        hits.append({
+            "id": i + 1,
+            "title": f"サンプル記事 {i + 1}",
+            "content": "本日、新しいサービスを開始しました。詳細は以下のとおりです。" * 10,
+            "category": "news",
+            "author": "編集部",
+            "tags": ["お知らせ", "サービス"],
+            "published": True,
+            "thumbnail_url": f"https://example.com/thumbnails/{i + 1}.webp",
+            "thumbnail_alt": "サムネイル",
+            "created_at": created_at,
+            "updated_at": created_at
+        })
+    return {"items": hits, "total": items * 10, "limit": items, "offset": 0}
+
+def main():
+    parser = argparse.ArgumentParser(description="一覧・検索レスポンスのシリアライズ時間を計測します")
+    parser.add_argument("--items", type=int, default=100, help="1ページの記事数")
+    parser.add_argument("--number", type=int, default=200, help="1回の計測で実行する回数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測の繰り返し回数（最速の結果を使用）")
+    args = parser.parse_args()
+
+    page = make_page(args.items)
+    adapter = TypeAdapter(schemas.SearchResponse)
+
+    def with_response_model() -> bytes:
+        # FastAPIの response_model と同じく、検証してからJSON用に変換してエンコードする
+        value = adapter.validate_python(page)
+        return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+    def fast() -> bytes:
+        return FastJSONResponse(page).body
+
+    results = {}
+    for label, func in (("response_model", with_response_model), ("FastJSONResponse", fast)):
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        results[label] = best / args.number * 1000
+
+    encoder = "orjson" if ORJSON_AVAILABLE else "json"
+    print(f"記事 {args.items} 件/ページ（エンコーダー: {encoder}、{len(fast())} bytes）")
+    for label, elapsed in results.items():
+        print(f"  {label:<18} {elapsed:8.3f} ms/ページ")
+    print(f"  CPU時間の削減: {(1 - results['FastJSONResponse'] / results['response_model']) * 100:.0f}%")
+
+if __name__ == "__main__":
+    main()
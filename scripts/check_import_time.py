@@ -0,0 +1,75 @@
+"""
+アプリケーションの読み込み時間（コールドスタート）を計測し、予算を超えていないか確認するスクリプト
+
+`python -X importtime` で app.main を読み込んだときの時間を計測します。
+読み込み時には外部サービスへの接続を行わないため、Meilisearch・S3などが起動していなくても計測できます。
+予算（IMPORT_TIME_BUDGET_MS）を超えた場合は終了コード1で終了するので、CIでも使えます。
+
+使い方:
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget-ms 1500 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# app.main の読み込み時間の予算（ミリ秒）
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """モジュールを新しいプロセスで読み込み、(モジュール名, 自身の時間, 累積時間)（マイクロ秒）を返します"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"{module} の読み込みに失敗しました")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        # 形式: "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        timings.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="app.main の読み込み時間を計測します")
+    parser.add_argument("--module", default="app.main", help="計測するモジュール")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="読み込み時間の予算（ミリ秒）")
+    parser.add_argument("--top", type=int, default=10, help="表示する時間のかかったモジュールの数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数（最速の結果を使用）")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.repeat):
+        timings = measure(args.module)
+        total = next((cumulative for name, _, cumulative in timings if name == args.module), None)
+        if total is None:
+            raise SystemExit(f"{args.module} の読み込み時間を取得できませんでした")
+        if best is None or total < best[0]:
+            best = (total, timings)
+
+    total, timings = best
+    total_ms = total / 1000
+    print(f"{args.module} の読み込み時間: {total_ms:.0f}ms（予算 {args.budget_ms:.0f}ms）")
+    print(f"時間のかかったモジュール（自身の読み込み時間、上位{args.top}件）:")
+    for name, self_time, cumulative in sorted(timings, key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_time / 1000:8.1f}ms（累積 {cumulative / 1000:8.1f}ms）  {name}")
+
+    if total_ms > args.budget_ms:
+        print("読み込み時間が予算を超えています")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
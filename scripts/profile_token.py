@@ -0,0 +1,28 @@
+"""
+リクエスト単位のプロファイラー用の X-Profile ヘッダーを生成するスクリプト
+
+使い方:
+    PROFILE_SECRET=... python scripts/profile_token.py /api/v1/news/search --mode sample --output inline
+    curl -H "X-Profile: <出力された値>" "http://localhost:8000/api/v1/news/search?q=..."
+"""
+import argparse
+import os
+import sys
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.profiling import sign_profile_request, PROFILE_MODES, PROFILE_OUTPUTS
+
+def main():
+    parser = argparse.ArgumentParser(description="X-Profile ヘッダーの値を生成します")
+    parser.add_argument("path", help="プロファイルするリクエストのパス（クエリ文字列は含めない）")
+    parser.add_argument("--mode", choices=PROFILE_MODES, default="cprofile", help="cprofile: 決定的プロファイラー / sample: サンプリング")
+    parser.add_argument("--output", choices=PROFILE_OUTPUTS, default="file", help="file: logs/profiles に保存 / inline: レスポンスとして返す")
+    parser.add_argument("--ttl", type=int, default=300, help="有効期間（秒）")
+    args = parser.parse_args()
+
+    print(sign_profile_request(args.path, mode=args.mode, output=args.output, ttl=args.ttl))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import logging
+import pytest
+from app import access_log
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(access_log.JSONFormatter())
+        self.lines = []
+    
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+@pytest.fixture
+def access_lines():
+    handler = _ListHandler()
+    access_log.access_logger.addHandler(handler)
+    yield handler.lines
+    access_log.access_logger.removeHandler(handler)
+
+def _log(status=200, latency_ms=10.0, body=None):
+    access_log.log_access(
+        method="POST",
+        path="/api/v1/contact",
+        route="/api/v1/contact",
+        status=status,
+        latency_ms=latency_ms,
+        request_id="req-1",
+        content_type="application/json",
+        body=body
+    )
+
+def test_access_log_fields(access_lines):
+    """アクセスログがJSONで出力されることのテスト"""
+    _log(body=b'{"email": "user@example.com"}')
+    entry = access_lines[0]
+    assert entry["request_id"] == "req-1"
+    assert entry["route"] == "/api/v1/contact"
+    assert entry["status"] == 200
+    # ACCESS_LOG_BODY=error の場合、正常なリクエストのボディは出力しない
+    assert "body" not in entry
+
+def test_access_log_body_only_on_error(access_lines):
+    """エラー時のみボディ（マスク済み）を出力することのテスト"""
+    _log(status=422, body='{"email": "user@example.com", "subject": "件名"}'.encode())
+    body = access_lines[0]["body"]
+    assert "user@example.com" not in body
+    assert "件名" in body
+
+def test_access_log_sampling(monkeypatch, access_lines):
+    """サンプリング時もエラー・遅いリクエストは必ず出力されることのテスト"""
+    monkeypatch.setattr(access_log, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    _log(status=200)
+    _log(status=500)
+    _log(status=200, latency_ms=access_log.ACCESS_LOG_SLOW_MS + 1)
+    assert [entry["status"] for entry in access_lines] == [500, 200]
+
+def test_describe_body_truncates_large_bodies(monkeypatch):
+    """大きなボディは切り詰めて出力することのテスト"""
+    monkeypatch.setattr(access_log, "ACCESS_LOG_MAX_BODY", 10)
+    described = access_log.describe_body("あいうえおかきくけこ".encode(), "text/plain")
+    assert described.startswith("あいう")
+    assert described.endswith("[truncated 30 bytes]")
+    assert access_log.describe_body(b"\x00" * 5, "application/octet-stream") == "[binary data - 5 bytes]"
@@ -0,0 +1,47 @@
+import importlib
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from app import admin_auth
+
+def _client():
+    router = APIRouter(dependencies=[Depends(admin_auth.require_admin_token)])
+
+    @router.get("/status")
+    def status():
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/admin")
+    return TestClient(app)
+
+def test_requires_admin_token(monkeypatch):
+    """ADMIN_TOKEN が設定されている場合はトークンが一致するリクエストのみ許可することのテスト"""
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "secret")
+    client = _client()
+    assert client.get("/admin/status").status_code == 401
+    assert client.get("/admin/status", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.get("/admin/status", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+def test_disabled_without_token_outside_development(monkeypatch):
+    """ADMIN_TOKEN が未設定の場合、開発環境以外では利用できないことのテスト"""
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", None)
+    monkeypatch.setattr(admin_auth, "_IS_LOCAL", False)
+    assert _client().get("/admin/status").status_code == 403
+    monkeypatch.setattr(admin_auth, "_IS_LOCAL", True)
+    assert _client().get("/admin/status").status_code == 200
+
+def test_fails_closed_when_environment_is_unset(monkeypatch):
+    """ADMIN_TOKEN・ENVIRONMENT のどちらも未設定の場合は利用できないことのテスト"""
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    monkeypatch.delenv("ENVIRONMENT", raising=False)
+    try:
+        importlib.reload(admin_auth)
+        assert admin_auth._IS_LOCAL is False
+        assert _client().get("/admin/status").status_code == 403
+
+        monkeypatch.setenv("ENVIRONMENT", "development")
+        importlib.reload(admin_auth)
+        assert _client().get("/admin/status").status_code == 200
+    finally:
+        monkeypatch.undo()
+        importlib.reload(admin_auth)
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from app.admission import AdaptiveLimiter, AdmissionControlMiddleware, AdmissionController, Rejected, classify
+
+def test_classify_routes():
+    """ルートの種類の判定のテスト"""
+    assert classify("GET", "/api/v1/news/search") == "reads"
+    assert classify("POST", "/api/v1/news") == "writes"
+    assert classify("POST", "/api/v1/news/thumbnails/s3") == "uploads"
+    assert classify("POST", "/api/v1/contact") == "contact"
+    assert classify("GET", "/readyz") is None
+
+def test_queue_and_rejection():
+    """上限に達した場合の待ち行列・待ち行列が一杯の場合の拒否のテスト"""
+    async def run():
+        limiter = AdaptiveLimiter("reads", max_limit=1, target_latency=0.1, queue_size=1, max_wait=0.5)
+        await limiter.acquire()
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["queued"] == 1
+        with pytest.raises(Rejected) as excinfo:
+            await limiter.acquire()
+        assert excinfo.value.reason == "queue_full"
+        assert excinfo.value.retry_after >= 1
+
+        # 実行中のリクエストが終わると待っていたリクエストに枠が割り当てられる
+        limiter.release(0.01)
+        await waiting
+        assert limiter.inflight == 1
+        limiter.release(0.01)
+        assert limiter.inflight == 0
+
+        # 待ち時間の見込みが期限を超える場合は待たずに拒否する
+        slow = AdaptiveLimiter("writes", max_limit=1, target_latency=2, queue_size=10, max_wait=0.5)
+        await slow.acquire()
+        with pytest.raises(Rejected) as excinfo:
+            await slow.acquire()
+        assert excinfo.value.reason == "deadline"
+
+    asyncio.run(run())
+
+def test_adaptive_limit():
+    """レイテンシに応じた上限の調整（AIMD）のテスト"""
+    async def run():
+        limiter = AdaptiveLimiter("reads", max_limit=10, target_latency=0.1, min_limit=2)
+        await limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.snapshot()["limit"] == 9
+        # 目標レイテンシの間に減らすのは1回まで
+        await limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.snapshot()["limit"] == 9
+
+        # 上限まで使われていて目標レイテンシ以内なら増やす
+        for _ in range(9):
+            await limiter.acquire()
+        before = limiter.limit
+        limiter.release(0.01)
+        assert limiter.limit > before
+
+    asyncio.run(run())
+
+def test_middleware_sheds_load():
+    """過負荷時に503とRetry-Afterを返すことのテスト"""
+    controller = AdmissionController(limits={"reads": 1}, targets_ms={"reads": 100})
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = AdmissionControlMiddleware(app, controller)
+    controller.limiters["reads"].queue_size = 0
+
+    async def call(path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+        await middleware(scope, None, send)
+        return messages
+
+    async def run():
+        first = asyncio.ensure_future(call("/api/v1/news"))
+        await asyncio.sleep(0)
+        rejected = await call("/api/v1/news/search")
+        assert rejected[0]["status"] == 503
+        assert (b"retry-after", b"1") in rejected[0]["headers"]
+
+        # 制限しないルートはそのまま処理する
+        release.set()
+        assert (await call("/healthz"))[0]["status"] == 200
+        assert (await first)[0]["status"] == 200
+
+    asyncio.run(run())
@@ -2,6 +2,8 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app import search
+from app.trending import trending_service
+from app import metrics, timing, tracing
 import io
 from pathlib import Path
 import uuid
@@ -438,6 +440,342 @@ def test_facet_counts(client):
     data = response.json()
     assert data["total_articles"] == 2
 
+def test_date_histogram(client, monkeypatch):
+    """日付ヒストグラムのテスト"""
+    articles = [
+        {"title": "ヒストグラム記事1", "content": "本文1", "category": "technology", "tags": ["AI"], "published": True},
+        {"title": "ヒストグラム記事2", "content": "本文2", "category": "technology", "tags": ["Python"], "published": False},
+        {"title": "ヒストグラム記事3", "content": "本文3", "category": "business", "tags": ["AI"], "published": True}
+    ]
+    for article in articles:
+        client.post("/api/v1/news", json=article)
+    
+    # 日単位（全記事が同じ日に作成される）
+    response = client.get("/api/v1/news/facets/histogram?interval=day")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["interval"] == "day"
+    assert data["total"] == 3
+    assert len(data["buckets"]) == 1
+    assert data["buckets"][0]["count"] == 3
+    
+    # 月単位＋フィルター
+    response = client.get("/api/v1/news/facets/histogram?interval=month&category=technology")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert len(data["buckets"][0]["key"]) == 7  # YYYY-MM
+    
+    # 書き込み後はキャッシュが無効化される
+    client.post("/api/v1/news", json={"title": "追加記事", "content": "本文", "tags": ["AI"]})
+    response = client.get("/api/v1/news/facets/histogram?interval=week&tags=AI")
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+    
+    # 範囲外の期間
+    response = client.get("/api/v1/news/facets/histogram?interval=day&start=2000-01-01&end=2000-01-31")
+    assert response.status_code == 200
+    assert response.json()["total"] == 0
+    
+    # 極端に広い期間は記事の存在する範囲に絞って集計される
+    response = client.get("/api/v1/news/facets/histogram?interval=day&start=0001-01-01&end=9999-12-31")
+    assert response.status_code == 200
+    assert response.json()["total"] == 4
+    
+    # バケット数の上限を超える期間
+    monkeypatch.setattr(search, "HISTOGRAM_MAX_BUCKETS", 0)
+    response = client.get("/api/v1/news/facets/histogram?interval=week&start=0001-01-01&end=9999-12-31")
+    assert response.status_code == 400
+    
+    # 不正なパラメータ
+    response = client.get("/api/v1/news/facets/histogram?interval=year")
+    assert response.status_code == 422
+    response = client.get("/api/v1/news/facets/histogram?start=2024-02-01&end=2024-01-01")
+    assert response.status_code == 400
+
+def test_tag_facet_search(client):
+    """タグのファセット検索のテスト"""
+    articles = [
+        {"title": "記事1", "content": "本文", "tags": ["Python", "Pandas"], "published": True},
+        {"title": "記事2", "content": "本文", "tags": ["Python", "PyTorch"], "published": True},
+        {"title": "記事3", "content": "本文", "tags": ["Java"], "published": False}
+    ]
+    for article in articles:
+        client.post("/api/v1/news", json=article)
+    
+    response = client.get("/api/v1/news/facets/tags?prefix=Py")
+    assert response.status_code == 200
+    data = response.json()
+    values = [item["value"] for item in data["items"]]
+    assert values[0] == "Python"  # 件数順
+    assert set(values) == {"Python", "PyTorch"}
+    assert data["exhaustive"] is True
+    
+    # ページング
+    response = client.get("/api/v1/news/facets/tags?limit=1&offset=1")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert len(data["items"]) == 1
+    
+    # フィルター付き
+    response = client.get("/api/v1/news/facets/tags?published=false")
+    assert response.status_code == 200
+    assert [item["value"] for item in response.json()["items"]] == ["Java"]
+    
+    # 不正な件数
+    response = client.get("/api/v1/news/facets/tags?limit=0")
+    assert response.status_code == 422
+
+def test_suggest(client):
+    """サジェストのテスト"""
+    articles = [
+        {"title": "Python入門 機械学習の基礎", "content": "本文", "category": "technology", "author": "山田太郎", "tags": ["Python", "機械学習"], "published": True},
+        {"title": "Pythonで始めるデータ分析", "content": "本文", "category": "technology", "tags": ["Python"], "published": True},
+        {"title": "Python下書き", "content": "本文", "tags": ["PyDraft"], "published": False}
+    ]
+    created = [client.post("/api/v1/news", json=article).json() for article in articles]
+    
+    response = client.get("/api/v1/news/suggest?q=py")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["query"] == "py"
+    # 記事数の多いタグが先頭、下書きは含まれない
+    assert data["items"][0] == {"text": "Python", "type": "tag", "count": 2}
+    texts = [item["text"] for item in data["items"]]
+    assert "Python下書き" not in texts
+    assert "PyDraft" not in texts
+    
+    # タイトル中の単語からの前方一致・種類の絞り込み
+    response = client.get("/api/v1/news/suggest?q=機械&types=title")
+    assert [item["text"] for item in response.json()["items"]] == ["Python入門 機械学習の基礎"]
+    
+    # 更新・削除が反映される
+    client.put(f"/api/v1/news/{created[1]['id']}", json={"tags": ["Pandas"]})
+    response = client.get("/api/v1/news/suggest?q=pa&types=tag")
+    assert [item["text"] for item in response.json()["items"]] == ["Pandas"]
+    client.delete(f"/api/v1/news/{created[0]['id']}")
+    response = client.get("/api/v1/news/suggest?q=山田")
+    assert response.json()["items"] == []
+    
+    # 不正なパラメータ
+    assert client.get("/api/v1/news/suggest?q=").status_code == 422
+    assert client.get("/api/v1/news/suggest?q=py&types=unknown").status_code == 400
+
+def test_related_articles(client):
+    """関連記事のテスト"""
+    articles = [
+        {"title": "機械学習入門", "content": "Pythonで機械学習を学ぶ", "category": "technology", "tags": ["AI", "Python"], "published": True},
+        {"title": "深層学習の基礎", "content": "機械学習と深層学習の違い", "category": "technology", "tags": ["AI"], "published": True},
+        {"title": "株価の動向", "content": "今週の経済ニュース", "category": "business", "tags": ["経済"], "published": True},
+        {"title": "未公開の機械学習記事", "content": "機械学習", "category": "technology", "tags": ["AI"], "published": False}
+    ]
+    created = [client.post("/api/v1/news", json=article).json() for article in articles]
+    
+    response = client.get(f"/api/v1/news/{created[0]['id']}/related")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["article_id"] == created[0]["id"]
+    ids = [item["id"] for item in data["items"]]
+    assert ids[0] == created[1]["id"]
+    assert created[2]["id"] not in ids  # 共通する特徴量がない
+    assert created[3]["id"] not in ids  # 未公開記事は含まれない
+    assert 0 < data["items"][0]["score"] <= 1
+    
+    # 作成・更新で近傍が差分更新される
+    new_article = client.post("/api/v1/news", json={
+        "title": "機械学習とPython", "content": "Pythonで機械学習", "category": "technology",
+        "tags": ["AI", "Python"], "published": True
+    }).json()
+    response = client.get(f"/api/v1/news/{created[0]['id']}/related?limit=1")
+    assert [item["id"] for item in response.json()["items"]] == [new_article["id"]]
+    client.put(f"/api/v1/news/{new_article['id']}", json={"published": False})
+    response = client.get(f"/api/v1/news/{created[0]['id']}/related")
+    assert new_article["id"] not in [item["id"] for item in response.json()["items"]]
+    
+    # 存在しない記事・未公開記事
+    assert client.get("/api/v1/news/999/related").status_code == 404
+    assert client.get(f"/api/v1/news/{created[3]['id']}/related").status_code == 404
+
+def test_trending_views(client):
+    """閲覧記録とトレンド順ソートのテスト"""
+    created = [
+        client.post("/api/v1/news", json={"title": f"トレンド記事{i}", "content": "本文", "published": True}).json()
+        for i in range(3)
+    ]
+    
+    response = client.post(f"/api/v1/news/{created[1]['id']}/view", headers={"X-Visitor-Id": "visitor-1"})
+    assert response.status_code == 202
+    if not response.json()["recorded"]:
+        pytest.skip("Redisが利用できません")
+    client.post(f"/api/v1/news/{created[1]['id']}/view", headers={"X-Visitor-Id": "visitor-2"})
+    client.post(f"/api/v1/news/{created[0]['id']}/view", headers={"X-Visitor-Id": "visitor-1"})
+    # 存在しない記事の閲覧は書き戻されない
+    client.post("/api/v1/news/999/view")
+    
+    # バックグラウンドジョブを待たずに書き戻す
+    assert trending_service.flush() == 2
+    
+    response = client.get("/api/v1/news/search?sort_by=trending")
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()["items"]]
+    assert ids[:2] == [created[1]["id"], created[0]["id"]]
+    assert 999 not in ids
+    assert search.get_article(999) is None
+
+def test_indexing_status(client):
+    """インデックス反映状況のテスト"""
+    client.post("/api/v1/news", json={"title": "監視テスト", "content": "本文"})
+    
+    response = client.get("/api/v1/admin/indexing")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["enqueued_tasks"] >= 0
+    assert data["processing_tasks"] >= 0
+    assert "p95" in data["task_duration_seconds"]
+    assert data["backpressure"]["hard_limit_seconds"] >= data["backpressure"]["soft_limit_seconds"]
+    assert data["write_batching"]["documents"] >= 1
+
+def test_write_backpressure(client, monkeypatch):
+    """インデックス反映が遅れている場合に書き込みが拒否されることのテスト"""
+    from datetime import datetime, timedelta, timezone
+    from app import index_monitor
+    
+    monitor = index_monitor.indexing_monitor
+    monkeypatch.setattr(monitor, "last_poll_at", index_monitor.time.monotonic() + 3600)
+    monkeypatch.setattr(
+        monitor, "oldest_pending_at",
+        datetime.now(timezone.utc) - timedelta(seconds=index_monitor.LAG_SOFT_LIMIT + 1)
+    )
+    
+    article = {"title": "一括投入", "content": "本文"}
+    # 一括投入はsoft limitで拒否される
+    response = client.post("/api/v1/news", json=article, headers={"X-Write-Priority": "bulk"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    
+    # hard limitを超えると通常の書き込みも拒否される
+    monkeypatch.setattr(
+        monitor, "oldest_pending_at",
+        datetime.now(timezone.utc) - timedelta(seconds=index_monitor.LAG_HARD_LIMIT + 1)
+    )
+    response = client.post("/api/v1/news", json=article)
+    assert response.status_code == 429
+    
+    # 読み込みは制限されない
+    assert client.get("/api/v1/news").status_code == 200
+
+def test_metrics(client):
+    """Prometheusメトリクスのテスト"""
+    if not metrics.PROMETHEUS_AVAILABLE:
+        pytest.skip("prometheus_client is not installed")
+    client.get("/api/v1/news", params={"q": "テスト"})
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'news_api_http_requests_total{method="GET",route="/api/v1/news"' in body
+    assert 'news_api_backend_call_duration_seconds_bucket{backend="meilisearch",operation="search"' in body
+
+def test_server_timing(client, monkeypatch):
+    """Server-Timingヘッダーのテスト"""
+    response = client.get("/api/v1/news", params={"q": "テスト"})
+    assert "server-timing" not in response.headers
+    
+    monkeypatch.setattr(timing, "SERVER_TIMING_ENABLED", True)
+    response = client.get("/api/v1/news", params={"q": "テスト"})
+    assert response.status_code == 200
+    names = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    for name in ["total", "middleware", "handler", "validation", "render", "meilisearch.search"]:
+        assert name in names
+
+def test_tracing(client, monkeypatch):
+    """トレース記録のテスト"""
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    response = client.get(
+        "/api/v1/news/search",
+        params={"q": "テスト"},
+        headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+    )
+    assert response.status_code == 200
+    assert response.headers["traceresponse"].startswith(f"00-{trace_id}-")
+    
+    response = client.get("/debug/traces", params={"trace_id": trace_id})
+    assert response.status_code == 200
+    traces = response.json()["traces"]
+    assert len(traces) == 1
+    assert traces[0]["name"] == "GET /api/v1/news/search"
+    names = [span["name"] for span in traces[0]["spans"]]
+    assert "search.search_articles" in names
+    assert "meilisearch.search" in names
+    
+    # sampledフラグのないリクエストは記録しない
+    response = client.get(
+        "/api/v1/news/search",
+        params={"q": "テスト"},
+        headers={"traceparent": "00-0af7651916cd43dd8448eb211c80319c-00f067aa0ba902b7-00"}
+    )
+    assert "traceresponse" not in response.headers
+
+def test_debug_requires_admin_token(client, monkeypatch):
+    """ADMIN_TOKEN が設定されている場合はデバッグ用エンドポイントにトークンが必要なことのテスト"""
+    from app import admin_auth
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "secret")
+    assert client.get("/debug/traces").status_code == 401
+    assert client.get("/debug/loop").status_code == 401
+    assert client.get("/debug/traces", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+def test_debug_profile(client):
+    """イベントループの監視・常時プロファイルのテスト"""
+    response = client.get("/debug/loop")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["block_count"] >= 0
+    assert "p99" in data["lag_seconds"]
+    
+    response = client.get("/debug/profile")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    
+    response = client.get("/debug/profile", params={"source": "unknown"})
+    assert response.status_code == 422
+    
+    # リセットは状態を変更するためPOSTのみ
+    response = client.post("/debug/profile/reset")
+    assert response.status_code == 204
+    assert client.get("/debug/loop").json()["block_count"] == 0
+
+def test_search_stats(client):
+    """検索統計のテスト"""
+    client.get("/api/v1/news/search", params={"q": "統計テスト"})
+    client.get("/api/v1/news/search", params={"q": "統計テスト"})
+    client.get("/api/v1/news/search", params={"q": "ゼロヒットになるクエリxyz"})
+    
+    response = client.get("/api/v1/admin/search-stats", params={"operation": "search"})
+    assert response.status_code == 200
+    data = response.json()
+    queries = {q["query"]: q for q in data["top_queries"]}
+    assert queries["統計テスト"]["count"] >= 2
+    assert "ゼロヒットになるクエリxyz" in [q["query"] for q in data["zero_hit_queries"]]
+    assert data["latency_ms"]["search"]["p95"] is not None
+
+def test_fast_responses(client):
+    """一覧・検索がレスポンスモデルと同じ形のJSONを返すことのテスト"""
+    client.post("/api/v1/news", json={"title": "高速レスポンステスト", "content": "本文", "tags": ["高速"]})
+    response = client.get("/api/v1/news/search", params={"q": "高速レスポンステスト"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    data = response.json()
+    assert set(data) == {"items", "total", "limit", "offset"}
+    for item in data["items"]:
+        assert set(item) == set(search.ARTICLE_ATTRIBUTES)
+    
+    # OpenAPIのスキーマはレスポンスモデルのまま
+    schema = client.get("/openapi.json").json()
+    ok = schema["paths"]["/api/v1/news/search"]["get"]["responses"]["200"]
+    assert ok["content"]["application/json"]["schema"]["$ref"].endswith("/SearchResponse")
+
 def test_s3_health_check(client):
     """S3ヘルスチェックのテスト"""
     response = client.get("/api/v1/news/s3/health")
@@ -0,0 +1,52 @@
+import asyncio
+import contextvars
+import threading
+import time
+from app import aws
+
+def test_calls_overlap_on_dedicated_executor():
+    """同期のAWS呼び出しが専用のスレッドで並行して実行され、イベントループを止めないことのテスト"""
+    names = []
+
+    def blocking_call(delay):
+        names.append(threading.current_thread().name)
+        time.sleep(delay)
+        return delay
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(aws.run(blocking_call, 0.2), aws.run(blocking_call, delay=0.2))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    assert results == [0.2, 0.2]
+    assert elapsed < 0.35
+    assert all(name.startswith("aws") for name in names)
+    aws.shutdown()
+
+def test_executor_is_bounded_and_keeps_context(monkeypatch):
+    """スレッド数が AWS_MAX_WORKERS に制限され、コンテキスト変数が引き継がれることのテスト"""
+    monkeypatch.setattr(aws, "AWS_MAX_WORKERS", 2)
+    aws.shutdown()
+    request_id = contextvars.ContextVar("request_id", default=None)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def blocking_call():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return request_id.get()
+
+    async def run():
+        request_id.set("abc")
+        return await asyncio.gather(*(aws.run(blocking_call) for _ in range(6)))
+
+    assert asyncio.run(run()) == ["abc"] * 6
+    assert peak == 2
+    aws.shutdown()
@@ -0,0 +1,87 @@
+import asyncio
+import gzip
+import json
+from app import compression
+from app.compression import CompressionMiddleware, negotiate_encoding
+
+class _Route:
+    def __init__(self, path):
+        self.path = path
+
+def _call(app, accept_encoding="gzip", route="/api/v1/news/search"):
+    """ASGIアプリを呼び出して送信されたメッセージを返します"""
+    messages = []
+    scope = {"type": "http", "method": "GET", "path": route, "headers": [(b"accept-encoding", accept_encoding.encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def routed_app(scope, receive, send):
+        scope["route"] = _Route(route)
+        await app(scope, receive, send)
+
+    asyncio.run(CompressionMiddleware(routed_app, level="default", route_levels={"/api/v1/news/{article_id}": "off"})(scope, receive, send))
+    return messages
+
+def _json_app(payload: dict, chunks: int = 1):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode())
+        ]})
+        size = -(-len(body) // chunks)
+        for i in range(chunks):
+            await send({"type": "http.response.body", "body": body[i * size:(i + 1) * size], "more_body": i < chunks - 1})
+    return app, body
+
+ARTICLES = {"hits": [{"id": i, "title": f"記事{i}", "content": "日本語の本文です。" * 20} for i in range(20)]}
+
+def test_negotiate_encoding():
+    """Accept-Encoding のネゴシエーションのテスト"""
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") == compression.available_encodings()[0]
+
+def test_compress_json_response():
+    """JSONレスポンスの圧縮・キャッシュのテスト"""
+    compression.compressed_cache.invalidate()
+    app, body = _json_app(ARTICLES)
+    messages = _call(app)
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    compressed = messages[1]["body"]
+    assert int(headers[b"content-length"]) == len(compressed) < len(body)
+    assert gzip.decompress(compressed) == body
+
+    # 同じ内容のレスポンスは圧縮済みのボディを再利用する
+    hits = compression.compressed_cache.hits
+    assert _call(app)[1]["body"] == compressed
+    assert compression.compressed_cache.hits == hits + 1
+
+def test_skip_small_and_disabled_routes():
+    """小さいレスポンス・圧縮しないルート・非対応クライアントのテスト"""
+    app, body = _json_app({"id": 1})
+    messages = _call(app)
+    assert b"content-encoding" not in dict(messages[0]["headers"])
+    assert messages[1]["body"] == body
+
+    app, body = _json_app(ARTICLES)
+    assert b"content-encoding" not in dict(_call(app, route="/api/v1/news/{article_id}")[0]["headers"])
+    assert b"content-encoding" not in dict(_call(app, accept_encoding="identity")[0]["headers"])
+
+def test_streaming_compression():
+    """複数回に分けて送られるレスポンスのストリーミング圧縮のテスト"""
+    app, body = _json_app(ARTICLES, chunks=5)
+    messages = _call(app)
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert len(messages) == 6
+    assert gzip.decompress(b"".join(message["body"] for message in messages[1:])) == body
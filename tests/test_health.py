@@ -0,0 +1,76 @@
+import asyncio
+import time
+from app import health
+from app.health import HealthProber, ProbeDisabled
+
+def _probe(prober, name, times=1):
+    async def run():
+        for _ in range(times):
+            await prober.probe(name)
+    asyncio.run(run())
+
+def test_probe_status_transitions(monkeypatch):
+    """成功・失敗の履歴から healthy / degraded / unhealthy が決まることのテスト"""
+    monkeypatch.setattr(health, "HEALTH_FAILURE_THRESHOLD", 2)
+    prober = HealthProber()
+    results = []
+
+    def check():
+        if results.pop(0):
+            return {"version": "1"}
+        raise ConnectionError("refused")
+
+    prober.register("db", check, critical=True)
+    assert prober.status("db")["status"] == "pending"
+    assert prober.critical_healthy
+
+    results.extend([True])
+    _probe(prober, "db")
+    assert prober.status("db")["status"] == "healthy"
+    assert prober.detail("db") == {"version": "1"}
+
+    # 1回の失敗は degraded、連続して失敗すると unhealthy
+    results.extend([False])
+    _probe(prober, "db")
+    assert prober.status("db")["status"] == "degraded"
+    assert prober.status("db")["error"] == "ConnectionError: refused"
+    results.extend([False])
+    _probe(prober, "db")
+    assert prober.status("db")["status"] == "unhealthy"
+    assert not prober.critical_healthy
+
+    # 回復しても直近に失敗がある間は degraded（不安定な依存先）
+    results.extend([True])
+    _probe(prober, "db")
+    state = prober.status("db")
+    assert state["ok"] and state["status"] == "degraded"
+    assert prober.critical_healthy
+
+def test_probe_timeout_and_disabled(monkeypatch):
+    """タイムアウトしたチェックを重複して実行しないこと・無効な依存先のテスト"""
+    monkeypatch.setattr(health, "HEALTH_PROBE_TIMEOUT", 0.05)
+    prober = HealthProber()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.3)
+
+    def disabled():
+        raise ProbeDisabled("not configured")
+
+    prober.register("slow", slow)
+    prober.register("optional", disabled)
+
+    async def run():
+        await prober.probe("slow")
+        await prober.probe("slow")
+        await prober.probe("optional")
+
+    asyncio.run(run())
+    state = prober.status("slow")
+    assert state["status"] == "degraded"
+    assert state["consecutive_failures"] == 2
+    assert state["error"] == "previous probe still running"
+    assert len(calls) == 1
+    assert prober.status("optional")["status"] == "disabled"
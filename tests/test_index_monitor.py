@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from app import index_monitor, search
+from app.index_monitor import IndexingMonitor
+
+class FakeTasksClient:
+    """未処理のタスクが新しい順に返されるMeilisearchのタスクAPIを模したクライアント"""
+    def __init__(self, pending):
+        self.pending = pending  # (状態, 投入日時) のリスト（新しい順）
+
+    def get_tasks(self, params):
+        statuses = params["statuses"]
+        tasks = [
+            SimpleNamespace(uid=i, status=status, enqueued_at=enqueued_at)
+            for i, (status, enqueued_at) in enumerate(self.pending)
+            if status in statuses
+        ]
+        if params.get("reverse") == "true":
+            tasks.reverse()
+        return SimpleNamespace(results=tasks[:params["limit"]], total=len(tasks))
+
+def test_poll_measures_lag_from_oldest_task(monkeypatch):
+    """未処理のタスクが取得件数より多い場合も、件数と最古のタスクの遅れを正しく計測することのテスト"""
+    now = datetime.now(timezone.utc)
+    pending = [("processing", now)] + [("enqueued", now - timedelta(seconds=i)) for i in range(1, 3001)]
+    monkeypatch.setattr(search, "get_client", lambda: FakeTasksClient(pending))
+    monkeypatch.setattr(index_monitor, "record_indexing", lambda *args: None)
+    monkeypatch.setattr(index_monitor, "record_indexing_task", lambda *args: None)
+
+    monitor = IndexingMonitor()
+    monitor.poll()
+    assert monitor.processing == 1
+    assert monitor.enqueued == 3000
+    assert monitor.lag_seconds >= 3000
+
+def test_poll_records_task_durations_once(monkeypatch):
+    """完了したタスクの処理時間・投入から完了までの時間を、タスクごとに1回だけメトリクスに記録することのテスト"""
+    now = datetime.now(timezone.utc)
+    finished = [
+        SimpleNamespace(
+            uid=uid, status="succeeded",
+            enqueued_at=now - timedelta(seconds=3), started_at=now - timedelta(seconds=2), finished_at=now
+        )
+        for uid in (2, 1)
+    ]
+
+    class Client(FakeTasksClient):
+        def get_tasks(self, params):
+            if "succeeded" in params["statuses"]:
+                return SimpleNamespace(results=list(finished), total=len(finished))
+            return super().get_tasks(params)
+
+    monkeypatch.setattr(search, "get_client", lambda: Client([]))
+    monkeypatch.setattr(index_monitor, "record_indexing", lambda *args: None)
+    recorded = []
+    monkeypatch.setattr(index_monitor, "record_indexing_task", lambda *args: recorded.append(args))
+
+    monitor = IndexingMonitor()
+    monitor.poll()
+    monitor.poll()
+    assert recorded == [(2.0, 3.0), (2.0, 3.0)]
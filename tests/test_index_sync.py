@@ -0,0 +1,72 @@
+import time
+from app import search
+from app.related import related_index
+from app.suggest import suggest_index
+
+ARTICLES = [
+    {"id": 1, "title": "Python入門", "tags": ["python"], "category": "technology", "author": "山田", "published": True}
+]
+
+def _setup(monkeypatch, articles, updated_at):
+    state = {"updated_at": updated_at, "reads": 0}
+
+    def iter_all_articles(fields=None):
+        state["reads"] += 1
+        return iter(list(articles))
+
+    monkeypatch.setattr(search, "iter_all_articles", iter_all_articles)
+    monkeypatch.setattr(search, "_index_updated_at", lambda: state["updated_at"])
+    monkeypatch.setattr(search, "_index_sync", {
+        "updated_at": None, "related_updated_at": None, "related_built_at": 0.0, "error": None
+    })
+    return state
+
+def test_sync_reflects_writes_from_other_workers(monkeypatch):
+    """他のワーカーで書き込まれた記事が、インデックスの更新日時が変わったときに反映されることのテスト"""
+    articles = list(ARTICLES)
+    state = _setup(monkeypatch, articles, "2024-01-01T00:00:00Z")
+
+    # 起動時の構築が終わるまでは何もしない
+    assert not search.sync_in_memory_indexes()
+    search.rebuild_in_memory_indexes()
+    state["reads"] = 0
+
+    # 更新されていなければ記事を読み込まない
+    assert not search.sync_in_memory_indexes()
+    assert state["reads"] == 0
+
+    # 他のワーカーが記事を追加・削除した
+    articles[:] = [{"id": 2, "title": "Rust入門", "tags": [], "category": "technology", "author": "佐藤", "published": True}]
+    state["updated_at"] = "2024-01-01T00:00:05Z"
+    assert search.sync_in_memory_indexes()
+    assert [item["text"] for item in suggest_index.suggest("rust")] == ["Rust入門"]
+    assert suggest_index.suggest("python") == []
+    assert not search.sync_in_memory_indexes()
+    assert state["reads"] == 1
+    suggest_index.clear()
+
+def test_related_rebuilt_at_interval(monkeypatch):
+    """関連記事は記事が更新され、かつ RELATED_REBUILD_INTERVAL 秒が経過した場合に再構築されることのテスト"""
+    articles = [
+        {**ARTICLES[0], "content": "python fastapi"},
+        {"id": 2, "title": "FastAPI入門", "content": "python fastapi", "tags": ["python"], "category": "technology", "published": True}
+    ]
+    state = _setup(monkeypatch, articles, "2024-01-01T00:00:00Z")
+    monkeypatch.setattr(search, "RELATED_REBUILD_INTERVAL", 600)
+    search.rebuild_in_memory_indexes()
+    assert [item["id"] for item in related_index.related(1)] == [2]
+
+    # 他のワーカーが記事を追加した（間隔が経過するまではサジェストのみ再構築）
+    articles.append({"id": 3, "title": "Python応用", "content": "python fastapi", "tags": ["python"], "category": "technology", "published": True})
+    state["updated_at"] = "2024-01-01T00:00:05Z"
+    assert search.sync_in_memory_indexes()
+    assert related_index.related(3) is None
+
+    search._index_sync["related_built_at"] = time.monotonic() - 600
+    assert search.sync_in_memory_indexes()
+    assert {item["id"] for item in related_index.related(1)} == {2, 3}
+    # 再構築後、記事が更新されていなければ何もしない
+    search._index_sync["related_built_at"] = time.monotonic() - 600
+    assert not search.sync_in_memory_indexes()
+    suggest_index.clear()
+    related_index.clear()
@@ -0,0 +1,34 @@
+import asyncio
+import time
+from app.loop_monitor import LoopMonitor
+
+def _blocking_call():
+    time.sleep(0.3)  # イベントループを止める同期処理
+
+def test_loop_monitor_detects_blocking_call():
+    """イベントループを止める処理のスタックが記録されることのテスト"""
+    monitor = LoopMonitor()
+    
+    async def main():
+        task = asyncio.create_task(monitor.run(interval=0.02))
+        await asyncio.sleep(0.1)
+        _blocking_call()
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    asyncio.run(main())
+    
+    snapshot = monitor.snapshot()
+    assert snapshot["block_count"] == 1
+    assert snapshot["lag_seconds"]["max"] >= 0.2
+    block = snapshot["recent_blocks"][0]
+    assert block["duration_seconds"] >= 0.2
+    assert block["stack"].endswith("_blocking_call (test_loop_monitor.py:6)")
+    assert "_blocking_call" in monitor.folded("blocking")
+    
+    monitor.reset()
+    assert monitor.snapshot()["block_count"] == 0
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import pytest
+from app import access_log
+from app.middleware import AccessLogMiddleware
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(access_log.JSONFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+@pytest.fixture
+def access_lines(monkeypatch):
+    monkeypatch.setattr(access_log, "ACCESS_LOG_ENABLED", True)
+    monkeypatch.setattr(access_log, "ACCESS_LOG_BODY", "always")
+    handler = _ListHandler()
+    access_log.access_logger.addHandler(handler)
+    yield handler.lines
+    access_log.access_logger.removeHandler(handler)
+
+def _call(app, chunks, headers=None, path="/api/v1/contact"):
+    """ボディをチャンクに分けてASGIアプリを呼び出し、送信されたメッセージを返します"""
+    messages = []
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": headers or [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000)
+    }
+    pending = list(chunks)
+
+    async def receive():
+        body = pending.pop(0) if pending else b""
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+async def _echo_app(scope, receive, send):
+    """ボディを最後まで読んでそのまま返すアプリ"""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    assert access_log.request_id_var.get() is not None
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+def test_access_log_middleware(access_lines):
+    """リクエストID・アクセスログ・ボディの記録のテスト"""
+    app = AccessLogMiddleware(_echo_app)
+    messages = _call(app, [b'{"email": ', b'"user@example.com"}'])
+
+    # アプリにはボディがそのまま渡される
+    assert messages[1]["body"] == b'{"email": "user@example.com"}'
+    headers = dict(messages[0]["headers"])
+    request_id = headers[b"x-request-id"].decode()
+
+    entry = access_lines[0]
+    assert entry["request_id"] == request_id
+    assert entry["status"] == 200
+    assert entry["client"] == "127.0.0.1"
+    assert entry["request_bytes"] == 29
+    assert entry["response_bytes"] == 29
+    assert "user@example.com" not in entry["body"]
+
+    # 受け取ったリクエストIDはそのまま使う
+    messages = _call(app, [b"{}"], headers=[(b"x-request-id", b"req-123")])
+    assert dict(messages[0]["headers"])[b"x-request-id"] == b"req-123"
+    assert access_lines[1]["request_id"] == "req-123"
+
+def test_access_log_middleware_body_limit(access_lines):
+    """ボディサイズの上限を超えたリクエストが413になることのテスト"""
+    app = AccessLogMiddleware(_echo_app, max_body_size=10)
+
+    # Content-Length で判定できる場合はアプリを呼ばない
+    messages = _call(app, [b"x" * 20], headers=[(b"content-length", b"20")])
+    assert messages[0]["status"] == 413
+    assert len(messages) == 2
+
+    # Content-Length がない場合は受信したバイト数で判定
+    messages = _call(app, [b"x" * 6, b"x" * 6])
+    assert messages[0]["status"] == 413
+    assert access_lines[-1]["status"] == 413
+
+    # 上限以内はそのまま
+    messages = _call(app, [b"x" * 10])
+    assert messages[0]["status"] == 200
+
+def test_access_log_middleware_body_limit_with_fastapi_route(access_lines):
+    """FastAPIのルートでも、Content-Length のないボディが上限を超えると413になることのテスト"""
+    from fastapi import FastAPI
+    from pydantic import BaseModel
+
+    class Item(BaseModel):
+        name: str
+
+    api = FastAPI()
+
+    @api.post("/items")
+    def create_item(item: Item):
+        return item
+
+    app = AccessLogMiddleware(api, max_body_size=10)
+    messages = _call(app, [b'{"name": ', b'"0123456789"}'], path="/items")
+    assert messages[0]["status"] == 413
+    assert json.loads(messages[1]["body"])["detail"] == "リクエストボディが大きすぎます。"
+    assert len(messages) == 2
+    assert access_lines[-1]["status"] == 413
+
+    # 上限以内はそのままルートで処理される
+    app = AccessLogMiddleware(api, max_body_size=100)
+    messages = _call(app, [b'{"name": ', b'"0123456789"}'], path="/items")
+    assert messages[0]["status"] == 200
@@ -0,0 +1,108 @@
+import asyncio
+import types
+import pytest
+from app import outbox
+from app.outbox import ContactOutbox
+
+PAYLOAD = {"name": "山田", "email": "user@example.com", "subject": "件名", "message": "本文"}
+
+def test_enqueue_is_durable_and_delivered_per_channel(tmp_path):
+    """保存したお問い合わせが再起動後も残り、配送先ごとに配送されることのテスト"""
+    path = tmp_path / "outbox.db"
+    first = ContactOutbox(path)
+    contact_id = first.enqueue(PAYLOAD, ["s3", "sns"])
+    first.close()
+
+    box = ContactOutbox(path)
+    delivered = []
+
+    async def deliver(channel, cid, payload, received_at):
+        delivered.append((channel, cid, payload["email"]))
+        return True
+
+    assert asyncio.run(box.deliver_batch(deliver)) == 2
+    assert sorted(delivered) == [("s3", contact_id, "user@example.com"), ("sns", contact_id, "user@example.com")]
+    assert box.snapshot()["counts"] == {"pending": 0, "delivered": 2, "dead": 0}
+    assert asyncio.run(box.deliver_batch(deliver)) == 0
+
+def test_failed_channel_retries_with_backoff_then_dead_letters(tmp_path, monkeypatch):
+    """失敗した配送先だけが再試行され、上限に達するとデッドレターになることのテスト"""
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "backoff_delay", lambda attempts: 0)
+    box = ContactOutbox(tmp_path / "outbox.db")
+    box.enqueue(PAYLOAD, ["s3", "sns"])
+    calls = []
+
+    async def deliver(channel, cid, payload, received_at):
+        calls.append(channel)
+        if channel == "sns":
+            raise ConnectionError("unreachable")
+        return True
+
+    asyncio.run(box.deliver_batch(deliver))
+    asyncio.run(box.deliver_batch(deliver))
+    assert sorted(calls) == ["s3", "sns", "sns"]
+
+    state = box.snapshot()
+    assert state["counts"] == {"pending": 0, "delivered": 1, "dead": 1}
+    dead = state["dead_letters"][0]
+    assert dead["channel"] == "sns" and dead["attempts"] == 2 and "unreachable" in dead["last_error"]
+
+    assert box.requeue(dead["id"])
+    assert box.snapshot()["counts"]["pending"] == 1
+
+def test_claimed_delivery_is_not_claimed_twice(tmp_path):
+    """取り出した配送は期限（lease）が切れるまで他のワーカーに取り出されないことのテスト"""
+    path = tmp_path / "outbox.db"
+    box = ContactOutbox(path)
+    box.enqueue(PAYLOAD, ["s3"])
+    other = ContactOutbox(path)
+    assert len(box.claim()) == 1
+    assert other.claim() == []
+
+def test_purge_delivered_and_expired_contacts(tmp_path, monkeypatch):
+    """全ての配送先に配送済みのお問い合わせと、保持期間を過ぎたお問い合わせが削除されることのテスト"""
+    monkeypatch.setattr(outbox, "OUTBOX_RETENTION_DAYS", 1)
+    box = ContactOutbox(tmp_path / "outbox.db")
+    delivered_id = box.enqueue(PAYLOAD, ["s3", "sns"])
+    partial_id = box.enqueue(PAYLOAD, ["s3", "sns"])
+    deliveries = {(item["contact_id"], item["channel"]): item["id"] for item in box.claim()}
+    box.complete(deliveries[(delivered_id, "s3")])
+    box.complete(deliveries[(delivered_id, "sns")])
+    box.complete(deliveries[(partial_id, "s3")])
+
+    # 配送が残っているお問い合わせは削除しない
+    assert box.purge() == 1
+    assert box.snapshot()["counts"] == {"pending": 1, "delivered": 1, "dead": 0}
+
+    # 保持期間を過ぎると未配送でも削除する
+    box._write(lambda conn: conn.execute("UPDATE contacts SET received_at = received_at - 2 * 86400"))
+    assert box.purge() == 1
+    assert box.snapshot()["counts"] == {"pending": 0, "delivered": 0, "dead": 0}
+    assert box._connection().execute("SELECT COUNT(*) FROM contacts").fetchone()[0] == 0
+
+def test_accept_contact_form_without_channels_is_processed_directly(monkeypatch):
+    """利用できる配送先がない場合は保存せずにリクエストの中で処理することのテスト"""
+    pytest.importorskip("fastapi_mail")
+    from app import email_service as email_module
+
+    service = email_module.EmailService.__new__(email_module.EmailService)
+    service.available = True
+    service.is_local = True
+    service.s3_service = types.SimpleNamespace(available=False)
+    service.sns_service = types.SimpleNamespace(available=False)
+    submitted = []
+
+    async def submit(payload, channels):
+        submitted.append(channels)
+        return "stored"
+
+    async def process_contact_form(contact_form, ip_address=None):
+        return {"success": False, "error": "direct"}
+
+    monkeypatch.setattr(email_module.contact_outbox, "submit", submit)
+    monkeypatch.setattr(service, "process_contact_form", process_contact_form)
+    form = email_module.ContactForm(**PAYLOAD)
+
+    assert asyncio.run(service.accept_contact_form(form)) == {"success": False, "error": "direct"}
+    assert submitted == []
@@ -0,0 +1,92 @@
+import json
+from app.pii import PIIMasker
+
+masker = PIIMasker(fields=["email", "phone", "name", "company"])
+
+def test_mask_json_nested():
+    """ネストしたオブジェクト・配列内の個人情報もマスクされることのテスト"""
+    body = json.dumps({
+        "name": "山田太郎",
+        "subject": "件名",
+        "contacts": [{"email": "user@example.com", "phone": "090-1234-5678"}],
+        "profile": {"company": "株式会社テスト", "note": "連絡先は other@example.com まで"}
+    }, ensure_ascii=False)
+    masked = masker.mask_text(body)
+
+    data = json.loads(masked)
+    assert data["name"] == "****"
+    assert data["subject"] == "件名"
+    assert data["contacts"][0] == {"email": "*" * 16, "phone": "*" * 13}
+    assert data["profile"]["company"] == "*******"
+    assert data["profile"]["note"] == "連絡先は " + "*" * 17 + " まで"
+
+    # パース済みのデータも同じようにマスクできる
+    assert masker.mask_data(json.loads(body)) == data
+
+def test_mask_escaped_and_plain_text():
+    """エスケープを含む値・JSON以外の文字列のテスト"""
+    assert masker.mask_text('{"name": "\\u5c71\\u7530"}') == '{"name": "**"}'
+    assert masker.mask_text("連絡先: user@example.com / 03-1234-5678") == "連絡先: " + "*" * 16 + " / " + "*" * 12
+
+def test_mask_custom_rules():
+    """フィールド・正規表現を追加できることのテスト"""
+    custom = PIIMasker(fields=["token"], patterns=[r"\d{4}-\d{4}-\d{4}-\d{4}"])
+    masked = custom.mask_text('{"token": "abc", "name": "太郎", "card": "1234-5678-9012-3456"}')
+    assert masked == '{"token": "***", "name": "太郎", "card": "' + "*" * 19 + '"}'
+
+def test_mask_stream_truncated():
+    """切り詰めた場合も途中の値が漏れないことのテスト"""
+    body = '{"subject": "件名", "name": "山田太郎", "email": "user@example.com"}'.encode()
+    chunks = [body[:10], body[10:]]
+
+    text, truncated = masker.mask_stream(chunks, limit=len(body))
+    assert not truncated
+    assert "user@example.com" not in text
+
+    # 値の途中で切れた場合
+    for limit in (body.index("太".encode()) + 1, body.index(b"example") + 3):
+        text, truncated = masker.mask_stream(chunks, limit=limit)
+        assert truncated
+        assert "山田" not in text
+        assert "user@" not in text
+        assert "件名" in text
+
+def test_mask_non_string_values():
+    """文字列以外の値（オブジェクト・配列・数値）も型によらず全体がマスクされることのテスト"""
+    body = json.dumps({
+        "name": {"first": "太郎", "last": "山田"},
+        "company": ["株式会社テスト", {"branch": "東京支社", "employees": 120}],
+        "phone": 9012345678,
+        "email": None,
+        "subject": "件名",
+        "count": 3
+    }, ensure_ascii=False)
+    masked = masker.mask_text(body)
+    for value in ("太郎", "山田", "株式会社テスト", "東京支社", "120", "9012345678"):
+        assert value not in masked
+
+    data = json.loads(masked)
+    assert data["name"] == {"first": "**", "last": "**"}
+    assert data["company"] == ["*******", {"branch": "****", "employees": "***"}]
+    assert data["phone"] == "*" * 10
+    assert data["email"] is None
+    assert data["subject"] == "件名" and data["count"] == 3
+    assert masker.mask_data(json.loads(body)) == data
+
+    # 値の途中で切れた場合
+    truncated = '{"name": ["太郎", {"first": "花'
+    assert masker.mask_text(truncated, truncated=True) == '{"name": ["**", {"first": "*'
+
+def test_mask_field_names_case_insensitive():
+    """フィールド名は大文字・小文字を区別しないことのテスト"""
+    masked = masker.mask_text('{"Email": "a", "PHONE": "0312345678", "Name": {"First": "太郎"}}')
+    assert masked == '{"Email": "*", "PHONE": "**********", "Name": {"First": "**"}}'
+    assert masker.mask_data({"Email": "a", "PHONE": 312345678}) == {"Email": "*", "PHONE": "*" * 9}
+
+def test_mask_overlong_local_part():
+    """ローカル部が上限（64文字）より長いメールアドレスも区切りまで全体がマスクされることのテスト"""
+    address = "a" * 70 + "@example.com"
+    assert masker.mask_text(f'{{"addr": "{address}"}}') == '{"addr": "' + "*" * len(address) + '"}'
+    assert masker.mask_text(f"連絡先 {address} まで") == "連絡先 " + "*" * len(address) + " まで"
+    # 上限を超える数字の並びに続く電話番号も漏らさない
+    assert "1234-5678" not in masker.mask_text("番号 123456-1234-5678 です")
@@ -0,0 +1,140 @@
+import asyncio
+import pstats
+import threading
+import time
+from app import profiling
+
+SECRET = "test-secret"
+
+def test_profile_header_signature():
+    """X-Profile ヘッダーの署名・検証のテスト"""
+    value = profiling.sign_profile_request("/api/v1/news", mode="sample", output="inline", secret=SECRET)
+    assert profiling.verify_profile_header(value, "/api/v1/news", secret=SECRET) == ("sample", "inline")
+    
+    # 別のパス・別の鍵・改ざんされた値は無効
+    assert profiling.verify_profile_header(value, "/api/v1/contact", secret=SECRET) is None
+    assert profiling.verify_profile_header(value, "/api/v1/news", secret="other") is None
+    assert profiling.verify_profile_header(value.replace("inline", "file"), "/api/v1/news", secret=SECRET) is None
+    assert profiling.verify_profile_header("invalid", "/api/v1/news", secret=SECRET) is None
+    
+    # 期限切れ
+    expired = profiling.sign_profile_request("/api/v1/news", ttl=10, secret=SECRET, now=time.time() - 60)
+    assert profiling.verify_profile_header(expired, "/api/v1/news", secret=SECRET) is None
+
+def _busy_wait(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_cprofile_session_includes_worker_threads(tmp_path):
+    """スレッドプールのワーカーの処理もプロファイルに含まれることのテスト"""
+    session = profiling.ProfileSession("cprofile")
+    session.start()
+    
+    def worker():
+        with session.thread():
+            _busy_wait(0.01)
+    
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    session.stop()
+    
+    path = tmp_path / "profile.pstats"
+    session.save(path)
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "_busy_wait" in functions
+    assert "_busy_wait" in session.report()
+
+def test_stack_sampler_folded_output():
+    """サンプリングプロファイラーが folded 形式で出力することのテスト"""
+    sampler = profiling.StackSampler(interval=0.001)
+    sampler.add_thread(threading.get_ident())
+    sampler.start()
+    _busy_wait(0.05)
+    sampler.stop()
+    
+    lines = sampler.folded().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert any("_busy_wait" in line for line in lines)
+
+def test_stack_sampler_folded_during_sampling():
+    """採取中に別のスレッドから folded()・reset() を呼び出しても失敗しないことのテスト"""
+    stop = threading.Event()
+
+    def recurse(depth):
+        if depth and not stop.is_set():
+            return recurse(depth - 1)
+        time.sleep(0)
+
+    def worker():
+        # 毎回異なる深さのスタックにして、採取のたびに新しいスタックが追加されるようにする
+        depth = 0
+        while not stop.is_set():
+            recurse(depth % 50)
+            depth += 1
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    sampler = profiling.StackSampler(interval=0.0001)
+    sampler.add_thread(thread.ident)
+    sampler.start()
+    try:
+        deadline = time.perf_counter() + 0.3
+        while time.perf_counter() < deadline:
+            sampler.folded()
+            sampler.reset()
+    finally:
+        sampler.stop()
+        stop.set()
+        thread.join()
+
+def _call(app, headers):
+    """ASGIアプリを呼び出して送信されたメッセージを返します"""
+    messages = []
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/news", "headers": headers}
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        messages.append(message)
+    
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+async def _dummy_app(scope, receive, send):
+    _busy_wait(0.01)
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+def test_profiler_middleware(monkeypatch, tmp_path):
+    """X-Profile ヘッダーによるプロファイルのテスト"""
+    monkeypatch.setattr(profiling, "PROFILE_SECRET", SECRET)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    app = profiling.ProfilerMiddleware(_dummy_app)
+    
+    # ヘッダーなしのリクエストはそのまま
+    messages = _call(app, [])
+    assert messages[1]["body"] == b"{}"
+    
+    # 署名が不正な場合はプロファイルしない
+    messages = _call(app, [(b"x-profile", b"0:cprofile:file:invalid")])
+    assert (b"x-profile-status", b"invalid") in messages[0]["headers"]
+    assert list(tmp_path.iterdir()) == []
+    
+    # output=file の場合は本来のレスポンスを返し、結果をファイルに保存
+    value = profiling.sign_profile_request("/api/v1/news", output="file")
+    messages = _call(app, [(b"x-profile", value.encode())])
+    headers = dict(messages[0]["headers"])
+    assert messages[1]["body"] == b"{}"
+    assert (tmp_path / headers[b"x-profile-artifact"].decode()).exists()
+    
+    # output=inline の場合はプロファイル結果を返す
+    value = profiling.sign_profile_request("/api/v1/news", output="inline")
+    messages = _call(app, [(b"x-profile", value.encode())])
+    headers = dict(messages[0]["headers"])
+    assert headers[b"x-profile-original-status"] == b"200"
+    assert b"_busy_wait" in messages[1]["body"]
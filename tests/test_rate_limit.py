@@ -0,0 +1,247 @@
+import asyncio
+import types
+import pytest
+from app import rate_limit
+from app.rate_limit import DistributedRateLimiter, GCRALimiter, Limit, Policy, RateLimitMiddleware, _identify
+
+class FakeRedis:
+    """TOKEN_BUCKET_SCRIPT と同じ計算を行うRedisの代わり（時刻は固定）"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self.buckets = {}
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            if self.fail:
+                raise ConnectionError("redis is down")
+            rate, burst, requested = args
+            tokens = self.buckets.get(keys[0], burst)
+            granted = min(requested, int(tokens))
+            tokens -= granted
+            self.buckets[keys[0]] = tokens
+            wait_ms = -(-(1 - tokens) * 1000 // rate) if tokens < 1 else 0
+            return [granted, int(tokens), wait_ms]
+        return run
+
+POLICY = Policy("ip", rate=1, burst=10)
+
+def lua_redis(monkeypatch, clock):
+    """実際のLuaスクリプトを実行するRedisの代わり（fakeredis。TIME・ワーカー内の時刻は clock[0] 秒）"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from fakeredis.commands_mixins import server_mixin
+    monkeypatch.setattr(server_mixin, "time", types.SimpleNamespace(time=lambda: clock[0]))
+    monkeypatch.setattr(rate_limit, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+    # fakeredis には redis.replicate_commands() がない（Redis 5 以降では何もしない関数）
+    for name in ("TOKEN_BUCKET_SCRIPT", "GCRA_SCRIPT"):
+        monkeypatch.setattr(rate_limit, name, getattr(rate_limit, name).replace("redis.replicate_commands()\n", ""))
+    return fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+
+def test_lease_tokens_from_redis():
+    """まとめて借りたトークンを使い切るまでRedisに問い合わせないことのテスト"""
+    redis = FakeRedis()
+    limiter = DistributedRateLimiter(lease_size=5, lease_ttl=60, redis_getter=lambda: redis)
+
+    async def run():
+        return [await limiter.hit("1.2.3.4", POLICY) for _ in range(12)]
+
+    decisions = asyncio.run(run())
+    assert [d.allowed for d in decisions] == [True] * 10 + [False] * 2
+    # 5件ずつ借りるため、許可した10件で2回・拒否で1回（以降は拒否中としてRedisに問い合わせない）
+    assert redis.calls == 3
+    assert decisions[0].remaining == 9
+    assert decisions[9].remaining == 0
+    assert decisions[10].retry_after == 1.0
+    assert limiter.stats["local"] == 8
+
+def test_token_bucket_script_shared_between_workers(monkeypatch):
+    """TOKEN_BUCKET_SCRIPT を実行し、複数のワーカーで1つのバケットを共有することのテスト"""
+    clock = [1000.0]
+    redis = lua_redis(monkeypatch, clock)
+    policy = Policy("ip", rate=2, burst=4)
+    workers = [DistributedRateLimiter(lease_size=2, lease_ttl=60, redis_getter=lambda: redis) for _ in range(2)]
+
+    async def run():
+        decisions = [await worker.hit("1.2.3.4", policy) for worker in workers for _ in range(2)]
+        assert [d.allowed for d in decisions] == [True] * 4
+        assert decisions[1].remaining == 2
+        assert decisions[3].remaining == 0
+
+        # バケットが空になり、次のトークンまで 1 / rate 秒
+        rejected = await workers[0].hit("1.2.3.4", policy)
+        assert not rejected.allowed
+        assert rejected.retry_after == 0.5
+        assert await redis.pttl("ratelimit:ip:1.2.3.4") > 0
+
+        clock[0] += 0.5
+        allowed = await workers[0].hit("1.2.3.4", policy)
+        assert allowed.allowed
+        assert allowed.remaining == 0
+        assert not (await workers[1].hit("1.2.3.4", policy)).allowed
+
+        # 時間が経つとバースト分まで補充される（上限を超えない）
+        clock[0] += 60
+        return [(await workers[1].hit("1.2.3.4", policy)).allowed for _ in range(5)]
+
+    assert asyncio.run(run()) == [True] * 4 + [False]
+    assert workers[0].stats["redis"] == 3
+
+def test_fallback_when_redis_is_down():
+    """Redisが利用できない場合にワーカー内のバケットで制限することのテスト"""
+    redis = FakeRedis(fail=True)
+    limiter = DistributedRateLimiter(redis_getter=lambda: redis)
+
+    async def run():
+        return [await limiter.hit("1.2.3.4", POLICY) for _ in range(11)]
+
+    decisions = asyncio.run(run())
+    assert [d.allowed for d in decisions] == [True] * 10 + [False]
+    # エラーの後はしばらくRedisに問い合わせない
+    assert redis.calls == 1
+    assert limiter.stats["fallback"] == 11
+
+def test_identify_uses_rightmost_untrusted_forwarded_hop(monkeypatch):
+    """X-Forwarded-For は信頼できるプロキシが追加した右端の部分だけを使うことのテスト"""
+    def identify(*forwarded):
+        scope = {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded], "client": ("10.0.0.2", 1234)}
+        return _identify(scope)[0]
+
+    assert identify("1.1.1.1") == "10.0.0.2"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", True)
+    assert identify() == "10.0.0.2"
+    assert identify("203.0.113.5") == "203.0.113.5"
+    # クライアントが先頭に付けたアドレスは使わない
+    assert identify("1.1.1.1, 2.2.2.2, 203.0.113.5") == "203.0.113.5"
+    assert identify("1.1.1.1", "203.0.113.5") == "203.0.113.5"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_HOPS", 2)
+    assert identify("1.1.1.1, 203.0.113.5, 10.0.0.1") == "203.0.113.5"
+    assert identify("203.0.113.5") == "203.0.113.5"
+
+def test_middleware_headers(monkeypatch):
+    """RateLimit-* ヘッダー・429のテスト"""
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "IP_POLICY", Policy("ip", rate=1, burst=1))
+    redis = FakeRedis()
+    limiter = DistributedRateLimiter(redis_getter=lambda: redis)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware = RateLimitMiddleware(app, limiter)
+
+    async def call(method="GET", path="/api/v1/news/search"):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "headers": [], "client": ("1.2.3.4", 1234)}
+        await middleware(scope, None, send)
+        return messages[0]
+
+    async def run():
+        allowed = await call()
+        assert allowed["status"] == 200
+        headers = dict(allowed["headers"])
+        assert headers[b"ratelimit-limit"] == b"1"
+        assert headers[b"ratelimit-remaining"] == b"0"
+        assert headers[b"ratelimit-policy"] == b"1;w=1"
+
+        rejected = await call()
+        assert rejected["status"] == 429
+        assert dict(rejected["headers"])[b"retry-after"] == b"1"
+
+        # 書き込み・対象外のパスは制限しない
+        assert (await call(method="POST", path="/api/v1/news"))["status"] == 200
+        assert (await call(path="/readyz"))["status"] == 200
+
+    asyncio.run(run())
+
+class FakeGCRARedis:
+    """GCRA_SCRIPT と同じ計算を行うRedisの代わり（時刻は固定）"""
+    def __init__(self):
+        self.calls = 0
+        self.tats = {}
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            now = 0
+            tats = []
+            for i, key in enumerate(keys):
+                interval, period = args[i * 2], args[i * 2 + 1]
+                tat = max(self.tats.get(key, now), now)
+                if tat + interval - period > now:
+                    return [0, i + 1, tat + interval - period - now]
+                tats.append(tat + interval)
+            self.tats.update(zip(keys, tats))
+            return [1, 0, 0]
+        return run
+
+def test_gcra_multiple_limits_in_one_call():
+    """IP・メールアドレスの制限を1回の呼び出しでまとめて判定することのテスト"""
+    redis = FakeGCRARedis()
+    limiter = GCRALimiter("contact", redis_getter=lambda: redis)
+
+    def limits(email):
+        return [Limit("ip:1.2.3.4", 5, 3600), Limit(f"email:{email}", 3, 3600)]
+
+    async def run():
+        results = [await limiter.check(limits("a@example.com")) for _ in range(4)]
+        # メールアドレスの制限で拒否された分はIPの制限を消費しない
+        results += [await limiter.check(limits("b@example.com")) for _ in range(3)]
+        return results
+
+    results = asyncio.run(run())
+    assert [allowed for allowed, _ in results] == [True, True, True, False, True, True, False]
+    assert results[3][1] == 1200.0
+    assert redis.calls == 7
+    # キーごとに保存するのはTATのみ
+    assert sorted(redis.tats) == ["{contact}:email:a@example.com", "{contact}:email:b@example.com", "{contact}:ip:1.2.3.4"]
+
+def test_gcra_script(monkeypatch):
+    """GCRA_SCRIPT を実行し、全ての制限を満たす場合だけ記録されることのテスト"""
+    clock = [1000.0]
+    redis = lua_redis(monkeypatch, clock)
+    limiter = GCRALimiter("contact", redis_getter=lambda: redis)
+
+    def limits(email):
+        return [Limit("ip:1.2.3.4", 5, 3600), Limit(f"email:{email}", 3, 3600)]
+
+    async def run():
+        results = [await limiter.check(limits("a@example.com")) for _ in range(4)]
+        # メールアドレスの制限で拒否された分はIPの制限を消費しない
+        results += [await limiter.check(limits("b@example.com")) for _ in range(3)]
+        assert [allowed for allowed, _ in results] == [True, True, True, False, True, True, False]
+        assert results[3][1] == 1200.0
+        assert results[6][1] == 720.0
+
+        # キーごとに保存するのはTATのみ（期限はTATまで）
+        assert sorted(await redis.keys("*")) == [
+            b"{contact}:email:a@example.com", b"{contact}:email:b@example.com", b"{contact}:ip:1.2.3.4"
+        ]
+        assert int(await redis.get("{contact}:ip:1.2.3.4")) == 1_000_000 + 5 * 720_000
+        assert 0 < await redis.pttl("{contact}:ip:1.2.3.4") <= 5 * 720_000
+
+        # 間隔（720秒）が経過すると1回分許可される
+        clock[0] += 720
+        return [(await limiter.check(limits("c@example.com")))[0] for _ in range(2)]
+
+    assert asyncio.run(run()) == [True, False]
+    assert limiter.stats["redis"] == 9
+    assert limiter.stats["fallback"] == 0
+
+def test_gcra_local_fallback():
+    """Redisが利用できない場合もワーカー内で制限することのテスト"""
+    limiter = GCRALimiter("contact", redis_getter=lambda: None)
+
+    async def run():
+        return [(await limiter.check([Limit("ip:1.2.3.4", 2, 60)]))[0] for _ in range(3)]
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert limiter.stats["fallback"] == 3
@@ -0,0 +1,43 @@
+import random
+import pytest
+from app import related
+from app.related import RelatedIndex
+
+WORDS = ["python", "rust", "go", "fastapi", "meilisearch", "redis", "aws", "docker", "ai", "search", "cache", "index"]
+
+def _articles(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "title": " ".join(rng.sample(WORDS, 3)),
+            "content": " ".join(rng.choices(WORDS, k=20)) + " 関連記事の検索",
+            "tags": rng.sample(WORDS, 2),
+            "category": rng.choice(["technology", "business"]),
+            "published": True
+        }
+        for i in range(1, count + 1)
+    ]
+
+def test_vectorized_rebuild_matches_inverted_index(monkeypatch):
+    """疎行列の積による再構築が、転置インデックスによる計算と同じ近傍を返すことのテスト"""
+    pytest.importorskip("scipy")
+    articles = _articles(300)
+
+    monkeypatch.setattr(related, "SCIPY_AVAILABLE", False)
+    expected = RelatedIndex(top_k=5)
+    expected.rebuild(articles)
+
+    monkeypatch.setattr(related, "SCIPY_AVAILABLE", True)
+    monkeypatch.setattr(related, "REBUILD_BATCH_SIZE", 64)  # 複数バッチに分けて計算する
+    actual = RelatedIndex(top_k=5)
+    actual.rebuild(articles)
+
+    for article_id in range(1, 301):
+        # 差分更新に使うベクトルも同じになる
+        assert actual._vectors[article_id] == pytest.approx(expected._vectors[article_id])
+        want = expected.related(article_id)
+        got = actual.related(article_id)
+        assert [item["score"] for item in got] == pytest.approx([item["score"] for item in want], abs=1e-4)
+        assert {item["id"] for item in got if item["score"] > want[-1]["score"]} == \
+            {item["id"] for item in want if item["score"] > want[-1]["score"]}
@@ -0,0 +1,53 @@
+import json
+from app import search_stats as search_stats_module
+from app.search_stats import SearchStats, normalize_query, normalize_filters
+
+def test_normalize_query():
+    """クエリの正規化のテスト"""
+    assert normalize_query("  ＰｙｔｈｏｎＡＰＩ　入門  ") == "pythonapi 入門"
+    assert normalize_query(None) == ""
+    assert normalize_filters(tags=["b", "a"], published=True) == "published=true tags=a,b"
+
+def test_search_stats_summary(monkeypatch, tmp_path):
+    """上位クエリ・ゼロヒット・スロークエリの集計のテスト"""
+    monkeypatch.setattr(search_stats_module, "SLOW_QUERY_THRESHOLD_MS", 100)
+    monkeypatch.setattr(search_stats_module, "SLOW_QUERY_LOG", tmp_path / "slow.log")
+    stats = SearchStats()
+    
+    for _ in range(3):
+        stats.record("search", "Python", "", 10, 5)
+    stats.record("search", "python ", "", 150, 5)  # 正規化して同じクエリとして集計
+    stats.record("search", "存在しない", "", 20, 0)
+    stats.record("list", None, "category=tech", 5, 12, cache="hit")
+    
+    summary = stats.summary()
+    assert summary["total_requests"] == 6
+    top = summary["top_queries"][0]
+    assert (top["query"], top["count"], top["max_latency_ms"]) == ("python", 4, 150)
+    assert [q["query"] for q in summary["zero_hit_queries"]] == ["存在しない"]
+    assert summary["latency_ms"]["search"]["count"] == 5
+    assert summary["slow_query_count"] == 1
+    assert summary["recent_slow_queries"][0]["query"] == "python"
+    assert json.loads((tmp_path / "slow.log").read_text().splitlines()[0])["latency_ms"] == 150
+    
+    summary = stats.summary(operation="list")
+    assert summary["top_queries"][0]["cache_hits"] == 1
+
+def test_search_stats_bounded_and_flushed(monkeypatch, tmp_path):
+    """集計するクエリの種類の上限と、ファイルへの書き出しのテスト"""
+    monkeypatch.setattr(search_stats_module, "SEARCH_STATS_DIR", tmp_path)
+    stats = SearchStats(max_keys=3)
+    for i in range(10):
+        stats.record("search", f"query{i}", "", 1, 1)
+    
+    summary = stats.summary()
+    assert summary["distinct_queries"] == 4  # 3種類 + [other]
+    assert any(q["query"] == "[other]" and q["count"] == 7 for q in summary["top_queries"])
+    
+    path = stats.flush()
+    record = json.loads(path.read_text().splitlines()[0])
+    assert sum(q["count"] for q in record["queries"]) == 10
+    
+    # 書き出した区間はリセットされるが、累計は残る
+    assert stats.flush() is None
+    assert stats.summary()["total_requests"] == 10
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from app import startup
+from app.startup import Dependency, Readiness
+
+def test_initialize_concurrently():
+    """依存先が並行して初期化され、必須の依存先がそろうとレディになることのテスト"""
+    registry = Readiness()
+
+    async def run():
+        return await startup.initialize([
+            Dependency("a", lambda: time.sleep(0.2), timeout=1),
+            Dependency("b", lambda: time.sleep(0.2), timeout=1)
+        ], registry)
+
+    start = time.perf_counter()
+    retry_tasks = asyncio.run(run())
+    assert time.perf_counter() - start < 0.35
+    assert retry_tasks == []
+    assert registry.ready
+    assert registry.snapshot()["dependencies"]["a"]["status"] == "ready"
+
+def test_timeout_and_optional_failure():
+    """タイムアウト・失敗した依存先が起動処理を止めず、必須の場合だけレディにならないことのテスト"""
+    registry = Readiness()
+
+    def fail():
+        raise ConnectionError("unreachable")
+
+    async def run():
+        start = time.perf_counter()
+        retry_tasks = await startup.initialize([
+            Dependency("slow", lambda: time.sleep(0.5), timeout=0.1),
+            Dependency("optional", fail, required=False, timeout=1)
+        ], registry)
+        # タイムアウトした依存先の完了を待たずに起動処理が終わる
+        assert time.perf_counter() - start < 0.3
+        for task in retry_tasks:
+            task.cancel()
+        return retry_tasks
+
+    assert len(asyncio.run(run())) == 2
+    snapshot = registry.snapshot()
+    assert not snapshot["ready"]
+    assert snapshot["dependencies"]["slow"]["status"] == "initializing"
+    assert snapshot["dependencies"]["slow"]["error"] == "timeout after 0.1s"
+    assert snapshot["dependencies"]["optional"]["error"] == "ConnectionError: unreachable"
+
+    optional_only = Readiness()
+    asyncio.run(startup.initialize([Dependency("optional", fail, required=False, timeout=1)], optional_only))
+    assert optional_only.ready
+
+def test_retry_until_ready(monkeypatch):
+    """初期化に失敗した依存先がバックグラウンドで再試行されることのテスト"""
+    monkeypatch.setattr(startup, "STARTUP_RETRY_INTERVAL", 0.01)
+    registry = Readiness()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("not yet")
+
+    async def run():
+        retry_tasks = await startup.initialize([Dependency("flaky", flaky, timeout=1)], registry)
+        assert not registry.ready
+        await asyncio.wait_for(asyncio.gather(*retry_tasks), 1)
+
+    asyncio.run(run())
+    assert registry.ready
+    assert registry.snapshot()["dependencies"]["flaky"]["attempts"] == 3
+
+def test_timed_out_init_is_awaited_not_restarted(monkeypatch):
+    """タイムアウトした初期化は重ねて実行されず、遅れて完了した時点でレディになることのテスト"""
+    monkeypatch.setattr(startup, "STARTUP_RETRY_INTERVAL", 0.01)
+    registry = Readiness()
+    lock = threading.Lock()
+    calls = []
+    running = []
+
+    def slow():
+        with lock:
+            calls.append(1)
+            running.append(1)
+            concurrent = len(running)
+        time.sleep(0.5)
+        with lock:
+            running.pop()
+        assert concurrent == 1
+
+    async def run():
+        retry_tasks = await startup.initialize([Dependency("slow", slow, timeout=0.2)], registry)
+        assert registry.snapshot()["dependencies"]["slow"]["status"] == "initializing"
+        await asyncio.wait_for(asyncio.gather(*retry_tasks), 1)
+
+    asyncio.run(run())
+    assert calls == [1]
+    assert registry.ready
+    assert registry.snapshot()["dependencies"]["slow"]["attempts"] == 1
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from app import tracing
+
+def test_parse_traceparent():
+    """W3C traceparent ヘッダーの解析のテスト"""
+    parsed = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    assert parsed == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+    
+    parsed = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")
+    assert parsed[2] is False
+    
+    # 不正な値は無視する
+    assert tracing.parse_traceparent("invalid") is None
+    assert tracing.parse_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent(None) is None
+
+def test_should_sample(monkeypatch):
+    """サンプリング判定のテスト"""
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATIO", 0.1)
+    trace_ids = [tracing._random_id(16) for _ in range(20000)]
+    sampled = sum(tracing.should_sample(trace_id) for trace_id in trace_ids)
+    assert 1500 < sampled < 2500
+    
+    # 同じトレースIDなら常に同じ結果
+    assert all(tracing.should_sample(trace_ids[0]) == tracing.should_sample(trace_ids[0]) for _ in range(10))
+    
+    # 親のsampledフラグに従う
+    assert tracing.should_sample(trace_ids[0], parent_sampled=True) is True
+    assert tracing.should_sample(trace_ids[0], parent_sampled=False) is False
+
+def test_spans_propagate_through_gather():
+    """asyncio.gather で並行実行したタスクにも親スパンが引き継がれることのテスト"""
+    tracing.get_processor().clear()
+    
+    @tracing.traced("child.ok")
+    async def ok():
+        with tracing.start_span("backend.call", kind="client"):
+            await asyncio.sleep(0.01)
+    
+    @tracing.traced("child.error")
+    async def error():
+        raise ValueError("boom")
+    
+    async def handle():
+        root = tracing.Span("GET /test", tracing._random_id(16), kind="server")
+        token = tracing._current_span.set(root)
+        try:
+            await asyncio.gather(ok(), error(), return_exceptions=True)
+        finally:
+            tracing._current_span.reset(token)
+            root.end()
+        return root
+    
+    root = asyncio.run(handle())
+    traces = tracing.get_processor().traces(trace_id=root.trace_id)
+    assert len(traces) == 1
+    spans = {span["name"]: span for span in traces[0]["spans"]}
+    assert traces[0]["name"] == "GET /test"
+    assert spans["child.ok"]["parent_id"] == root.span_id
+    assert spans["child.error"]["parent_id"] == root.span_id
+    assert spans["backend.call"]["parent_id"] == spans["child.ok"]["span_id"]
+    assert spans["child.error"]["error"] == "ValueError: boom"
+    assert traces[0]["error"] is True
+
+def test_spans_are_noop_without_sampled_parent():
+    """サンプリングされていない場合はスパンを記録しないことのテスト"""
+    tracing.get_processor().clear()
+    with tracing.start_span("not.recorded") as span:
+        assert span is None
+    assert tracing.get_processor().traces() == []
+
+def test_otlp_file_exporter(tmp_path):
+    """OTLP/JSON形式でファイルに出力されることのテスト"""
+    file_path = tmp_path / "traces.jsonl"
+    exporter = tracing.OTLPExporter(file_path=str(file_path))
+    
+    span = tracing.Span("meilisearch.search", tracing._random_id(16), tracing._random_id(8), "client")
+    span.set_attribute("operation", "search")
+    span.end_ns = span.start_ns + 1000
+    exporter.export(span)
+    exporter.flush()
+    
+    lines = file_path.read_text().splitlines()
+    assert len(lines) == 1
+    exported = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert exported["traceId"] == span.trace_id
+    assert exported["parentSpanId"] == span.parent_id
+    assert exported["kind"] == 3
+    assert exported["attributes"] == [{"key": "operation", "value": {"stringValue": "search"}}]
+    assert exporter.stats()["exported"] == 1
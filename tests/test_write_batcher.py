@@ -0,0 +1,49 @@
+import threading
+import time
+import pytest
+from app.write_batcher import WriteCoalescer
+
+def test_write_coalescer_batches_concurrent_writes():
+    """同時に投入された書き込みが1つのタスクにまとめられることのテスト"""
+    batches = []
+    
+    def flush(documents):
+        batches.append(list(documents))
+        return len(batches)  # タスクUIDの代わり
+    
+    coalescer = WriteCoalescer(flush, window=0.05, max_docs=100)
+    results = {}
+    
+    def worker(i):
+        results[i] = coalescer.submit({"id": i})
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(batches) == 1
+    assert sorted(doc["id"] for doc in batches[0]) == list(range(10))
+    # 各呼び出し元が同じタスクUIDを受け取る
+    assert set(results.values()) == {1}
+    assert coalescer.stats()["avg_batch_size"] == 10
+
+def test_write_coalescer_flushes_when_full():
+    """件数の上限に達した時点で待たずに書き込まれることのテスト"""
+    batches = []
+    coalescer = WriteCoalescer(lambda docs: batches.append(docs) or 1, window=10, max_docs=1)
+    
+    start = time.monotonic()
+    assert coalescer.submit({"id": 1}) == 1
+    assert time.monotonic() - start < 1
+    assert len(batches) == 1
+
+def test_write_coalescer_propagates_errors():
+    """書き込みに失敗した場合は全ての呼び出し元に例外が伝わることのテスト"""
+    def flush(documents):
+        raise RuntimeError("task failed")
+    
+    coalescer = WriteCoalescer(flush, window=0.01, max_docs=100)
+    with pytest.raises(RuntimeError):
+        coalescer.submit({"id": 1})